@@ -0,0 +1,118 @@
+import hashlib
+import os
+import threading
+
+from analyzers import LocalAnalyzer, RemoteAnalyzer, FallbackAnalyzer
+from chunking import distinct_sections, pack_windows
+from clients import huggingface
+
+SENTIMENT_MODEL = "nlptown/bert-base-multilingual-uncased-sentiment"
+EMOTIONS_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+SUMMARY_MODEL = "facebook/bart-large-cnn"
+TOPICS_MODEL = "facebook/bart-large-mnli"
+
+# Refined topics common in popular music
+CANDIDATE_TOPICS = [
+    "romantic love",
+    "breakup and heartache",
+    "party and dancing",
+    "personal empowerment",
+    "social commentary",
+    "life struggles",
+    "sex and desire",
+    "nostalgia and memories",
+    "fame and success",
+    "rebellion and defiance"
+]
+
+# Cached analyses are only reused when they were produced by the same
+# models and settings; bump ANALYSIS_VERSION when the pipeline changes
+ANALYSIS_VERSION = '3'
+MODEL_SET_VERSION = hashlib.sha1('|'.join(
+    [ANALYSIS_VERSION, SENTIMENT_MODEL, EMOTIONS_MODEL, SUMMARY_MODEL, TOPICS_MODEL] + CANDIDATE_TOPICS
+).encode('utf-8')).hexdigest()[:12]
+
+# Summary windows (characters; BART takes about 1024 tokens), most windows
+# per song, and the length of the joined summary in tokens
+SUMMARY_CHUNK_CHARS = int(os.getenv('SUMMARY_CHUNK_CHARS', '1024'))
+SUMMARY_MAX_CHUNKS = int(os.getenv('SUMMARY_MAX_CHUNKS', '4'))
+SUMMARY_MAX_LENGTH = 150
+SUMMARY_MIN_LENGTH = 50
+
+# Seconds a cached /search result stays valid
+ANALYSIS_CACHE_TTL = int(os.getenv('ANALYSIS_CACHE_TTL', str(7 * 24 * 3600)))
+# Seconds a result with sections the fallback analyzer answered locally stays
+# valid, so the remote models get another try soon
+ANALYSIS_FALLBACK_TTL = int(os.getenv('ANALYSIS_FALLBACK_TTL', '900'))
+
+def hf_inference(model, payload):
+    return huggingface.post(model, json=payload).json()
+
+def analyze_sentiment(text):
+    return hf_inference(SENTIMENT_MODEL, {"inputs": text})
+
+def analyze_emotions(text):
+    return hf_inference(EMOTIONS_MODEL, {"inputs": text})
+
+def get_combined_summary(lyrics, annotations):
+    # Each distinct section of the lyrics, then the annotations, packed into
+    # windows the model reads in full and summarized in one batched request.
+    # Every window gets its share of the summary length, so the joined
+    # summary is about as long as a single one
+    pieces = distinct_sections(lyrics) or [lyrics]
+    if annotations and 'annotations' in annotations:
+        for annotation in annotations['annotations']:
+            if 'body' in annotation:
+                pieces.append(annotation['body']['plain'])
+    windows = pack_windows(pieces, SUMMARY_CHUNK_CHARS, SUMMARY_MAX_CHUNKS)
+
+    result = hf_inference(SUMMARY_MODEL, {
+        "inputs": windows,
+        "parameters": {
+            "max_length": max(SUMMARY_MAX_LENGTH // len(windows), 30),
+            "min_length": max(SUMMARY_MIN_LENGTH // len(windows), 10)
+        }
+    })
+    if not isinstance(result, list):
+        return result
+    return [{'summary_text': ' '.join(item['summary_text'] for item in result)}]
+
+def analyze_topics(text):
+    payload = {
+        "inputs": text,
+        "parameters": {
+            "candidate_labels": CANDIDATE_TOPICS,
+            "multi_label": True,
+            "hypothesis_template": "This text is about {}."  # This helps with better classification
+        }
+    }
+
+    return hf_inference(TOPICS_MODEL, payload)
+
+# Sentiment, emotions, topics and summary can be answered by the Hugging
+# Face models, in process, or remotely with a local fallback. Built on first
+# use so a remote-only deployment never sets up the local one
+_analyzers = {}
+_analyzers_lock = threading.Lock()
+
+def _build_analyzer(name):
+    if name == 'remote':
+        return RemoteAnalyzer(analyze_sentiment, analyze_emotions, analyze_topics, get_combined_summary)
+    if name == 'local':
+        return LocalAnalyzer(CANDIDATE_TOPICS)
+    return FallbackAnalyzer(get_analyzer('remote'), get_analyzer('local'))
+
+def get_analyzer(name):
+    analyzer = _analyzers.get(name)
+    if analyzer is None:
+        analyzer = _build_analyzer(name)
+        with _analyzers_lock:
+            analyzer = _analyzers.setdefault(name, analyzer)
+    return analyzer
+
+def analysis_version(analyzer):
+    return f"{MODEL_SET_VERSION}-{analyzer.name}"
+
+def summarize_song(lyrics, annotations, analyzer):
+    combined_summary = analyzer.summary(lyrics, annotations)
+    return combined_summary[0]['summary_text'] if isinstance(combined_summary, list) else combined_summary['summary_text']
@@ -0,0 +1,292 @@
+import contextvars
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+from enrichment import SectionUnavailable
+from lyrics_text import SECTION_PATTERN, tokenize
+from upstream_scheduler import call_deadline
+
+# Which analyzer answers sentiment, emotions, topics and summary by default:
+# 'remote' (Hugging Face), 'local' (in process) or 'fallback' (remote, with
+# the local result used when remote fails or takes longer than
+# ANALYZER_FALLBACK_MS)
+ANALYZER_BACKEND = os.getenv('ANALYZER_BACKEND', 'remote')
+ANALYZER_FALLBACK_MS = int(os.getenv('ANALYZER_FALLBACK_MS', '3000'))
+ANALYZER_BACKENDS = ('remote', 'local', 'fallback')
+
+# Set of the sections the fallback analyzer answered locally; an analysis
+# sets its own, so the result can be stored for less time
+fallback_sections = contextvars.ContextVar('fallback_sections', default=None)
+
+# Output labels of the remote models, in the order they define them
+SENTIMENT_LABELS = ['1 star', '2 stars', '3 stars', '4 stars', '5 stars']
+EMOTION_LABELS = ['anger', 'disgust', 'fear', 'joy', 'neutral', 'sadness', 'surprise']
+
+EMOTION_KEYWORDS = {
+    'anger': [
+        'angry', 'anger', 'rage', 'mad', 'hate', 'fury', 'furious', 'fight', 'burn',
+        'scream', 'kill', 'war', 'blood', 'revenge', 'damn', 'hell', 'fire', 'break',
+        'destroy', 'enemy', 'violent', 'yell', 'punch'
+    ],
+    'disgust': [
+        'disgust', 'disgusting', 'sick', 'gross', 'dirty', 'filthy', 'nasty', 'rotten',
+        'ugly', 'vile', 'toxic', 'poison', 'shame', 'fake', 'liar', 'lies', 'cheat',
+        'trash', 'stink'
+    ],
+    'fear': [
+        'fear', 'afraid', 'scared', 'scary', 'terror', 'terrified', 'panic', 'anxious',
+        'nervous', 'worry', 'dark', 'darkness', 'danger', 'nightmare', 'shaking',
+        'tremble', 'haunt', 'ghost', 'hide', 'run', 'alone', 'lost'
+    ],
+    'joy': [
+        'joy', 'happy', 'happiness', 'smile', 'laugh', 'love', 'lovely', 'fun', 'dance',
+        'dancing', 'party', 'celebrate', 'sunshine', 'shine', 'bright', 'glad', 'good',
+        'sweet', 'beautiful', 'free', 'alive', 'heaven', 'together', 'kiss', 'baby'
+    ],
+    'sadness': [
+        'sad', 'sadness', 'cry', 'crying', 'tears', 'tear', 'pain', 'hurt', 'broken',
+        'lonely', 'alone', 'miss', 'missing', 'gone', 'goodbye', 'blue', 'sorrow',
+        'grief', 'die', 'dying', 'dead', 'cold', 'empty', 'regret', 'lost', 'rain'
+    ],
+    'surprise': [
+        'surprise', 'surprised', 'suddenly', 'wow', 'shock', 'shocked', 'unexpected',
+        'amazed', 'amazing', 'wonder', 'whoa', 'believe', 'magic', 'miracle', 'strange'
+    ]
+}
+
+TOPIC_KEYWORDS = {
+    'romantic love': [
+        'love', 'heart', 'kiss', 'baby', 'darling', 'forever', 'together', 'hold',
+        'touch', 'eyes', 'romance', 'honey', 'beautiful', 'arms', 'mine', 'yours'
+    ],
+    'breakup and heartache': [
+        'goodbye', 'gone', 'leave', 'left', 'over', 'broken', 'heartbreak', 'cry',
+        'tears', 'miss', 'alone', 'without', 'apart', 'hurt', 'lie', 'lies', 'ex'
+    ],
+    'party and dancing': [
+        'party', 'dance', 'dancing', 'club', 'night', 'tonight', 'drink', 'drinks',
+        'music', 'floor', 'beat', 'move', 'bass', 'dj', 'weekend', 'shots', 'groove'
+    ],
+    'personal empowerment': [
+        'strong', 'stronger', 'power', 'rise', 'fight', 'believe', 'free', 'brave',
+        'fearless', 'own', 'stand', 'never', 'survive', 'champion', 'unstoppable', 'myself'
+    ],
+    'social commentary': [
+        'world', 'people', 'society', 'government', 'war', 'money', 'system', 'justice',
+        'nation', 'police', 'poor', 'rich', 'freedom', 'change', 'streets', 'truth'
+    ],
+    'life struggles': [
+        'struggle', 'pain', 'hard', 'tired', 'lost', 'trying', 'fall', 'broke', 'work',
+        'pressure', 'life', 'demons', 'battle', 'survive', 'dark', 'alone', 'bills'
+    ],
+    'sex and desire': [
+        'body', 'bed', 'sexy', 'desire', 'want', 'need', 'skin', 'lips', 'hot',
+        'touch', 'naked', 'tonight', 'sheets', 'lust', 'wild', 'taste'
+    ],
+    'nostalgia and memories': [
+        'remember', 'memories', 'memory', 'yesterday', 'back', 'young', 'old', 'used',
+        'days', 'childhood', 'again', 'time', 'summer', 'photograph', 'past', 'years'
+    ],
+    'fame and success': [
+        'money', 'fame', 'famous', 'rich', 'star', 'stars', 'gold', 'diamonds', 'top',
+        'success', 'cars', 'million', 'stage', 'lights', 'crown', 'winning', 'boss'
+    ],
+    'rebellion and defiance': [
+        'rebel', 'rules', 'break', 'never', 'fight', 'against', 'riot', 'wild',
+        'rebellion', 'defy', 'loud', 'scream', 'revolution', 'nobody', 'control', 'free'
+    ]
+}
+
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+# Star centres on TextBlob's polarity scale and how sharply each star's
+# score falls off with distance from the song's polarity
+SENTIMENT_CENTERS = np.linspace(-1.0, 1.0, len(SENTIMENT_LABELS))
+SENTIMENT_SHARPNESS = 8.0
+# Weight of 'neutral' before any emotional keyword has been seen
+NEUTRAL_PRIOR = 1.0
+
+def require_inference(result):
+    # Hugging Face reports failures (e.g. a model still loading) as a JSON
+    # object with an 'error' key instead of an HTTP error
+    if isinstance(result, dict) and 'error' in result:
+        raise SectionUnavailable(result['error'])
+    return result
+
+def _softmax(values):
+    exp = np.exp(values - values.max())
+    return exp / exp.sum()
+
+def _scored_labels(labels, scores):
+    ranked = sorted(zip(labels, scores), key=lambda item: item[1], reverse=True)
+    return [{'label': label, 'score': round(float(score), 4)} for label, score in ranked]
+
+class LocalAnalyzer:
+    # Lexicon and keyword-vector scoring that runs in process and returns the
+    # same shapes as the Hugging Face models
+    name = 'local'
+
+    def __init__(self, topic_labels):
+        self.topic_labels = list(topic_labels)
+
+        vocabulary = sorted(
+            {word for words in EMOTION_KEYWORDS.values() for word in words} |
+            {word for words in TOPIC_KEYWORDS.values() for word in words}
+        )
+        self.vocabulary = {word: index for index, word in enumerate(vocabulary)}
+
+        # One row per vocabulary word, one column per emotion/topic
+        self.emotion_matrix = np.zeros((len(vocabulary), len(EMOTION_LABELS)))
+        for column, emotion in enumerate(EMOTION_LABELS):
+            for word in EMOTION_KEYWORDS.get(emotion, []):
+                self.emotion_matrix[self.vocabulary[word], column] = 1.0
+
+        self.topic_matrix = np.zeros((len(vocabulary), len(self.topic_labels)))
+        for column, topic in enumerate(self.topic_labels):
+            for word in TOPIC_KEYWORDS.get(topic, []):
+                self.topic_matrix[self.vocabulary[word], column] = 1.0
+        norms = np.linalg.norm(self.topic_matrix, axis=0)
+        self.topic_matrix /= np.where(norms > 0, norms, 1.0)
+
+    def _keyword_counts(self, tokens):
+        indices = [self.vocabulary[token] for token in tokens if token in self.vocabulary]
+        return np.bincount(indices, minlength=len(self.vocabulary)).astype(float)
+
+    # sentiment, emotions and topics also take a list of texts and answer
+    # one result per text, like the models do for a batched inputs list
+
+    def sentiment(self, text):
+        if isinstance(text, list):
+            return [self.sentiment(item)[0] for item in text]
+        # TextBlob (and NLTK behind it) is slow to import; only pay for it
+        # when the local analyzer is actually used
+        from textblob import TextBlob
+        polarity = TextBlob(text).sentiment.polarity
+        scores = _softmax(-SENTIMENT_SHARPNESS * (SENTIMENT_CENTERS - polarity) ** 2)
+        return [_scored_labels(SENTIMENT_LABELS, scores)]
+
+    def emotions(self, text):
+        if isinstance(text, list):
+            return [self.emotions(item)[0] for item in text]
+        tokens = tokenize(text)
+        weights = self._keyword_counts(tokens) @ self.emotion_matrix
+        weights[EMOTION_LABELS.index('neutral')] += NEUTRAL_PRIOR
+        return [_scored_labels(EMOTION_LABELS, weights / weights.sum())]
+
+    def topics(self, text):
+        if isinstance(text, list):
+            return [self.topics(item) for item in text]
+        counts = self._keyword_counts(tokenize(text))
+        norm = np.linalg.norm(counts)
+        similarity = (counts / norm) @ self.topic_matrix if norm else np.zeros(len(self.topic_labels))
+        # Cosine similarity of keyword vectors is small in absolute terms;
+        # stretch it onto 0..1 like the zero-shot model's independent scores
+        scores = 1 - np.exp(-4 * similarity)
+        ranked = sorted(zip(self.topic_labels, scores), key=lambda item: item[1], reverse=True)
+        return {
+            'sequence': text,
+            'labels': [label for label, _ in ranked],
+            'scores': [round(float(score), 4) for _, score in ranked]
+        }
+
+    def summary(self, lyrics, annotations):
+        # Extractive summary: the distinct lines (and annotation sentences)
+        # made of the song's most frequent words, in their original order
+        lines = [line.strip() for line in lyrics.split('\n')]
+        lines = [line for line in lines if line and not SECTION_PATTERN.match(line)]
+        if annotations and 'annotations' in annotations:
+            for annotation in annotations['annotations']:
+                if 'body' in annotation:
+                    lines.extend(s.strip() for s in SENTENCE_PATTERN.split(annotation['body']['plain']) if s.strip())
+
+        tokenized = [tokenize(line) for line in lines]
+        frequencies = Counter(token for tokens in tokenized for token in tokens if len(token) > 3)
+        seen = set()
+        candidates = []
+        for position, (line, tokens) in enumerate(zip(lines, tokenized)):
+            key = line.lower()
+            if key in seen or not tokens:
+                continue
+            seen.add(key)
+            candidates.append((sum(frequencies[token] for token in tokens) / len(tokens), position, line))
+
+        chosen = sorted(sorted(candidates, reverse=True)[:3], key=lambda item: item[1])
+        summary = ' '.join(line if line[-1] in '.!?' else f"{line}." for _, _, line in chosen)
+        return [{'summary_text': summary}]
+
+class RemoteAnalyzer:
+    # The Hugging Face inference calls, with error objects turned into
+    # SectionUnavailable
+    name = 'remote'
+
+    def __init__(self, sentiment, emotions, topics, summary):
+        self._sentiment = sentiment
+        self._emotions = emotions
+        self._topics = topics
+        self._summary = summary
+
+    def sentiment(self, text):
+        return require_inference(self._sentiment(text))
+
+    def emotions(self, text):
+        return require_inference(self._emotions(text))
+
+    def topics(self, text):
+        return require_inference(self._topics(text))
+
+    def summary(self, lyrics, annotations):
+        return require_inference(self._summary(lyrics, annotations))
+
+class FallbackAnalyzer:
+    # Tries the remote analyzer first and answers from the local one when the
+    # remote call fails or hasn't finished within fallback_ms
+    name = 'fallback'
+
+    def __init__(self, remote, local, fallback_ms=ANALYZER_FALLBACK_MS, max_workers=8):
+        self.remote = remote
+        self.local = local
+        self.fallback_ms = fallback_ms
+        # Separate from the enrichment pool, whose threads wait on these calls
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='remote-analyzer')
+
+    def _call(self, method, *args):
+        # The remote call runs in a copy of the caller's context, so it is
+        # timed into the same request and keeps its call deadline
+        deadline = time.monotonic() + self.fallback_ms / 1000
+        future = self.executor.submit(contextvars.copy_context().run, self._remote, method, deadline, *args)
+        try:
+            return future.result(timeout=self.fallback_ms / 1000)
+        except FutureTimeoutError:
+            # Drops the call if it hasn't started; a running one gives up
+            # at the deadline through its capped request timeout
+            future.cancel()
+            print(f"Remote {method} slower than {self.fallback_ms} ms, using local result")
+        except Exception as e:
+            print(f"Remote {method} failed ({str(e)}), using local result")
+        sections = fallback_sections.get()
+        if sections is not None:
+            sections.add(method)
+        return getattr(self.local, method)(*args)
+
+    def _remote(self, method, deadline, *args):
+        # Nobody waits for the remote result past the fallback deadline
+        current = call_deadline.get()
+        call_deadline.set(deadline if current is None else min(current, deadline))
+        return getattr(self.remote, method)(*args)
+
+    def sentiment(self, text):
+        return self._call('sentiment', text)
+
+    def emotions(self, text):
+        return self._call('emotions', text)
+
+    def topics(self, text):
+        return self._call('topics', text)
+
+    def summary(self, lyrics, annotations):
+        return self._call('summary', lyrics, annotations)
@@ -0,0 +1,625 @@
+from flask import Flask, Blueprint, current_app, g, request, jsonify, Response, stream_with_context
+import hashlib
+import hmac
+import json
+import math
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+
+from analyzers import ANALYZER_BACKEND, ANALYZER_BACKENDS
+from analysis import get_analyzer
+from batch import BATCH_DEADLINE, resolve_source, create_job, job_summary, iter_batch
+from clients import spotify_tokens, search_spotify_track, get_spotify_track, is_spotify_id, SpotifyError
+from compression import compress_response
+from database import engine_profile, pool_stats
+from enrichment import SEARCH_DEADLINE
+from http_clients import client_stats
+from metrics import stage, start_request_timings, request_seconds, render_metrics
+from models import db, Song, SongSearchBucket, BatchJob, AnalysisResult
+from payload import pack_scores, parse_fields, section_selected, shape_payload, shape_section
+from profiler import PROFILE_SAMPLE_RATE, SamplingProfiler
+from search import (
+    LyricsNotFound, ENRICHMENT_SECTIONS, search_flight, analysis_flight, normalize_query,
+    iter_track_analysis, iter_payload_sections, collect_section, get_cached_analysis,
+    store_analysis, analyze_and_store, lyrics_store
+)
+from search_tracking import SearchCountBuffer, song_row, upsert_songs, track_id_from_url
+from similarity import SIMILAR_LIMIT, SimilarityIndex, database_source, index_path, song_features
+from suggest import SUGGEST_LIMIT, SuggestIndex
+from trending import compute_trending, TRENDING_WINDOWS
+from ttl_cache import TTLCache
+from upstream_scheduler import UpstreamUnavailable
+from warmup import WARMUP_DEADLINE, run_warmup
+
+# Search counting: written on the request (default), or buffered in memory
+# and flushed after the response ('after_response') or every
+# SEARCH_COUNT_FLUSH_INTERVAL seconds ('interval')
+SEARCH_COUNT_BUFFER = os.getenv('SEARCH_COUNT_BUFFER', 'off')
+
+# Seconds the trending list is reused in process and at the edge, and how
+# long the edge may keep serving it while it revalidates in the background
+TRENDING_CACHE_TTL = int(os.getenv('TRENDING_CACHE_TTL', '60'))
+TRENDING_STALE_WHILE_REVALIDATE = int(os.getenv('TRENDING_STALE_WHILE_REVALIDATE', '300'))
+trending_cache = TTLCache(TRENDING_CACHE_TTL)
+
+TRENDING_MAX_LIMIT = 50
+
+# Build the /api/suggest index in the background when the API app starts,
+# instead of on the first suggestion request
+SUGGEST_PRELOAD = os.getenv('SUGGEST_PRELOAD', '1') == '1'
+SUGGEST_MAX_LIMIT = 20
+
+# Load the /api/similar index (from SIMILARITY_INDEX_PATH, then the analyses
+# stored since) in the background when the API app starts
+SIMILARITY_PRELOAD = os.getenv('SIMILARITY_PRELOAD', '1') == '1'
+SIMILAR_MAX_LIMIT = 50
+
+# Open a pooled database connection in the background when the API app starts
+DB_PREWARM = os.getenv('DB_PREWARM', '1') == '1'
+
+# Bearer token the cron endpoints require; Vercel Cron sends CRON_SECRET as
+# "Authorization: Bearer <CRON_SECRET>". Unset disables the endpoints
+CRON_SECRET = os.getenv('CRON_SECRET')
+# Bearer token /metrics and /api/stats require when set
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+api = Blueprint('api', __name__)
+
+def create_api_app():
+    # Serves /search and /api/*; built on the first request that needs it
+    app = Flask(__name__, static_folder=None)
+
+    # Configure the database for the engine profile (see database.py)
+    profile, database_url, engine_options = engine_profile()
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.extensions['db_profile'] = profile
+    db.init_app(app)
+    if DB_PREWARM and engine_options.get('poolclass') is not NullPool:
+        threading.Thread(target=prewarm_pool, args=(app,), name='db-prewarm', daemon=True).start()
+
+    def flush_search_counts(rows):
+        with app.app_context():
+            upsert_songs(db.session, Song, rows, SongSearchBucket)
+
+    if SEARCH_COUNT_BUFFER == 'interval':
+        app.extensions['search_counts'] = SearchCountBuffer(flush_search_counts, interval=float(os.getenv('SEARCH_COUNT_FLUSH_INTERVAL', '5')))
+    elif SEARCH_COUNT_BUFFER == 'after_response':
+        app.extensions['search_counts'] = SearchCountBuffer(flush_search_counts)
+    else:
+        app.extensions['search_counts'] = None
+
+    app.extensions['suggest_index'] = SuggestIndex()
+    if SUGGEST_PRELOAD:
+        threading.Thread(target=load_suggest_index, args=(app,), name='suggest-preload', daemon=True).start()
+
+    app.extensions['similarity_index'] = SimilarityIndex()
+    if SIMILARITY_PRELOAD:
+        threading.Thread(target=load_similarity_index, args=(app,), name='similarity-preload', daemon=True).start()
+
+    app.register_blueprint(api)
+    return app
+
+def prewarm_pool(app):
+    # Opens a pooled connection while the instance starts, so the first
+    # /search or /api/trending doesn't wait for the handshake
+    try:
+        with app.app_context():
+            with db.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+    except Exception as db_error:
+        print(f"Database error: {str(db_error)}")
+
+def load_suggest_index(app, wait=True):
+    def song_rows():
+        with app.app_context():
+            return db.session.query(
+                Song.track_name, Song.artist, Song.album, Song.spotify_url, Song.album_art, Song.search_count
+            ).all()
+    try:
+        app.extensions['suggest_index'].load_from(song_rows, wait=wait)
+    except Exception as db_error:
+        print(f"Database error: {str(db_error)}")
+
+def get_suggest_index():
+    # Loaded on first use if the preload hasn't finished, then reloaded in the
+    # background every SUGGEST_RELOAD_INTERVAL to pick up other instances' songs
+    app = current_app._get_current_object()
+    index = app.extensions['suggest_index']
+    if index.loaded_at is None:
+        load_suggest_index(app)
+    elif index.is_stale():
+        threading.Thread(target=load_suggest_index, args=(app, False), name='suggest-reload', daemon=True).start()
+    return index
+
+def similarity_rows(app, since=None):
+    # (song ID, track ID, payload, created_at) of the unexpired analyses of
+    # known songs stored after since, read in chunks while the index
+    # consumes them
+    with app.app_context():
+        songs = {track_id_from_url(spotify_url): song_id for song_id, spotify_url in db.session.query(Song.id, Song.spotify_url)}
+        query = db.session.query(AnalysisResult.track_id, AnalysisResult.payload, AnalysisResult.created_at).filter(
+            AnalysisResult.expires_at > datetime.utcnow()
+        )
+        if since is not None:
+            query = query.filter(AnalysisResult.created_at > since)
+        for track_id, payload, created_at in query.yield_per(500):
+            if track_id in songs:
+                yield songs[track_id], track_id, json.loads(payload), created_at
+
+def similarity_songs(app):
+    # Song ID -> track ID of every song with an unexpired analysis: what the
+    # index may hold
+    with app.app_context():
+        analyzed = {
+            track_id for (track_id,) in
+            db.session.query(AnalysisResult.track_id).filter(AnalysisResult.expires_at > datetime.utcnow()).distinct()
+        }
+        songs = ((song_id, track_id_from_url(spotify_url)) for song_id, spotify_url in db.session.query(Song.id, Song.spotify_url))
+        return {song_id: track_id for song_id, track_id in songs if track_id in analyzed}
+
+def load_similarity_index(app, wait=True):
+    source = database_source(app.config['SQLALCHEMY_DATABASE_URI'])
+    try:
+        app.extensions['similarity_index'].sync_from(
+            lambda since: similarity_rows(app, since), lambda: similarity_songs(app),
+            path=index_path(source), source=source, wait=wait
+        )
+    except Exception as db_error:
+        print(f"Database error: {str(db_error)}")
+
+def get_similarity_index():
+    # Loaded on first use if the preload hasn't finished, then synced in the
+    # background every SIMILARITY_SYNC_INTERVAL with other instances' analyses
+    app = current_app._get_current_object()
+    index = app.extensions['similarity_index']
+    if index.loaded_at is None:
+        load_similarity_index(app)
+    elif index.is_stale():
+        threading.Thread(target=load_similarity_index, args=(app, False), name='similarity-sync', daemon=True).start()
+    return index
+
+_api_app = None
+_api_app_lock = threading.Lock()
+
+def get_api_app():
+    # One API app per process, shared by the dispatcher in app.py and the CLI
+    global _api_app
+    if _api_app is None:
+        with _api_app_lock:
+            if _api_app is None:
+                _api_app = create_api_app()
+    return _api_app
+
+def request_body():
+    # The JSON object posted, or {} for a missing, malformed or non-object
+    # body, so a bad request gets a 400 rather than a 500
+    body = request.get_json(silent=True)
+    return body if isinstance(body, dict) else {}
+
+def requested_analyzer():
+    # Per-request override of ANALYZER_BACKEND: {"analyzer": "local"}
+    name = request_body().get('analyzer') or ANALYZER_BACKEND
+    if name not in ANALYZER_BACKENDS:
+        return None
+    return get_analyzer(name)
+
+def requested_view():
+    # fields= (response keys to send) and format=compact, from the query
+    # string or the JSON body; ValueError when either is invalid
+    body = request_body()
+    fields = parse_fields(request.args.get('fields') or body.get('fields'))
+    response_format = request.args.get('format') or body.get('format') or 'full'
+    if response_format not in ('full', 'compact'):
+        raise ValueError('format must be full or compact')
+    return fields, response_format == 'compact'
+
+def upstream_unavailable(error):
+    # An upstream is rate limited past its max wait or its circuit is open
+    response = jsonify({'error': str(error)})
+    response.status_code = 503
+    if error.retry_after:
+        response.headers['Retry-After'] = str(math.ceil(error.retry_after))
+    return response
+
+def record_search(track):
+    # Track the search in database
+    row = song_row(track)
+    current_app.extensions['suggest_index'].record(row)
+    search_counts = current_app.extensions['search_counts']
+    if search_counts:
+        search_counts.add(row)
+        return
+    try:
+        with stage('db_record_search'):
+            upsert_songs(db.session, Song, [row], SongSearchBucket)
+    except Exception as db_error:
+        db.session.rollback()
+        print(f"Database error: {str(db_error)}")
+        # Continue with the response even if database operation fails
+
+def index_similarity(track, response_data):
+    # Adds a freshly analyzed song to the similarity index. Its song row
+    # may not be written yet when search counts are buffered; the next sync
+    # adds it then
+    if response_data['unavailable']:
+        return
+    vector = song_features(response_data)
+    if vector is None:
+        return
+    try:
+        song_id = db.session.query(Song.id).filter_by(track_name=track['name'], artist=track['artists'][0]['name']).scalar()
+    except Exception as db_error:
+        db.session.rollback()
+        print(f"Database error: {str(db_error)}")
+        return
+    if song_id is not None:
+        current_app.extensions['similarity_index'].add(song_id, vector, track['id'])
+
+def requested_track():
+    # {"track_id": ...} or {"query": ...} from the JSON body as (kind,
+    # value); ValueError when neither is given, or for a track ID that isn't
+    # a Spotify ID, which would otherwise end up in the Spotify request path
+    body = request_body()
+    track_id = body.get('track_id')
+    if track_id:
+        if not is_spotify_id(track_id):
+            raise ValueError('track_id must be a Spotify track ID (22 letters and digits)')
+        return 'track_id', track_id
+    query = body.get('query')
+    if not isinstance(query, str) or not query.strip():
+        raise ValueError('query or track_id is required')
+    return 'query', query
+
+def find_track(lookup, deadline):
+    # {"track_id": ...} comes from a picked suggestion: the song is already
+    # known, so the Spotify text search is skipped
+    kind, value = lookup
+    if kind == 'track_id':
+        track_id = value
+        track = current_app.extensions['suggest_index'].track(track_id)
+        if track is None:
+            try:
+                track = get_spotify_track(track_id)
+            except SpotifyError:
+                track = None
+        return track
+
+    query = value
+    with stage('track_search'):
+        return search_flight.do(
+            normalize_query(query),
+            lambda: search_spotify_track(query),
+            timeout=deadline - time.monotonic()
+        )
+
+@api.before_request
+def start_timing():
+    g.started = time.perf_counter()
+    g.timings = start_request_timings()
+    g.profiler = None
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        g.profiler = SamplingProfiler(threading.get_ident()).start()
+
+@api.after_request
+def finish_timing(response):
+    # Server-Timing covers the stages done before the headers are sent; the
+    # request histogram and the profile wait for the body, streamed or not
+    started, timings, profiler = g.started, g.timings, g.profiler
+    endpoint, status = request.endpoint or 'unknown', str(response.status_code)
+    response.headers['Server-Timing'] = ', '.join(filter(None, [
+        timings.server_timing(), f"total;dur={(time.perf_counter() - started) * 1000:.1f}"
+    ]))
+
+    def on_close():
+        request_seconds.observe(time.perf_counter() - started, endpoint, status)
+        if profiler:
+            profiler.stop()
+            print(f"Profile of {endpoint} written to {profiler.write(endpoint.replace('.', '_'))}")
+
+    response.call_on_close(on_close)
+    return response
+
+@api.after_request
+def flush_search_counts_after_response(response):
+    # Runs once the response (including a streamed one) has been sent
+    if SEARCH_COUNT_BUFFER == 'after_response' and request.endpoint in ('api.search_song', 'api.search_song_stream'):
+        response.call_on_close(current_app.extensions['search_counts'].flush)
+    return response
+
+@api.after_request
+def compress(response):
+    # gzip or brotli, by the request's Accept-Encoding
+    return compress_response(response, request)
+
+@api.route('/search', methods=['POST'])
+def search_song():
+    deadline = time.monotonic() + SEARCH_DEADLINE
+    try:
+        analyzer = requested_analyzer()
+        if not analyzer:
+            return jsonify({'error': f"analyzer must be one of {', '.join(ANALYZER_BACKENDS)}"}), 400
+        try:
+            fields, compact = requested_view()
+            lookup = requested_track()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Search on Spotify
+        track = find_track(lookup, deadline)
+        if not track:
+            return jsonify({'error': 'Song not found on Spotify'}), 404
+
+        # Reuse a stored analysis of the same track when there is one
+        response_data = get_cached_analysis(track['id'], analyzer)
+        analyzed = response_data is None
+        if analyzed:
+            with stage('analysis'):
+                response_data = analysis_flight.do(
+                    (track['id'], analyzer.name),
+                    lambda: analyze_and_store(track, analyzer, deadline=deadline),
+                    timeout=deadline - time.monotonic()
+                )
+
+        record_search(track)
+        if analyzed:
+            index_similarity(track, response_data)
+
+        return jsonify(shape_payload(response_data, fields, compact))
+
+    except LyricsNotFound:
+        return jsonify({'error': 'Lyrics not found'}), 404
+    except UpstreamUnavailable as e:
+        return upstream_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/search/stream', methods=['POST'])
+def search_song_stream():
+    # Same pipeline as /search, sent as newline-delimited JSON with one line
+    # per section as soon as it is ready
+    deadline = time.monotonic() + SEARCH_DEADLINE
+    try:
+        analyzer = requested_analyzer()
+        if not analyzer:
+            return jsonify({'error': f"analyzer must be one of {', '.join(ANALYZER_BACKENDS)}"}), 400
+        try:
+            fields, compact = requested_view()
+            lookup = requested_track()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        track = find_track(lookup, deadline)
+        if not track:
+            return jsonify({'error': 'Song not found on Spotify'}), 404
+
+        cached = get_cached_analysis(track['id'], analyzer)
+    except UpstreamUnavailable as e:
+        return upstream_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    def generate():
+        if cached is not None:
+            sections = iter_payload_sections(cached)
+        else:
+            sections = iter_track_analysis(track, analyzer, deadline=deadline)
+
+        response_data = {'unavailable': []}
+        # Compact label tables sent so far; each is sent once, on the first
+        # line with scores of its model
+        sent_labels = {}
+        try:
+            for section, data in sections:
+                collect_section(response_data, section, data)
+                if section == 'fallback':
+                    # Sent on the done line
+                    continue
+                if section_selected(section, fields):
+                    line = {'section': section, 'data': shape_section(section, data, fields, compact)}
+                    if compact:
+                        packed, labels = pack_scores({section: line['data']}, sent_labels)
+                        line['data'] = packed[section]
+                        if labels:
+                            line['labels'] = labels
+                            sent_labels.update(labels)
+                    if section in ENRICHMENT_SECTIONS and data is None:
+                        line['unavailable'] = True
+                    yield json.dumps(line) + '\n'
+
+                if section == 'track':
+                    record_search(track)
+        except LyricsNotFound:
+            yield json.dumps({'section': 'error', 'error': 'Lyrics not found'}) + '\n'
+            return
+        except Exception as e:
+            yield json.dumps({'section': 'error', 'error': str(e)}) + '\n'
+            return
+
+        if cached is None:
+            store_analysis(track['id'], response_data, analyzer)
+            index_similarity(track, response_data)
+        yield json.dumps({
+            'section': 'done',
+            'unavailable': response_data['unavailable'],
+            'fallback': response_data.get('fallback', [])
+        }) + '\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@api.route('/api/batch', methods=['POST'])
+def analyze_batch():
+    # Analyzes a playlist, album or list of tracks and streams one NDJSON
+    # line per track, then album-level aggregates. {"job_id": ...} resumes
+    # a job that ran out of time where it stopped
+    deadline = time.monotonic() + BATCH_DEADLINE
+    body = request_body()
+    try:
+        if body.get('job_id'):
+            job = db.session.get(BatchJob, body['job_id'])
+            if job is None:
+                return jsonify({'error': 'Batch job not found'}), 404
+            analyzer = get_analyzer(job.analyzer)
+        else:
+            analyzer = requested_analyzer()
+            if not analyzer:
+                return jsonify({'error': f"analyzer must be one of {', '.join(ANALYZER_BACKENDS)}"}), 400
+            source, track_ids = resolve_source(body)
+            if not track_ids:
+                return jsonify({'error': 'No tracks to analyze'}), 404
+            job = create_job(source, track_ids, analyzer)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except SpotifyError as e:
+        return jsonify({'error': str(e)}), 404
+    except UpstreamUnavailable as e:
+        return upstream_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    app = current_app._get_current_object()
+
+    def generate():
+        try:
+            for line in iter_batch(app, job, analyzer, deadline=deadline):
+                yield json.dumps(line) + '\n'
+        except Exception as e:
+            yield json.dumps({'section': 'error', 'error': str(e), 'job_id': job.id}) + '\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@api.route('/api/batch/<job_id>')
+def get_batch_job(job_id):
+    job = db.session.get(BatchJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Batch job not found'}), 404
+    return jsonify(job_summary(job))
+
+def cron_authorized():
+    if not CRON_SECRET:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {CRON_SECRET}")
+
+@api.route('/api/cron/warmup', methods=['GET', 'POST'])
+def cron_warmup():
+    # Keeps the Hugging Face models loaded and the trending songs' analyses
+    # cached, so the songs most likely to be clicked skip the cold pipeline
+    if not cron_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    deadline = time.monotonic() + WARMUP_DEADLINE
+    try:
+        run = run_warmup(current_app._get_current_object(), get_analyzer(ANALYZER_BACKEND), deadline=deadline)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify(run)
+
+@api.route('/api/suggest')
+def suggest_songs():
+    # Typeahead over songs already searched, most searched first
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', SUGGEST_LIMIT, type=int), SUGGEST_MAX_LIMIT))
+    index = get_suggest_index()
+    with stage('suggest'):
+        suggestions = index.suggest(query, limit)
+    response = jsonify([
+        {field: song[field] for field in ('track_id', 'track_name', 'artist', 'album', 'album_art', 'search_count')}
+        for song in suggestions if song['track_id']
+    ])
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+@api.route('/api/similar/<int:song_id>')
+def similar_songs(song_id):
+    # Analyzed songs closest to this one in words, emotions and topics
+    limit = max(1, min(request.args.get('limit', SIMILAR_LIMIT, type=int), SIMILAR_MAX_LIMIT))
+    song = db.session.get(Song, song_id)
+    if song is None:
+        return jsonify({'error': 'Song not found'}), 404
+    index = get_similarity_index()
+    with stage('similar'):
+        matches = index.similar(song_id, limit)
+    if matches is None:
+        return jsonify({'error': 'Song has not been analyzed yet'}), 404
+
+    songs = {row.id: row for row in Song.query.filter(Song.id.in_([match_id for match_id, _ in matches]))} if matches else {}
+    response = jsonify({
+        'song': song.to_dict(),
+        'similar': [
+            dict(songs[match_id].to_dict(), similarity=round(score, 4))
+            for match_id, score in matches if match_id in songs
+        ]
+    })
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+@api.route('/api/trending')
+def get_trending():
+    window = request.args.get('window', '7d')
+    if window not in TRENDING_WINDOWS:
+        return jsonify({'error': f"window must be one of {', '.join(TRENDING_WINDOWS)}"}), 400
+    limit = request.args.get('limit', 10, type=int)
+    limit = max(1, min(limit, TRENDING_MAX_LIMIT))
+
+    cached = trending_cache.get((window, limit))
+    if cached is None:
+        body = json.dumps(compute_trending(db.session, Song, SongSearchBucket, window, limit))
+        cached = (body, hashlib.sha1(body.encode('utf-8')).hexdigest())
+        trending_cache.set((window, limit), cached)
+    body, etag = cached
+
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = (
+        f"public, max-age=0, s-maxage={TRENDING_CACHE_TTL}, "
+        f"stale-while-revalidate={TRENDING_STALE_WHILE_REVALIDATE}"
+    )
+    # Answers If-None-Match with an empty 304
+    return response.make_conditional(request)
+
+def metrics_authorized():
+    if not METRICS_TOKEN:
+        return True
+    return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {METRICS_TOKEN}")
+
+@api.route('/metrics')
+def get_metrics():
+    # Prometheus text format; counts are per process (per warm instance on Vercel)
+    if not metrics_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/stats')
+def get_stats():
+    # Pool, cache and index internals: same token as /metrics
+    if not metrics_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    search_counts = current_app.extensions['search_counts']
+    return jsonify({
+        'spotify_token': spotify_tokens.stats(),
+        'http_pools': client_stats(),
+        'single_flight': {
+            'search': search_flight.stats(),
+            'analysis': analysis_flight.stats()
+        },
+        'search_counts': search_counts.stats() if search_counts else None,
+        'lyrics_store': lyrics_store.stats(),
+        'suggest_index': current_app.extensions['suggest_index'].stats(),
+        'similarity_index': current_app.extensions['similarity_index'].stats(),
+        'database': dict({'profile': current_app.extensions['db_profile']}, **pool_stats(db.engine)),
+        'trending_cache': trending_cache.stats()
+    })
@@ -0,0 +1,209 @@
+import json
+import os
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
+from datetime import datetime
+
+from clients import get_spotify_tracks, get_playlist_track_ids, get_album_track_ids, is_spotify_id
+from models import db, BatchJob
+from search import LyricsNotFound, analysis_flight, get_cached_analysis, analyze_and_store
+
+# Tracks analyzed at once across all batch jobs; each one also fans out its
+# enrichment calls to the shared enrichment pool
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', '4'))
+# Most tracks a playlist or album job takes
+BATCH_MAX_TRACKS = int(os.getenv('BATCH_MAX_TRACKS', '500'))
+# Seconds one /api/batch request runs before it stops and can be resumed
+BATCH_DEADLINE = float(os.getenv('BATCH_DEADLINE', '50'))
+
+executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix='batch')
+
+SOURCE_KINDS = ('playlist', 'album', 'tracks')
+# Statuses that are not retried when a job is resumed; 'partial' (some
+# sections unavailable) and 'error' are
+FINAL_STATUSES = ('ok', 'not_found', 'lyrics_not_found')
+
+def resolve_source(body):
+    # {"playlist": id}, {"album": id} or {"tracks": [id, ...]} -> (source, track IDs)
+    kinds = [kind for kind in SOURCE_KINDS if body.get(kind)]
+    if len(kinds) != 1:
+        raise ValueError(f"pass exactly one of {', '.join(SOURCE_KINDS)}")
+    kind = kinds[0]
+    if kind == 'tracks' and not isinstance(body['tracks'], list):
+        raise ValueError('tracks must be a list of Spotify track IDs')
+    # IDs end up in Spotify request paths and the comma-joined ids parameter
+    ids = body['tracks'] if kind == 'tracks' else [body[kind]]
+    if not all(is_spotify_id(value) for value in ids):
+        raise ValueError(f"{kind} must hold Spotify IDs (22 letters and digits)")
+    if kind == 'playlist':
+        track_ids = get_playlist_track_ids(body['playlist'], limit=BATCH_MAX_TRACKS)
+    elif kind == 'album':
+        track_ids = get_album_track_ids(body['album'], limit=BATCH_MAX_TRACKS)
+    else:
+        track_ids = body['tracks'][:BATCH_MAX_TRACKS]
+    source = 'tracks' if kind == 'tracks' else f"{kind}:{body[kind]}"
+    # A track listed twice is analyzed once
+    return source, list(dict.fromkeys(track_ids))
+
+def create_job(source, track_ids, analyzer):
+    now = datetime.utcnow()
+    job = BatchJob(
+        id=uuid.uuid4().hex,
+        source=source,
+        analyzer=analyzer.name,
+        track_ids=json.dumps(track_ids),
+        results='{}',
+        created_at=now,
+        updated_at=now
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+def job_summary(job):
+    track_ids = json.loads(job.track_ids)
+    results = json.loads(job.results)
+    done = sum(1 for status in results.values() if status in FINAL_STATUSES)
+    return {
+        'job_id': job.id,
+        'source': job.source,
+        'analyzer': job.analyzer,
+        'total': len(track_ids),
+        'done': done,
+        'complete': done == len(track_ids),
+        'statuses': dict(Counter(results.values())),
+        'created_at': job.created_at.isoformat(),
+        'updated_at': job.updated_at.isoformat()
+    }
+
+class BatchAggregate:
+    # Album/playlist-level view of the analyzed tracks
+    def __init__(self):
+        self.tracks = 0
+        self.sentiment_stars = []
+        self.emotions = Counter()
+        self.emotion_tracks = 0
+        self.topics = Counter()
+        self.topic_tracks = 0
+        self.words = Counter()
+
+    def add(self, data):
+        self.tracks += 1
+        if data.get('sentiment'):
+            scores = data['sentiment'][0]
+            total = sum(item['score'] for item in scores) or 1
+            self.sentiment_stars.append(sum(int(item['label'][0]) * item['score'] for item in scores) / total)
+        if data.get('emotions'):
+            self.emotion_tracks += 1
+            for item in data['emotions'][0]:
+                self.emotions[item['label']] += item['score']
+        if data.get('topics'):
+            self.topic_tracks += 1
+            for label, score in zip(data['topics']['labels'], data['topics']['scores']):
+                self.topics[label] += score
+        for word, count in data.get('word_frequency') or []:
+            self.words[word] += count
+
+    def result(self, top_words=20):
+        return {
+            'tracks': self.tracks,
+            'mean_sentiment_stars': round(sum(self.sentiment_stars) / len(self.sentiment_stars), 3) if self.sentiment_stars else None,
+            'emotion_mix': {
+                label: round(score / self.emotion_tracks, 4) for label, score in self.emotions.most_common()
+            },
+            'topic_mix': {
+                label: round(score / self.topic_tracks, 4) for label, score in self.topics.most_common()
+            },
+            'word_frequency': self.words.most_common(top_words)
+        }
+
+def analyze_in_context(app, track, analyzer):
+    # Runs on a batch worker thread, which has no app context of its own
+    with app.app_context():
+        response_data = get_cached_analysis(track['id'], analyzer)
+        if response_data is not None:
+            return response_data
+        # Shares the run with a /search for the same track
+        return analysis_flight.do(
+            (track['id'], analyzer.name),
+            lambda: analyze_and_store(track, analyzer)
+        )
+
+def save_results(job, results):
+    try:
+        job.results = json.dumps(results)
+        job.updated_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as db_error:
+        db.session.rollback()
+        print(f"Database error: {str(db_error)}")
+
+def iter_batch(app, job, analyzer, deadline=None):
+    # Yields one line per track as it finishes, then the aggregate and a
+    # final 'done' line. Tracks finished by an earlier run of the job are
+    # replayed from the analysis cache instead of being analyzed again
+    track_ids = json.loads(job.track_ids)
+    results = json.loads(job.results)
+    aggregate = BatchAggregate()
+    pending = []
+
+    yield {'section': 'job', 'data': job_summary(job)}
+
+    for position, track_id in enumerate(track_ids):
+        status = results.get(track_id)
+        if status not in FINAL_STATUSES:
+            pending.append((position, track_id))
+            continue
+        data = get_cached_analysis(track_id, analyzer) if status == 'ok' else None
+        if status == 'ok' and data is None:
+            # Expired from the cache since; analyze it again
+            pending.append((position, track_id))
+            continue
+        if data is not None:
+            aggregate.add(data)
+        yield {'section': 'track', 'track_id': track_id, 'position': position, 'status': status, 'resumed': True, 'data': data}
+
+    timed_out = False
+    if pending:
+        # Full track objects for everything left, 50 per Spotify request
+        tracks = get_spotify_tracks([track_id for _, track_id in pending])
+        futures = {}
+        for (position, track_id), track in zip(pending, tracks):
+            if track is None:
+                results[track_id] = 'not_found'
+                save_results(job, results)
+                yield {'section': 'track', 'track_id': track_id, 'position': position, 'status': 'not_found', 'data': None}
+                continue
+            futures[executor.submit(analyze_in_context, app, track, analyzer)] = (position, track_id)
+
+        try:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            for future in as_completed(futures, timeout=remaining):
+                position, track_id = futures[future]
+                line = {'section': 'track', 'track_id': track_id, 'position': position, 'data': None}
+                try:
+                    data = future.result()
+                    line['data'] = data
+                    line['status'] = 'partial' if data['unavailable'] else 'ok'
+                    aggregate.add(data)
+                except LyricsNotFound:
+                    line['status'] = 'lyrics_not_found'
+                except Exception as e:
+                    line['status'] = 'error'
+                    line['error'] = str(e)
+                results[track_id] = line['status']
+                save_results(job, results)
+                yield line
+        except FutureTimeoutError:
+            timed_out = True
+        finally:
+            # Tracks not started yet are dropped; running ones finish in the
+            # background and land in the analysis cache for the next run
+            for future in futures:
+                future.cancel()
+
+    yield {'section': 'aggregate', 'data': aggregate.result()}
+    summary = job_summary(job)
+    yield {'section': 'done', 'data': summary, 'timed_out': timed_out}
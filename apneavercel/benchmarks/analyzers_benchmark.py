@@ -0,0 +1,124 @@
+"""Compare the local analyzer with the Hugging Face models.
+
+Run from apneavercel/:
+
+    python -m benchmarks.analyzers_benchmark                      # local latency only
+    python -m benchmarks.analyzers_benchmark --live --record out.json
+    python -m benchmarks.analyzers_benchmark --remote-fixture out.json
+
+--live calls the remote models (needs HUGGINGFACE_API_KEY) and --record saves
+their outputs so later runs can measure agreement offline.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from analyzers import LocalAnalyzer, TOPIC_KEYWORDS
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+METHODS = ('sentiment', 'emotions', 'topics', 'summary')
+
+def load_corpus(path):
+    with open(path) as f:
+        return json.load(f)
+
+def run_method(analyzer, method, lyrics):
+    if method == 'summary':
+        return analyzer.summary(lyrics, None)
+    # The app sends the first 512 characters to the classifiers
+    return getattr(analyzer, method)(lyrics[:512])
+
+def time_analyzer(analyzer, corpus, repeat):
+    outputs = {}
+    latencies = {method: [] for method in METHODS}
+    for item in corpus:
+        outputs[item['id']] = {}
+        for method in METHODS:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = run_method(analyzer, method, item['lyrics'])
+                latencies[method].append((time.perf_counter() - start) * 1000)
+            outputs[item['id']][method] = result
+    return outputs, latencies
+
+def summarize_latencies(latencies):
+    summary = {}
+    for method, values in latencies.items():
+        values = sorted(values)
+        summary[method] = {
+            'mean_ms': round(statistics.mean(values), 3),
+            'p50_ms': round(values[len(values) // 2], 3),
+            'p95_ms': round(values[min(len(values) - 1, int(len(values) * 0.95))], 3)
+        }
+    return summary
+
+def top_label(result):
+    if isinstance(result, dict):
+        return result['labels'][0]
+    return max(result[0], key=lambda item: item['score'])['label']
+
+def expected_stars(result):
+    return sum(int(item['label'][0]) * item['score'] for item in result[0])
+
+def agreement(local_outputs, remote_outputs):
+    ids = [song_id for song_id in local_outputs if song_id in remote_outputs]
+    if not ids:
+        return None
+
+    report = {'songs': len(ids)}
+    for method in ('sentiment', 'emotions', 'topics'):
+        pairs = [(local_outputs[i][method], remote_outputs[i][method]) for i in ids]
+        report[f'{method}_top_label_agreement'] = round(
+            sum(top_label(local) == top_label(remote) for local, remote in pairs) / len(pairs), 3
+        )
+    report['sentiment_mean_star_difference'] = round(statistics.mean(
+        abs(expected_stars(local_outputs[i]['sentiment']) - expected_stars(remote_outputs[i]['sentiment']))
+        for i in ids
+    ), 3)
+    report['topics_top3_overlap'] = round(statistics.mean(
+        len(set(local_outputs[i]['topics']['labels'][:3]) & set(remote_outputs[i]['topics']['labels'][:3])) / 3
+        for i in ids
+    ), 3)
+    return report
+
+def remote_analyzer():
+    from analysis import get_analyzer
+    return get_analyzer('remote')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=os.path.join(FIXTURES_DIR, 'lyrics_corpus.json'))
+    parser.add_argument('--repeat', type=int, default=20, help='Local runs per song and method')
+    parser.add_argument('--live', action='store_true', help='Call the remote models')
+    parser.add_argument('--record', help='Save remote outputs to this file (with --live)')
+    parser.add_argument('--remote-fixture', help='Recorded remote outputs to compare against')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    report = {'corpus': os.path.basename(args.corpus), 'songs': len(corpus)}
+
+    # TOPIC_KEYWORDS covers the app's candidate topics in the same order
+    local = LocalAnalyzer(list(TOPIC_KEYWORDS))
+    local_outputs, local_latencies = time_analyzer(local, corpus, args.repeat)
+    report['local'] = summarize_latencies(local_latencies)
+
+    remote_outputs = None
+    if args.live:
+        remote_outputs, remote_latencies = time_analyzer(remote_analyzer(), corpus, 1)
+        report['remote'] = summarize_latencies(remote_latencies)
+        if args.record:
+            with open(args.record, 'w') as f:
+                json.dump(remote_outputs, f, indent=2)
+    elif args.remote_fixture:
+        with open(args.remote_fixture) as f:
+            remote_outputs = json.load(f)
+
+    if remote_outputs:
+        report['agreement'] = agreement(local_outputs, remote_outputs)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Connect and first-query latency of each database engine profile.
+
+Run from apneavercel/:
+
+    python -m benchmarks.db_connect
+    POSTGRES_URL_NON_POOLING=postgresql://... POSTGRES_URL=postgresql://... \\
+        python -m benchmarks.db_connect --profile server --profile serverless --profile pgbouncer --idle 30
+
+Every run is a fresh interpreter, like a cold function instance. It builds
+the engine from database.py for the profile, then times:
+
+- first_query: the first checkout and SELECT 1, including the connection
+  handshake
+- table_query: a query on the song table right after, on the same engine
+- warm_query: another checkout and SELECT 1, the cost on a warm instance
+  (a pooled connection is reused; NullPool connects again)
+- after_idle: a checkout and SELECT 1 after --idle seconds, which includes
+  the pre-ping and any reconnect of a pooled profile
+
+The report has the median of each over --runs runs. Profiles whose database
+URL isn't set are skipped; sqlite uses the bundled apnea.db.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = ('sqlite', 'serverless', 'server', 'pgbouncer')
+TIMINGS = ('import_ms', 'engine_ms', 'first_query_ms', 'table_query_ms', 'warm_query_ms', 'after_idle_ms')
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from sqlalchemy import create_engine, text
+from database import engine_profile
+imported = time.perf_counter()
+profile, url, options = engine_profile(sys.argv[1])
+engine = create_engine(url, **options)
+created = time.perf_counter()
+
+def timed(query):
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        connection.execute(text(query)).all()
+    return (time.perf_counter() - started) * 1000
+
+first_query = timed('SELECT 1')
+try:
+    table_query = timed('SELECT id FROM song ORDER BY id LIMIT 1')
+except Exception:
+    table_query = None
+warm_query = timed('SELECT 1')
+time.sleep(float(sys.argv[2]))
+after_idle = timed('SELECT 1')
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'engine_ms': (created - imported) * 1000,
+    'first_query_ms': first_query,
+    'table_query_ms': table_query,
+    'warm_query_ms': warm_query,
+    'after_idle_ms': after_idle,
+    'pool': engine.pool.__class__.__name__
+}))
+"""
+
+def configured(profile):
+    if profile == 'sqlite':
+        return True
+    if profile == 'pgbouncer':
+        return bool(os.getenv('POSTGRES_URL'))
+    url = os.getenv('POSTGRES_URL_NON_POOLING') or ''
+    return bool(url) and not url.startswith('sqlite')
+
+def run_profile(profile, idle):
+    environment = dict(os.environ)
+    if profile == 'sqlite' and not (environment.get('POSTGRES_URL_NON_POOLING') or '').startswith('sqlite'):
+        environment.pop('POSTGRES_URL_NON_POOLING', None)
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, profile, str(idle)],
+        cwd=APP_DIR, env=environment, capture_output=True, text=True
+    )
+    if result.returncode:
+        errors = [line for line in result.stderr.splitlines() if 'Error' in line]
+        raise RuntimeError(errors[-1] if errors else result.stderr.strip())
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def summarize(samples):
+    summary = {'pool': samples[0]['pool']}
+    for timing in TIMINGS:
+        values = [sample[timing] for sample in samples if sample[timing] is not None]
+        summary[timing] = round(statistics.median(values), 2) if values else None
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', action='append', choices=PROFILES, help='Profile to measure (repeatable; default: all)')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per profile')
+    parser.add_argument('--idle', type=float, default=0, help='Seconds to wait before the after_idle query')
+    args = parser.parse_args()
+
+    report = {}
+    for profile in args.profile or PROFILES:
+        if not configured(profile):
+            print(f"Skipping {profile}: its database URL is not set", file=sys.stderr)
+            continue
+        try:
+            report[profile] = summarize([run_profile(profile, args.idle) for _ in range(args.runs)])
+        except RuntimeError as e:
+            print(f"{profile} failed: {str(e)}", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""Load test /search offline against stub upstreams.
+
+Run from apneavercel/:
+
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --requests 500 --concurrency 20 --unique
+    python -m benchmarks.load_test --errors huggingface=0.1:503 --output run.json
+    python -m benchmarks.load_test --compare baseline.json
+
+Starts the stubs from stub_upstreams.py and points the app at them through
+its base URL settings. The app runs on a local threaded server with a
+throwaway SQLite database, and the test drives it with concurrent clients.
+The report has req/s, latency percentiles, response statuses and upstream
+calls per request, plus the app's /api/stats at the end. --output saves it
+as JSON, and --compare prints the change against a saved report.
+
+Queries cycle through the fixture songs, so after the first round they are
+served from the analysis cache; --unique makes every query a new track and
+runs the whole pipeline each time.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from benchmarks.stub_upstreams import add_stub_arguments, load_fixtures, parse_behaviors, start_stubs, stub_environment
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Report fields --compare lines up, and whether higher is better
+COMPARED_METRICS = (
+    ('req_per_s', True),
+    ('latency_ms.p50', False),
+    ('latency_ms.p95', False),
+    ('latency_ms.p99', False),
+    ('upstream_calls_per_request.total', False),
+    ('error_rate', False)
+)
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def start_app(environment):
+    # The app reads its settings at import, so the environment is set first
+    os.environ.update(environment)
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from app import app
+    from api import get_api_app
+    from models import db
+
+    with get_api_app().app_context():
+        db.create_all()
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name='app', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def queries(fixtures, count, unique):
+    songs = fixtures['songs']
+    for i in range(count):
+        song = songs[i % len(songs)]
+        query = f"{song['name']} {song['artist']}"
+        yield f"{query} #{i}" if unique else query
+
+def run_load(base_url, path, query_list, concurrency, timeout):
+    local = threading.local()
+
+    def send(query):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = local.session.post(f"{base_url}{path}", json={'query': query}, timeout=timeout)
+            # Streamed responses count once the last line has arrived
+            response.content
+            status = response.status_code
+            if status == 200 and path.endswith('/stream') and '"section": "error"' in response.text:
+                status = 'stream_error'
+        except requests.RequestException as e:
+            status = e.__class__.__name__
+        return (time.perf_counter() - start) * 1000, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, query_list))
+    return time.perf_counter() - started, results
+
+def git_version():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=APP_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def build_report(args, started_at, elapsed, results, stubs, app_stats):
+    latencies = sorted(latency for latency, _ in results)
+    statuses = Counter(str(status) for _, status in results)
+    completed = len(results)
+
+    calls = {}
+    total_calls = 0
+    for name, stub in stubs.items():
+        calls[name] = {endpoint: round(count / completed, 3) for endpoint, count in sorted(stub.calls.items())}
+        total_calls += sum(stub.calls.values())
+    calls['total'] = round(total_calls / completed, 3)
+
+    return {
+        'version': git_version(),
+        'started_at': started_at.isoformat(),
+        'python': platform.python_version(),
+        'config': {
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'endpoint': args.endpoint,
+            'unique': args.unique,
+            'latency': args.latency or [],
+            'errors': args.errors or [],
+            'no_latency': args.no_latency,
+            'env': args.env or []
+        },
+        'duration_s': round(elapsed, 3),
+        'req_per_s': round(completed / elapsed, 2),
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies), 1),
+            'p50': round(percentile(latencies, 0.50), 1),
+            'p95': round(percentile(latencies, 0.95), 1),
+            'p99': round(percentile(latencies, 0.99), 1),
+            'max': round(latencies[-1], 1)
+        },
+        'statuses': dict(statuses),
+        'error_rate': round(1 - statuses.get('200', 0) / completed, 4),
+        'upstream_calls_per_request': calls,
+        'app_stats': app_stats
+    }
+
+def lookup(report, dotted):
+    value = report
+    for key in dotted.split('.'):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+def compare(report, baseline):
+    lines = [f"Compared with {baseline.get('version')} ({baseline.get('started_at')}):"]
+    for metric, higher_is_better in COMPARED_METRICS:
+        old, new = lookup(baseline, metric), lookup(report, metric)
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else 'n/a'
+        better = new == old or (new > old) == higher_is_better
+        lines.append(f"  {metric:<36} {old:>10} -> {new:<10} {change:>8} {'' if better else '(worse)'}")
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests')
+    parser.add_argument('--concurrency', type=int, default=10, help='Clients sending at once')
+    parser.add_argument('--warmup', type=int, default=10, help='Requests sent first and left out of the report')
+    parser.add_argument('--endpoint', choices=('search', 'stream'), default='search')
+    parser.add_argument('--unique', action='store_true', help='Make every query a new track (no cache hits)')
+    parser.add_argument('--timeout', type=float, default=60, help='Client timeout per request, in seconds')
+    parser.add_argument('--database', help='Database URL (default: a throwaway SQLite file)')
+    parser.add_argument('--env', action='append', metavar='NAME=VALUE', help='App setting, e.g. SPOTIFY_RATE_PER_SEC=100')
+    parser.add_argument('--output', help='Save the report to this JSON file')
+    parser.add_argument('--compare', help='Saved report to compare with')
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    stubs = start_stubs(fixtures, parse_behaviors(fixtures, args.latency, args.errors, args.no_latency))
+
+    environment = stub_environment(stubs)
+    database_path = None
+    if args.database:
+        environment['POSTGRES_URL_NON_POOLING'] = args.database
+    else:
+        database_fd, database_path = tempfile.mkstemp(prefix='apnea-load-', suffix='.db')
+        os.close(database_fd)
+        environment['POSTGRES_URL_NON_POOLING'] = f"sqlite:///{database_path}"
+        # The similarity index of a throwaway database goes with it
+        environment['SIMILARITY_INDEX_PATH'] = f"{database_path}.similarity.npz"
+    for item in args.env or []:
+        name, value = item.split('=', 1)
+        environment[name] = value
+
+    server, base_url = start_app(environment)
+    path = '/search/stream' if args.endpoint == 'stream' else '/search'
+    try:
+        # Unique warm-up queries open connections and build the API app
+        # without putting the measured queries in the cache
+        if args.warmup:
+            run_load(base_url, path, [f"warmup {i}" for i in range(args.warmup)], args.concurrency, args.timeout)
+        for stub in stubs.values():
+            stub.reset()
+
+        started_at = datetime.utcnow()
+        elapsed, results = run_load(
+            base_url, path, list(queries(fixtures, args.requests, args.unique)), args.concurrency, args.timeout
+        )
+        # /api/stats needs the metrics token when one is set
+        token = os.getenv('METRICS_TOKEN')
+        app_stats = requests.get(
+            f"{base_url}/api/stats",
+            headers={'Authorization': f"Bearer {token}"} if token else None,
+            timeout=args.timeout
+        ).json()
+        report = build_report(args, started_at, elapsed, results, stubs, app_stats)
+    finally:
+        server.shutdown()
+        for stub in stubs.values():
+            stub.stop()
+        if database_path:
+            os.remove(database_path)
+            if os.path.exists(f"{database_path}.similarity.npz"):
+                os.remove(f"{database_path}.similarity.npz")
+
+    print(json.dumps({key: value for key, value in report.items() if key != 'app_stats'}, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Throughput of the lyrics text processing on a large synthetic corpus.
+
+Run from apneavercel/:
+
+    python -m benchmarks.lyrics_text_benchmark
+    python -m benchmarks.lyrics_text_benchmark --size-mb 20 --repeat 5
+
+Songs are assembled from the fixture corpus lines (with Genius-style headers,
+numbered verses and repeated choruses) until the corpus reaches --size-mb.
+Each stage is timed over every song and reported in MB/s and ms per MB,
+next to the previous three-function pipeline for comparison.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import time
+from collections import Counter
+
+from lyrics_text import analyze_lyrics, clean_lyrics, STOP_WORDS
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+def synthetic_corpus(path, size_mb, seed):
+    with open(path) as f:
+        lines = [
+            line for item in json.load(f) for line in item['lyrics'].split('\n')
+            if line.strip() and not line.startswith('[')
+        ]
+    rng = random.Random(seed)
+    songs = []
+    total = 0
+    while total < size_mb * 1024 * 1024:
+        chorus = rng.sample(lines, 4)
+        parts = [f"{rng.randint(1, 400)} Contributors Synthetic Song {len(songs)} Lyrics"]
+        for verse in range(1, rng.randint(2, 4) + 1):
+            parts.append(f"[Verse {verse}]")
+            parts.extend(rng.sample(lines, rng.randint(4, 8)))
+            parts.append('')
+            parts.append('[Chorus]')
+            parts.extend(chorus)
+            parts.append('')
+        parts.append('[Outro]')
+        parts.extend(rng.sample(lines, 2))
+        song = '\n'.join(parts)
+        songs.append(song)
+        total += len(song.encode('utf-8'))
+    return songs, total
+
+# The pipeline before lyrics_text.py, kept here as the baseline
+def legacy_clean_lyrics(lyrics):
+    cleaned_lyrics = re.sub(r'\d+ Contributors.*?Lyrics', '', lyrics, flags=re.DOTALL)
+    cleaned_lyrics = re.sub(r'^.*?\[', '[', cleaned_lyrics, flags=re.DOTALL)
+    if not cleaned_lyrics.strip():
+        cleaned_lyrics = lyrics
+    return cleaned_lyrics.strip()
+
+def legacy_stats_and_frequency(lyrics):
+    words = lyrics.split()
+    unique_words = set(words)
+    line_count = len([l for l in lyrics.split('\n') if l.strip()])
+    stats = {
+        'word_count': len(words),
+        'unique_word_count': len(unique_words),
+        'line_count': line_count,
+        'vocabulary_density': round(len(unique_words) / len(words) * 100, 2) if words else 0
+    }
+    cleaned_text = re.sub(r'[^\w\s]', '', lyrics.lower())
+    stop_words = set(STOP_WORDS)  # was rebuilt as a literal on every call
+    filtered_words = [word for word in cleaned_text.split() if word not in stop_words and len(word) > 1]
+    return stats, Counter(filtered_words).most_common(10)
+
+def time_stage(fn, songs, repeat):
+    # Best of `repeat` passes over the corpus
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for song in songs:
+            fn(song)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def throughput(seconds, size_bytes, songs):
+    size_mb = size_bytes / (1024 * 1024)
+    return {
+        'mb_per_s': round(size_mb / seconds, 2),
+        'ms_per_mb': round(seconds * 1000 / size_mb, 2),
+        'songs_per_s': round(songs / seconds)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=os.path.join(FIXTURES_DIR, 'lyrics_corpus.json'))
+    parser.add_argument('--size-mb', type=float, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    songs, size_bytes = synthetic_corpus(args.corpus, args.size_mb, args.seed)
+    cleaned = [clean_lyrics(song) for song in songs]
+
+    stages = {
+        'clean': (clean_lyrics, songs),
+        'analyze': (analyze_lyrics, cleaned),
+        'analyze_with_lines': (lambda song: analyze_lyrics(song, with_lines=True), cleaned),
+        'clean_and_analyze': (lambda song: analyze_lyrics(clean_lyrics(song)), songs),
+        'legacy_clean': (legacy_clean_lyrics, songs),
+        'legacy_stats_and_frequency': (legacy_stats_and_frequency, cleaned),
+        'legacy_total': (lambda song: legacy_stats_and_frequency(legacy_clean_lyrics(song)), songs)
+    }
+    report = {
+        'songs': len(songs),
+        'size_mb': round(size_bytes / (1024 * 1024), 2),
+        'stages': {
+            name: throughput(time_stage(fn, inputs, args.repeat), size_bytes, len(songs))
+            for name, (fn, inputs) in stages.items()
+        }
+    }
+    report['speedup'] = round(
+        report['stages']['clean_and_analyze']['mb_per_s'] / report['stages']['legacy_total']['mb_per_s'], 2
+    )
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Size of the /search response in each format and encoding.
+
+Run from apneavercel/:
+
+    python -m benchmarks.payload_size
+    python -m benchmarks.payload_size --check
+
+Builds the /search result of every fixture song the way the pipeline does:
+the lyrics text analysis, plus the fixture Hugging Face responses for the song
+and each lyrics section, with the topics model echoing the lyrics back in
+"sequence" like the hosted one does.
+Each result is serialized as today's full format and as the views clients
+ask for with format=compact and fields=, then gzip- and brotli-compressed
+with the settings the API uses. The report has the mean bytes per view and
+encoding, and the share of the full, uncompressed response.
+
+--check exits non-zero when a compact view repeats label lists instead of
+sending one label table per model, when a compact view is larger than the
+full format, or when the view the results page fetches (compressed) is more
+than PAYLOAD_BUDGET_RATIO of the full format (uncompressed).
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+from compression import compress
+from lyrics_text import analyze_lyrics
+from payload import parse_fields, shape_payload
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# (name, fields, compact); 'page' is SEARCH_FIELDS in static/js/analytics.js
+VIEWS = (
+    ('full', None, False),
+    ('compact', None, True),
+    ('page', 'track,lyrics,word_frequency,sentiment,emotions,topics', True),
+    ('charts', 'charts', True),
+    ('sections', 'section_scores', True)
+)
+ENCODINGS = ('identity', 'gzip', 'br')
+
+PAYLOAD_BUDGET_RATIO = float(os.getenv('PAYLOAD_BUDGET_RATIO', '0.4'))
+
+def search_results(fixtures_path, corpus_path):
+    with open(fixtures_path) as f:
+        fixtures = json.load(f)
+    with open(corpus_path) as f:
+        lyrics_by_id = {item['id']: item['lyrics'] for item in json.load(f)}
+    models = fixtures['huggingface']
+
+    for song in fixtures['songs']:
+        lyrics = lyrics_by_id[song['id']]
+        text = analyze_lyrics(lyrics)
+        # Each lyrics section scored like the song, in the shapes
+        # combine_windows gives them
+        topics = models['facebook/bart-large-mnli']
+        section_scores = [
+            {
+                'name': section['name'],
+                'sentiment': models['nlptown/bert-base-multilingual-uncased-sentiment'],
+                'emotions': models['j-hartmann/emotion-english-distilroberta-base'],
+                'topics': {'labels': topics['labels'], 'scores': topics['scores']}
+            }
+            for section in text['sections']
+        ]
+        yield song['id'], {
+            'track_name': song['name'],
+            'artist': song['artist'],
+            'album': song['album'],
+            'spotify_url': f"https://open.spotify.com/track/{song['id']}",
+            'album_art': f"https://i.scdn.co/image/{song['id']}",
+            'genius_url': f"https://genius.com/{song['id']}-lyrics",
+            'lyrics': lyrics,
+            'stats': text['stats'],
+            'word_frequency': text['word_frequency'],
+            'sections': text['sections'],
+            'sentiment': models['nlptown/bert-base-multilingual-uncased-sentiment'],
+            'emotions': models['j-hartmann/emotion-english-distilroberta-base'],
+            'topics': dict(models['facebook/bart-large-mnli'], sequence=lyrics),
+            'summary': models['facebook/bart-large-cnn'],
+            'section_scores': section_scores,
+            'unavailable': []
+        }
+
+def encoded_size(data, encoding):
+    return len(data) if encoding == 'identity' else len(compress(data, encoding))
+
+def inline_label_lists(value):
+    # Label lists anywhere in a compact view besides its top-level label
+    # tables; there should be none
+    if isinstance(value, dict):
+        return ('labels' in value) + sum(inline_label_lists(item) for item in value.values())
+    if isinstance(value, list):
+        return sum(inline_label_lists(item) for item in value)
+    return 0
+
+def measure(results):
+    # {view: {encoding: [bytes per song]}}, plus the inline label lists of
+    # each compact view as {view: [count per song]}
+    sizes = {view: {encoding: [] for encoding in ENCODINGS} for view, _, _ in VIEWS}
+    inline_labels = {view: [] for view, _, compact in VIEWS if compact}
+    for _, response_data in results:
+        for view, fields, compact in VIEWS:
+            shaped = shape_payload(response_data, parse_fields(fields), compact)
+            if compact:
+                inline_labels[view].append(inline_label_lists({key: value for key, value in shaped.items() if key != 'labels'}))
+            data = json.dumps(shaped).encode('utf-8')
+            for encoding in ENCODINGS:
+                sizes[view][encoding].append(encoded_size(data, encoding))
+    return sizes, inline_labels
+
+def report(sizes):
+    full = statistics.mean(sizes['full']['identity'])
+    return {
+        view: {
+            encoding: {'bytes': round(statistics.mean(values)), 'of_full': round(statistics.mean(values) / full, 3)}
+            for encoding, values in by_encoding.items()
+        }
+        for view, by_encoding in sizes.items()
+    }
+
+def check(sizes, inline_labels):
+    failures = []
+    for view, counts in inline_labels.items():
+        for i, count in enumerate(counts):
+            if count:
+                failures.append(f"{view}: song {i} repeats {count} label lists outside the label tables")
+    full = sizes['full']['identity']
+    for view, fields, compact in VIEWS:
+        if view == 'full':
+            continue
+        for i, (size, full_size) in enumerate(zip(sizes[view]['identity'], full)):
+            if size > full_size:
+                failures.append(f"{view}: song {i} is {size} bytes, full format {full_size}")
+    for encoding in ('gzip', 'br'):
+        for i, (size, full_size) in enumerate(zip(sizes['page'][encoding], full)):
+            if size > full_size * PAYLOAD_BUDGET_RATIO:
+                failures.append(
+                    f"page ({encoding}): song {i} is {size} bytes, over {PAYLOAD_BUDGET_RATIO:.0%} of {full_size}"
+                )
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', default=os.path.join(FIXTURES_DIR, 'upstream_fixtures.json'))
+    parser.add_argument('--corpus', default=os.path.join(FIXTURES_DIR, 'lyrics_corpus.json'))
+    parser.add_argument('--check', action='store_true', help='Fail when a view is over its budget')
+    args = parser.parse_args()
+
+    sizes, inline_labels = measure(search_results(args.fixtures, args.corpus))
+    print(json.dumps(report(sizes), indent=2))
+
+    if args.check:
+        failures = check(sizes, inline_labels)
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Build, query, save and load times of the /api/similar index.
+
+Run from apneavercel/:
+
+    python -m benchmarks.similarity_benchmark
+    python -m benchmarks.similarity_benchmark --songs 100000 --check
+
+Synthetic analyses (top words drawn from a vocabulary per genre, emotion and
+topic scores leaning to the genre's label) are turned into feature vectors
+and inserted one at a time, like songs analyzed by /search. The report has
+feature and insert throughput, top-k query latency percentiles, and how long
+the index takes to save and reload. --check fails when the p95 query time
+is over SIMILARITY_QUERY_BUDGET_MS, or when most results of a query aren't
+from the song's genre.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from similarity import SimilarityIndex, song_features
+
+SIMILARITY_QUERY_BUDGET_MS = float(os.getenv('SIMILARITY_QUERY_BUDGET_MS', '10'))
+
+GENRES = 20
+EMOTIONS = ('anger', 'disgust', 'fear', 'joy', 'neutral', 'sadness', 'surprise')
+TOPICS = ('love', 'heartbreak', 'party', 'money', 'nostalgia', 'struggle', 'freedom', 'faith')
+
+def synthetic_payload(rng, genre, vocabulary):
+    words = rng.sample(vocabulary[genre], 15) + rng.sample(vocabulary['common'], 5)
+    emotions = [rng.random() * 0.2 for _ in EMOTIONS]
+    emotions[genre % len(EMOTIONS)] += 0.8
+    topics = [rng.random() * 0.2 for _ in TOPICS]
+    topics[genre % len(TOPICS)] += 0.7
+    return {
+        'word_frequency': [(word, rng.randint(1, 12)) for word in words],
+        'emotions': [[{'label': label, 'score': score} for label, score in zip(EMOTIONS, emotions)]],
+        'topics': {'sequence': '', 'labels': list(TOPICS), 'scores': topics}
+    }
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--songs', type=int, default=50000, help='Songs in the index')
+    parser.add_argument('--queries', type=int, default=500, help='Top-k queries to time')
+    parser.add_argument('--limit', type=int, default=10, help='k of each query')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--check', action='store_true', help='Fail over budget or on poor genre recall')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = {genre: [f"g{genre}w{i}" for i in range(60)] for genre in range(GENRES)}
+    vocabulary['common'] = [f"common{i}" for i in range(200)]
+    genres = [rng.randrange(GENRES) for _ in range(args.songs)]
+    payloads = [synthetic_payload(rng, genre, vocabulary) for genre in genres]
+
+    started = time.perf_counter()
+    vectors = [song_features(payload) for payload in payloads]
+    features_s = time.perf_counter() - started
+
+    index = SimilarityIndex()
+    started = time.perf_counter()
+    for song_id, vector in enumerate(vectors):
+        index.add(song_id, vector, f"track{song_id}")
+    insert_s = time.perf_counter() - started
+
+    query_ids = [rng.randrange(args.songs) for _ in range(args.queries)]
+    latencies = []
+    same_genre = []
+    for song_id in query_ids:
+        started = time.perf_counter()
+        matches = index.similar(song_id, args.limit)
+        latencies.append((time.perf_counter() - started) * 1000)
+        same_genre.append(sum(genres[match_id] == genres[song_id] for match_id, _ in matches) / len(matches))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'similarity.npz')
+        started = time.perf_counter()
+        index.save(path, 'benchmark')
+        save_ms = (time.perf_counter() - started) * 1000
+        size = os.path.getsize(path)
+        started = time.perf_counter()
+        SimilarityIndex().load(path, 'benchmark')
+        load_ms = (time.perf_counter() - started) * 1000
+
+    report = {
+        'songs': args.songs,
+        'index_mb': index.stats()['megabytes'],
+        'features_per_s': round(args.songs / features_s),
+        'inserts_per_s': round(args.songs / insert_s),
+        'query_ms': {
+            'p50': round(statistics.median(latencies), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+            'p99': round(percentile(latencies, 0.99), 3)
+        },
+        'same_genre_share': round(statistics.mean(same_genre), 3),
+        'save_ms': round(save_ms, 1),
+        'load_ms': round(load_ms, 1),
+        'file_mb': round(size / 1e6, 2)
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.check:
+        failures = []
+        if report['query_ms']['p95'] > SIMILARITY_QUERY_BUDGET_MS:
+            failures.append(f"p95 query {report['query_ms']['p95']}ms over {SIMILARITY_QUERY_BUDGET_MS}ms")
+        if report['same_genre_share'] < 0.5:
+            failures.append(f"only {report['same_genre_share']:.0%} of results share the song's genre")
+        for failure in failures:
+            print(failure, file=sys.stderr)
+        sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
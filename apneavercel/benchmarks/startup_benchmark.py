@@ -0,0 +1,110 @@
+"""Measure cold-start cost per route.
+
+Run from apneavercel/:
+
+    python -m benchmarks.startup_benchmark
+    python -m benchmarks.startup_benchmark --route / --route /api/stats --runs 5
+    python -m benchmarks.startup_benchmark --check
+
+Every run is a fresh interpreter, like a serverless cold start: it imports
+app.py, then serves one request for the route through the test client. The
+report has the median import and first-request times and the heavy modules
+the route pulled in.
+
+--check exits non-zero when a page route goes over COLD_START_BUDGET_MS
+(import + first request), an API route goes over COLD_START_API_BUDGET_MS,
+or a page route imports any of the heavy modules.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGE_ROUTES = ('/', '/about', '/trending', '/contact', '/donate')
+# Served by the API app but needs neither the database nor an upstream
+API_ROUTES = ('/api/stats',)
+
+# Modules that only the API app should load
+HEAVY_MODULES = ('sqlalchemy', 'flask_sqlalchemy', 'lyricsgenius', 'textblob', 'bs4', 'numpy', 'requests')
+
+COLD_START_BUDGET_MS = float(os.getenv('COLD_START_BUDGET_MS', '600'))
+COLD_START_API_BUDGET_MS = float(os.getenv('COLD_START_API_BUDGET_MS', '2500'))
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+response = app.test_client().get(sys.argv[1])
+served = time.perf_counter()
+# One write, so a line the API app's preload threads print can't split it
+sys.stdout.write('SAMPLE ' + json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_request_ms': (served - imported) * 1000,
+    'status': response.status_code,
+    'heavy_modules': [m for m in sys.argv[2].split(',') if m in sys.modules]
+}) + '\\n')
+"""
+SAMPLE_PATTERN = re.compile(r'SAMPLE (\{.*\})')
+
+def cold_start(route):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, route, ','.join(HEAVY_MODULES)],
+        cwd=APP_DIR, capture_output=True, text=True, check=True
+    )
+    sample = json.loads(SAMPLE_PATTERN.search(result.stdout).group(1))
+    sample['process_ms'] = (time.perf_counter() - started) * 1000
+    return sample
+
+def measure(route, runs):
+    samples = [cold_start(route) for _ in range(runs)]
+    report = {
+        key: round(statistics.median(sample[key] for sample in samples), 1)
+        for key in ('import_ms', 'first_request_ms', 'process_ms')
+    }
+    report['cold_start_ms'] = round(report['import_ms'] + report['first_request_ms'], 1)
+    report['status'] = samples[-1]['status']
+    report['heavy_modules'] = samples[-1]['heavy_modules']
+    return report
+
+def over_budget(route, report, budget_ms, api_budget_ms):
+    problems = []
+    budget = budget_ms if route in PAGE_ROUTES else api_budget_ms
+    if report['cold_start_ms'] > budget:
+        problems.append(f"{route}: cold start {report['cold_start_ms']} ms over the {budget} ms budget")
+    if route in PAGE_ROUTES and report['heavy_modules']:
+        problems.append(f"{route}: imports {', '.join(report['heavy_modules'])}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--route', action='append', help='Route to measure (repeatable; default: pages and /api/stats)')
+    parser.add_argument('--runs', type=int, default=3, help='Fresh interpreters per route')
+    parser.add_argument('--check', action='store_true', help='Exit 1 when a route is over its budget')
+    parser.add_argument('--budget-ms', type=float, default=COLD_START_BUDGET_MS)
+    parser.add_argument('--api-budget-ms', type=float, default=COLD_START_API_BUDGET_MS)
+    args = parser.parse_args()
+
+    routes = args.route or list(PAGE_ROUTES + API_ROUTES)
+    report = {route: measure(route, args.runs) for route in routes}
+    print(json.dumps(report, indent=2))
+
+    if args.check:
+        problems = [
+            problem
+            for route in routes
+            for problem in over_budget(route, report[route], args.budget_ms, args.api_budget_ms)
+        ]
+        for problem in problems:
+            print(problem, file=sys.stderr)
+        sys.exit(1 if problems else 0)
+
+if __name__ == '__main__':
+    main()
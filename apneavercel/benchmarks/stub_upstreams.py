@@ -0,0 +1,288 @@
+"""Local stand-ins for Spotify, Genius and Hugging Face.
+
+Each upstream gets its own HTTP server on 127.0.0.1 that replays the
+responses in fixtures/upstream_fixtures.json. Latency follows a log-normal
+distribution given by its median and p99, and a share of requests can be
+answered with an error status. Used by load_test.py; run on its own to
+point a dev server at the stubs:
+
+    python -m benchmarks.stub_upstreams
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+UPSTREAMS = ('spotify_accounts', 'spotify', 'genius_api', 'genius_web', 'huggingface')
+
+# z-score of the 99th percentile of a normal distribution
+P99_Z = 2.326
+
+def load_fixtures(path=None, corpus_path=None):
+    with open(path or os.path.join(FIXTURES_DIR, 'upstream_fixtures.json')) as f:
+        fixtures = json.load(f)
+    with open(corpus_path or os.path.join(FIXTURES_DIR, 'lyrics_corpus.json')) as f:
+        lyrics = {item['id']: item['lyrics'] for item in json.load(f)}
+    for song in fixtures['songs']:
+        song['lyrics'] = lyrics[song['id']]
+    return fixtures
+
+class Behavior:
+    # Latency (log-normal from median and p99, in ms) and error injection
+    # for one upstream
+    def __init__(self, median_ms, p99_ms=None, error_rate=0.0, error_status=500):
+        self.median_ms = median_ms
+        self.sigma = math.log(p99_ms / median_ms) / P99_Z if p99_ms and median_ms and p99_ms > median_ms else 0
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def delay(self):
+        if not self.median_ms:
+            return 0
+        return random.lognormvariate(math.log(self.median_ms), self.sigma) / 1000
+
+    def fails(self):
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+def pick_song(songs, text):
+    # The song whose name is in the text, else one picked by a stable hash
+    text = text.lower()
+    for song in songs:
+        if song['name'].lower() in text:
+            return song
+    return songs[int(hashlib.sha1(text.encode('utf-8')).hexdigest(), 16) % len(songs)]
+
+def spotify_track(song, track_id):
+    return {
+        'id': track_id,
+        'name': song['name'],
+        'type': 'track',
+        'artists': [{'name': song['artist']}],
+        'album': {'name': song['album'], 'images': [{'url': f"https://i.scdn.co/image/{song['id']}"}]},
+        'external_urls': {'spotify': f"https://open.spotify.com/track/{track_id}"}
+    }
+
+def genius_song(song):
+    path = f"/{song['id']}-lyrics"
+    return {
+        'id': song['genius_id'], 'title': song['name'], 'title_with_featured': song['name'],
+        'full_title': f"{song['name']} by {song['artist']}", 'url': f"https://genius.com{path}", 'path': path,
+        'api_path': f"/songs/{song['genius_id']}", 'lyrics_state': 'complete', 'lyrics_owner_id': 1,
+        'annotation_count': 2, 'pyongs_count': 0, 'stats': {'pageviews': 1000},
+        'header_image_url': '', 'header_image_thumbnail_url': '',
+        'song_art_image_url': '', 'song_art_image_thumbnail_url': '',
+        'primary_artist': {
+            'id': song['genius_id'], 'name': song['artist'], 'url': '', 'api_path': '',
+            'header_image_url': '', 'image_url': '', 'is_meme_verified': False, 'is_verified': False
+        }
+    }
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def handle_request(self):
+        stub = self.server.stub
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        stub.count(url.path)
+
+        time.sleep(stub.behavior.delay())
+        if stub.behavior.fails():
+            self.send_error_response(stub.behavior.error_status)
+            return
+        status, payload, content_type = stub.respond(url.path, parse_qs(url.query), body)
+        self.send_payload(status, payload, content_type)
+
+    def send_error_response(self, status):
+        headers = {}
+        payload = {'error': {'status': status, 'message': 'injected error'}}
+        if status == 429:
+            headers['Retry-After'] = '1'
+        elif status == 503 and self.server.stub.name == 'huggingface':
+            payload = {'error': 'Model is currently loading', 'estimated_time': 2.0}
+        self.send_payload(status, payload, 'application/json', headers)
+
+    def send_payload(self, status, payload, content_type, headers=None):
+        data = payload.encode('utf-8') if isinstance(payload, str) else json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+class StubUpstream:
+    def __init__(self, name, fixtures, behavior):
+        self.name = name
+        self.fixtures = fixtures
+        self.behavior = behavior
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f"stub-{name}", daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, path):
+        # Calls per endpoint: spotify search/tracks, genius search/page,
+        # referents, and one per Hugging Face model
+        parts = path.strip('/').split('/')
+        if self.name == 'spotify':
+            key = parts[1] if len(parts) > 1 else path
+        elif self.name == 'genius_web':
+            key = 'search' if parts[0] == 'api' else 'page'
+        else:
+            key = parts[-1]
+        with self._lock:
+            self.calls[key] += 1
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    def respond(self, path, query, body):
+        songs = self.fixtures['songs']
+        if self.name == 'spotify_accounts':
+            return 200, {'access_token': 'stub-token', 'token_type': 'Bearer', 'expires_in': 3600}, 'application/json'
+
+        if self.name == 'spotify':
+            if path.endswith('/search'):
+                q = query.get('q', [''])[0]
+                # Every distinct query is its own track, so --unique queries
+                # always miss the analysis cache
+                track_id = hashlib.sha1(q.lower().encode('utf-8')).hexdigest()[:22]
+                return 200, {'tracks': {'items': [spotify_track(pick_song(songs, q), track_id)]}}, 'application/json'
+            if path.rstrip('/').endswith('/tracks') and 'ids' in query:
+                ids = query['ids'][0].split(',')
+                return 200, {'tracks': [spotify_track(pick_song(songs, i), i) for i in ids]}, 'application/json'
+            if '/tracks/' in path:
+                track_id = path.rsplit('/', 1)[-1]
+                return 200, spotify_track(pick_song(songs, track_id), track_id), 'application/json'
+            return 404, {'error': {'status': 404, 'message': 'Not found'}}, 'application/json'
+
+        if self.name == 'genius_web':
+            if path.startswith('/api/search'):
+                song = genius_song(pick_song(songs, query.get('q', [''])[0]))
+                hits = [{'type': 'song', 'result': song}]
+                return 200, {'meta': {'status': 200}, 'response': {'sections': [{'type': 'top_hit', 'hits': hits}, {'type': 'song', 'hits': hits}]}}, 'application/json'
+            song = next((s for s in songs if path.strip('/') == f"{s['id']}-lyrics"), None)
+            if song is None:
+                return 404, '<html><body>Not found</body></html>', 'text/html'
+            lyrics = song['lyrics'].replace('\n', '<br/>')
+            return 200, f'<html><body><div class="Lyrics__Root-sc-1">{lyrics}</div></body></html>', 'text/html'
+
+        if self.name == 'genius_api':
+            if path.startswith('/referents'):
+                return 200, {'meta': {'status': 200}, 'response': self.fixtures['genius_referents']}, 'application/json'
+            return 404, {'meta': {'status': 404}}, 'application/json'
+
+        # huggingface: /models/<org>/<model>
+        model = path.strip('/').split('/', 1)[-1]
+        if model not in self.fixtures['huggingface']:
+            return 404, {'error': f"Model {model} does not exist"}, 'application/json'
+        response = self.fixtures['huggingface'][model]
+        inputs = json.loads(body or b'{}').get('inputs')
+        if isinstance(inputs, list):
+            # A batched inputs list gets one result per input: the fixture's
+            # single result, unwrapped from its one-item list
+            result = response[0] if isinstance(response, list) else response
+            response = [result for _ in inputs]
+        return 200, response, 'application/json'
+
+def start_stubs(fixtures, behaviors):
+    return {name: StubUpstream(name, fixtures, behaviors[name]).start() for name in UPSTREAMS}
+
+def stub_environment(stubs):
+    # Base URLs clients.py and spotify_token.py read at import
+    return {
+        'SPOTIFY_ACCOUNTS_URL': f"{stubs['spotify_accounts'].url}/api",
+        'SPOTIFY_API_URL': f"{stubs['spotify'].url}/v1",
+        'GENIUS_API_URL': f"{stubs['genius_api'].url}/",
+        'GENIUS_WEB_URL': f"{stubs['genius_web'].url}/",
+        'HUGGINGFACE_API_URL': f"{stubs['huggingface'].url}/models",
+        'SPOTIFY_CLIENT_ID': 'stub', 'SPOTIFY_CLIENT_SECRET': 'stub',
+        'GENIUS_TOKEN': 'stub', 'HUGGINGFACE_API_KEY': 'stub',
+        # The stubs have no quota: a rate of 0 turns the per-instance token
+        # buckets off, so a run measures the app rather than its limits
+        # (--env sets them back)
+        'SPOTIFY_RATE_PER_SEC': '0', 'HUGGINGFACE_RATE_PER_SEC': '0', 'GENIUS_RATE_PER_SEC': '0'
+    }
+
+def parse_behaviors(fixtures, latency=None, errors=None, no_latency=False):
+    # --latency NAME=MEDIAN[:P99] and --errors NAME=RATE[:STATUS] override
+    # the fixture defaults
+    settings = {
+        name: {'median': 0 if no_latency else values[0], 'p99': None if no_latency else values[1], 'rate': 0.0, 'status': 500}
+        for name, values in fixtures['latency_ms'].items()
+    }
+    for item in latency or []:
+        name, value = item.split('=', 1)
+        median, _, p99 = value.partition(':')
+        settings[name].update(median=float(median), p99=float(p99) if p99 else None)
+    for item in errors or []:
+        name, value = item.split('=', 1)
+        rate, _, status = value.partition(':')
+        settings[name].update(rate=float(rate), status=int(status) if status else 500)
+    return {
+        name: Behavior(s['median'], s['p99'], s['rate'], s['status'])
+        for name, s in settings.items()
+    }
+
+def add_stub_arguments(parser):
+    parser.add_argument('--fixtures', help='Upstream fixtures (default: fixtures/upstream_fixtures.json)')
+    parser.add_argument('--latency', action='append', metavar='NAME=MEDIAN[:P99]',
+                        help=f"Latency in ms for one of {', '.join(UPSTREAMS)} (repeatable)")
+    parser.add_argument('--errors', action='append', metavar='NAME=RATE[:STATUS]',
+                        help='Share of requests answered with STATUS (default 500), e.g. huggingface=0.05:503')
+    parser.add_argument('--no-latency', action='store_true', help='Answer immediately (measures the app alone)')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    stubs = start_stubs(fixtures, parse_behaviors(fixtures, args.latency, args.errors, args.no_latency))
+    print("Stub upstreams running; start the app with:\n")
+    for name, value in stub_environment(stubs).items():
+        print(f"export {name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for stub in stubs.values():
+            stub.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Pre-render the pages and build the static assets into public/.
+
+Run from apneavercel/ after changing a template, CSS or JS file, and commit
+public/ with the change:
+
+    python build_static.py
+    python build_static.py --check
+
+The pages have no per-request data, so each template in PAGES is rendered
+once to HTML. The CSS and JS in ASSETS are minified and named after a hash
+of their content (assets/style.<hash>.css), so they can be cached forever.
+The templates reference them through asset() in base.html. Every output also
+gets a .gz and a .br copy. manifest.json lists the hashed URLs and the
+rendered pages for prebuilt.py and app.py.
+
+--check builds in memory and exits non-zero when public/ differs, e.g. when
+a template or asset changed without a rebuild.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+import brotli
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(APP_DIR, 'static')
+
+# Templates rendered to public/<name>.html
+PAGES = ('index.html', 'about.html', 'trending.html', 'contact.html', 'donate.html')
+# static/ files minified into public/assets/
+ASSETS = ('css/style.css', 'js/main.js', 'js/analytics.js')
+
+HASH_LENGTH = 10
+
+CSS_COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.DOTALL)
+CSS_SPACE_PATTERN = re.compile(r'\s+')
+CSS_PUNCTUATION_PATTERN = re.compile(r'\s*([{};,>])\s*')
+CSS_COLON_PATTERN = re.compile(r':\s+')
+
+def minify_css(source):
+    css = CSS_COMMENT_PATTERN.sub('', source)
+    css = CSS_SPACE_PATTERN.sub(' ', css)
+    css = CSS_PUNCTUATION_PATTERN.sub(r'\1', css)
+    css = CSS_COLON_PATTERN.sub(':', css)
+    return css.replace(';}', '}').strip()
+
+def minify_js(source):
+    # Conservative: drops indentation, blank lines and comment-only lines
+    # outside template literals and keeps every line break, so automatic
+    # semicolon insertion and the code itself are unchanged
+    lines = []
+    in_template = False
+    for line in source.split('\n'):
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith('//'):
+                lines.append(stripped)
+        if (line.count('`') - line.count('\\`')) % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+def hashed_name(path, content):
+    name, extension = os.path.splitext(os.path.basename(path))
+    return f"{name}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{extension}"
+
+def precompressed(content):
+    # mtime=0 keeps the .gz output identical between builds
+    return {
+        '.gz': gzip.compress(content, compresslevel=9, mtime=0),
+        '.br': brotli.compress(content, quality=11)
+    }
+
+def build():
+    # {relative path in public/: bytes}
+    outputs = {}
+    manifest = {'assets': {}, 'pages': {}}
+
+    for path in ASSETS:
+        with open(os.path.join(STATIC_DIR, path), encoding='utf-8') as f:
+            source = f.read()
+        content = MINIFIERS[os.path.splitext(path)[1]](source).encode('utf-8')
+        relative_path = f"assets/{hashed_name(path, content)}"
+        outputs[relative_path] = content
+        manifest['assets'][path] = f"/{relative_path}"
+
+    # Rendered outside a request, with asset() pointing at the hashed files
+    from app import app
+    app.jinja_env.globals['asset'] = lambda path: manifest['assets'][path]
+    with app.test_request_context('/'):
+        from flask import render_template
+        for template in PAGES:
+            outputs[template] = render_template(template).encode('utf-8')
+            manifest['pages'][template] = template
+
+    for relative_path, content in list(outputs.items()):
+        for suffix, compressed in precompressed(content).items():
+            outputs[relative_path + suffix] = compressed
+    outputs['manifest.json'] = (json.dumps(manifest, indent=2, sort_keys=True) + '\n').encode('utf-8')
+    return outputs
+
+def existing_outputs(build_dir):
+    outputs = {}
+    for root, _, files in os.walk(build_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                outputs[os.path.relpath(path, build_dir).replace(os.sep, '/')] = f.read()
+    return outputs
+
+def write(outputs, build_dir):
+    # public/ only holds build output; old hashed files are removed
+    if os.path.isdir(build_dir):
+        shutil.rmtree(build_dir)
+    for relative_path, content in outputs.items():
+        path = os.path.join(build_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+def main():
+    from prebuilt import BUILD_DIR
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--check', action='store_true', help='Fail when public/ is out of date')
+    args = parser.parse_args()
+
+    outputs = build()
+    if args.check:
+        existing = existing_outputs(BUILD_DIR)
+        stale = sorted(path for path in outputs.keys() | existing.keys() if outputs.get(path) != existing.get(path))
+        for path in stale:
+            print(f"Out of date: public/{path}", file=sys.stderr)
+        if stale:
+            print("Run python build_static.py and commit public/", file=sys.stderr)
+        sys.exit(1 if stale else 0)
+
+    write(outputs, BUILD_DIR)
+    for relative_path, content in sorted(outputs.items()):
+        if relative_path + '.gz' in outputs:
+            print(f"public/{relative_path}: {len(content)} bytes, "
+                  f"{len(outputs.get(relative_path + '.gz', b''))} gzip, {len(outputs.get(relative_path + '.br', b''))} brotli")
+
+if __name__ == '__main__':
+    main()
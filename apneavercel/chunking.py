@@ -0,0 +1,172 @@
+import os
+from collections import Counter
+
+from enrichment import SectionUnavailable
+from lyrics_text import SECTION_LINE_PATTERN
+
+# Window size in characters for the sentiment, emotions and topics models
+# (well under their 512-token input), characters a window of a long section
+# repeats from the one before, and most windows sent to a model per song
+ANALYSIS_CHUNK_CHARS = int(os.getenv('ANALYSIS_CHUNK_CHARS', '1000'))
+ANALYSIS_CHUNK_OVERLAP = int(os.getenv('ANALYSIS_CHUNK_OVERLAP', '150'))
+ANALYSIS_MAX_CHUNKS = int(os.getenv('ANALYSIS_MAX_CHUNKS', '16'))
+
+def split_sections(lyrics):
+    # [(section index, body)] split at the section markers clean_lyrics()
+    # keeps. The index lines up with analyze_lyrics()['sections']; text
+    # before the first marker has index None
+    parts = SECTION_LINE_PATTERN.split(lyrics)
+    sections = []
+    for index in range(0, len(parts), 2):
+        body = parts[index].strip()
+        if index:
+            sections.append((index // 2 - 1, body))
+        elif body:
+            sections.append((None, body))
+    return sections
+
+def distinct_sections(lyrics):
+    # Section bodies in order, each repeated chorus only once
+    seen = set()
+    bodies = []
+    for _, body in split_sections(lyrics):
+        if body and body not in seen:
+            seen.add(body)
+            bodies.append(body)
+    return bodies
+
+def split_text(text, max_chars, overlap=0):
+    # [(window, weight)]: windows of whole lines up to max_chars, each
+    # starting with the last lines (up to overlap characters) of the one
+    # before. weight counts only the characters new to the window. A line
+    # longer than max_chars is cut
+    if len(text) <= max_chars:
+        return [(text, len(text))]
+    lines = []
+    for line in text.split('\n'):
+        while len(line) > max_chars:
+            lines.append(line[:max_chars])
+            line = line[max_chars:]
+        lines.append(line)
+
+    windows = []
+    carry = []
+    i = 0
+    while i < len(lines):
+        window = list(carry)
+        size = sum(len(line) + 1 for line in window)
+        if window and size + len(lines[i]) > max_chars:
+            window, size = [], 0
+        own = 0
+        while i < len(lines) and (not own or size + len(lines[i]) <= max_chars):
+            window.append(lines[i])
+            size += len(lines[i]) + 1
+            own += len(lines[i]) + 1
+            i += 1
+        windows.append(('\n'.join(window), own))
+
+        carry = []
+        carried = 0
+        for line in reversed(window):
+            if carried + len(line) + 1 > overlap:
+                break
+            carry.insert(0, line)
+            carried += len(line) + 1
+    return windows
+
+def lyric_windows(lyrics, max_chars=ANALYSIS_CHUNK_CHARS, overlap=ANALYSIS_CHUNK_OVERLAP, max_windows=ANALYSIS_MAX_CHUNKS):
+    # Windows over the whole lyrics that never cross a section marker; a
+    # section longer than max_chars gets overlapping windows. Returns (texts,
+    # spans): the distinct window texts, sent to a model as one batched
+    # inputs list, and (text index, section index, weight) for every place a
+    # window occurs, so a repeated chorus is scored once but counted each time
+    positions = {}
+    texts = []
+    spans = []
+    for section, body in split_sections(lyrics):
+        if not body:
+            continue
+        for text, weight in split_text(body, max_chars, overlap):
+            position = positions.setdefault(text, len(texts))
+            if position == len(texts):
+                texts.append(text)
+            spans.append((position, section, weight))
+
+    if not texts:
+        return [lyrics[:max_chars]], [(0, None, 1)]
+    if len(texts) > max_windows:
+        # Keep the windows that weigh most in the song, in song order
+        totals = Counter()
+        for position, _, weight in spans:
+            totals[position] += weight
+        kept = sorted(sorted(totals, key=totals.get, reverse=True)[:max_windows])
+        renumbered = {position: new for new, position in enumerate(kept)}
+        texts = [texts[position] for position in kept]
+        spans = [(renumbered[position], section, weight) for position, section, weight in spans if position in renumbered]
+    return texts, spans
+
+def pack_windows(pieces, max_chars, max_windows):
+    # Consecutive pieces joined into as few windows of up to max_chars as
+    # they fit in; a piece longer than that is split. Pieces past
+    # max_windows windows are left out
+    windows = []
+    for piece in pieces:
+        for text, _ in split_text(piece, max_chars):
+            if windows and len(windows[-1]) + len(text) + 2 <= max_chars:
+                windows[-1] = f"{windows[-1]}\n\n{text}"
+            elif len(windows) < max_windows:
+                windows.append(text)
+            else:
+                return windows
+    return windows
+
+def label_scores(result):
+    # {label: score} of one window's result: a text classification list of
+    # {"label", "score"} or a zero-shot {"labels", "scores"}
+    if isinstance(result, dict):
+        return dict(zip(result['labels'], result['scores']))
+    if result and isinstance(result[0], list):
+        result = result[0]
+    return {item['label']: item['score'] for item in result}
+
+def weighted_mean(weighted):
+    # [(weight, {label: score})] -> {label: weighted mean score}
+    total = sum(weight for weight, _ in weighted)
+    combined = {}
+    for weight, scores in weighted:
+        for label, score in scores.items():
+            combined[label] = combined.get(label, 0.0) + weight * score
+    return {label: score / total for label, score in combined.items()}
+
+def shaped(scores, zero_shot):
+    # Back to the model's own shape, highest score first
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    if zero_shot:
+        return {'labels': [label for label, _ in ranked], 'scores': [round(score, 4) for _, score in ranked]}
+    return [[{'label': label, 'score': round(score, 4)} for label, score in ranked]]
+
+def combine_windows(results, spans, section_count, zero_shot=False):
+    # Combines one result per window text (a batched response, in input
+    # order) into the song-level result and one result per section (None for
+    # a section no window covered), each in the model's own shape and
+    # weighted by how much of the song or section the window covers
+    if isinstance(results, dict):
+        results = [results]
+    window_count = max(position for position, _, _ in spans) + 1
+    if not isinstance(results, list) or len(results) < window_count:
+        raise SectionUnavailable(f"expected {window_count} results, got {len(results) if isinstance(results, list) else results!r}")
+    try:
+        scores = [label_scores(result) for result in results[:window_count]]
+    except (KeyError, TypeError, IndexError) as e:
+        raise SectionUnavailable(f"unexpected model output: {str(e)}")
+
+    song = []
+    by_section = {}
+    for position, section, weight in spans:
+        song.append((weight, scores[position]))
+        if section is not None:
+            by_section.setdefault(section, []).append((weight, scores[position]))
+    return (
+        shaped(weighted_mean(song), zero_shot),
+        [shaped(weighted_mean(by_section[i]), zero_shot) if i in by_section else None for i in range(section_count)]
+    )
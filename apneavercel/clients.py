@@ -0,0 +1,214 @@
+import os
+import re
+import threading
+from urllib.parse import quote, urlsplit
+
+from enrichment import ENRICHMENT_CALL_TIMEOUT
+from http_clients import UpstreamClient
+from models import db, ApiToken
+from spotify_token import SpotifyTokenManager, FileTokenStore, DatabaseTokenStore
+from upstream_scheduler import UpstreamScheduler
+
+SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
+SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
+HUGGINGFACE_API_KEY = os.getenv('HUGGINGFACE_API_KEY')
+GENIUS_TOKEN = os.getenv('GENIUS_TOKEN')
+
+# Upstream base URLs; point them at local stubs to load test offline
+# (benchmarks/load_test.py)
+SPOTIFY_ACCOUNTS_URL = os.getenv('SPOTIFY_ACCOUNTS_URL', 'https://accounts.spotify.com/api')
+SPOTIFY_API_URL = os.getenv('SPOTIFY_API_URL', 'https://api.spotify.com/v1')
+HUGGINGFACE_API_URL = os.getenv('HUGGINGFACE_API_URL', 'https://api-inference.huggingface.co/models')
+GENIUS_API_URL = os.getenv('GENIUS_API_URL', 'https://api.genius.com/')
+# Lyrics pages, and the public API lyricsgenius searches through (<url>api/)
+GENIUS_WEB_URL = os.getenv('GENIUS_WEB_URL', 'https://genius.com/')
+
+# Admission control per upstream; override with <NAME>_RATE_PER_SEC, _BURST,
+# _MAX_WAIT, _BREAKER_FAILURES and _BREAKER_RESET. The rates are per
+# instance: every process (each serverless instance) has its own buckets,
+# so they smooth one instance's bursts rather than enforce an account
+# quota. The quota is kept by pausing on the provider's 429s; with a known
+# number of instances, set the rates to quota / instances. The defaults let
+# one instance serve about 5 searches a second, each making 1-2 Spotify, 4
+# Hugging Face and 3 Genius requests, with bursts of about 10 searches
+spotify_scheduler = UpstreamScheduler.from_env('SPOTIFY', rate=10, burst=20, max_wait=10)
+huggingface_scheduler = UpstreamScheduler.from_env('HUGGINGFACE', rate=20, burst=40, max_wait=20)
+genius_scheduler = UpstreamScheduler.from_env('GENIUS', rate=15, burst=30, max_wait=10)
+
+# Stage names the upstream requests are timed under (see metrics.py)
+def spotify_stage(request):
+    # spotify_search, spotify_tracks, spotify_playlists, spotify_albums
+    path = urlsplit(request.url).path.split('/')
+    return f"spotify_{path[2]}" if len(path) > 2 else 'spotify'
+
+def huggingface_stage(request):
+    # One stage per model, e.g. hf_bart-large-cnn
+    return f"hf_{urlsplit(request.url).path.rstrip('/').rsplit('/', 1)[-1]}"
+
+GENIUS_API_STAGES = {'referents': 'genius_annotations', 'songs': 'genius_song'}
+
+def genius_stage(request):
+    if request.url.startswith(GENIUS_API_URL):
+        # The first path segment after the API root, without the query
+        # string (referents?song_id=...)
+        path = urlsplit(request.url).path[len(urlsplit(GENIUS_API_URL).path):]
+        return GENIUS_API_STAGES.get(path.lstrip('/').split('/')[0], 'genius_api')
+    if request.url.startswith(f"{GENIUS_WEB_URL}api/search"):
+        return 'genius_search'
+    # The lyrics page lyricsgenius scrapes
+    return 'genius_page'
+
+# Long-lived pooled HTTP clients, one per upstream
+spotify_accounts = UpstreamClient(
+    'spotify_accounts',
+    base_url=SPOTIFY_ACCOUNTS_URL,
+    pool_size=2,
+    read_timeout=float(os.getenv('SPOTIFY_READ_TIMEOUT', '10')),
+    stage_name=lambda request: 'spotify_token'
+)
+spotify_api = UpstreamClient(
+    'spotify',
+    base_url=SPOTIFY_API_URL,
+    pool_size=int(os.getenv('SPOTIFY_POOL_SIZE', '10')),
+    read_timeout=float(os.getenv('SPOTIFY_READ_TIMEOUT', '10')),
+    scheduler=spotify_scheduler,
+    stage_name=spotify_stage
+)
+# Inference is a pure function of its input, so POSTs are safe to retry
+huggingface = UpstreamClient(
+    'huggingface',
+    base_url=HUGGINGFACE_API_URL,
+    pool_size=int(os.getenv('HUGGINGFACE_POOL_SIZE', '10')),
+    # Never longer than an enrichment call may take
+    read_timeout=min(float(os.getenv('HUGGINGFACE_READ_TIMEOUT', '30')), ENRICHMENT_CALL_TIMEOUT),
+    retry_methods=frozenset(['POST']),
+    retry_statuses=(502, 504),
+    headers={"Authorization": f"Bearer {HUGGINGFACE_API_KEY}"},
+    scheduler=huggingface_scheduler,
+    stage_name=huggingface_stage
+)
+
+_genius = None
+_genius_lock = threading.Lock()
+
+def get_genius():
+    # lyricsgenius is only imported and set up once lyrics are first needed
+    global _genius
+    if _genius is None:
+        with _genius_lock:
+            if _genius is None:
+                import lyricsgenius
+                # genius_scheduler spaces the requests out, so lyricsgenius'
+                # own 0.2 s sleep after every request is turned off, and so
+                # are its per-search progress messages
+                genius = lyricsgenius.Genius(
+                    GENIUS_TOKEN,
+                    timeout=float(os.getenv('GENIUS_READ_TIMEOUT', '10')),
+                    sleep_time=0,
+                    verbose=False
+                )
+                genius.API_ROOT = GENIUS_API_URL
+                genius.WEB_ROOT = GENIUS_WEB_URL
+                genius.PUBLIC_API_ROOT = f"{GENIUS_WEB_URL}api/"
+                # Same pooling and retry policy as the other upstreams
+                UpstreamClient(
+                    'genius',
+                    pool_size=int(os.getenv('GENIUS_POOL_SIZE', '10')),
+                    session=genius._session,
+                    scheduler=genius_scheduler,
+                    stage_name=genius_stage
+                )
+                _genius = genius
+    return _genius
+
+# Spotify token cache: 'memory' (default), 'file' or 'database'
+SPOTIFY_TOKEN_STORE = os.getenv('SPOTIFY_TOKEN_STORE', 'memory')
+if SPOTIFY_TOKEN_STORE == 'file':
+    token_store = FileTokenStore(os.getenv('SPOTIFY_TOKEN_FILE'))
+elif SPOTIFY_TOKEN_STORE == 'database':
+    token_store = DatabaseTokenStore(db, ApiToken)
+else:
+    token_store = None
+
+spotify_tokens = SpotifyTokenManager(
+    SPOTIFY_CLIENT_ID,
+    SPOTIFY_CLIENT_SECRET,
+    store=token_store,
+    session=spotify_accounts,
+    refresh_margin=int(os.getenv('SPOTIFY_TOKEN_REFRESH_MARGIN', '30'))
+)
+
+def get_spotify_token():
+    return spotify_tokens.get_token()
+
+def spotify_get(path, params=None):
+    response = spotify_api.get(path, params=params, headers={"Authorization": f"Bearer {get_spotify_token()}"})
+    # A revoked or rotated token: drop the cached one and retry once
+    if response.status_code == 401:
+        spotify_tokens.invalidate()
+        response = spotify_api.get(path, params=params, headers={"Authorization": f"Bearer {get_spotify_token()}"})
+    return response.json()
+
+class SpotifyError(Exception):
+    pass
+
+# Spotify track, album and playlist IDs are 22 base62 characters
+SPOTIFY_ID_PATTERN = re.compile(r'[0-9A-Za-z]{22}')
+
+def is_spotify_id(value):
+    return isinstance(value, str) and SPOTIFY_ID_PATTERN.fullmatch(value) is not None
+
+def spotify_page(path, params=None):
+    # An error body (e.g. a 429 the scheduler couldn't wait out) raises
+    # instead of surfacing later as a missing key
+    response = spotify_get(path, params=params)
+    if 'error' in response:
+        raise SpotifyError(response['error'].get('message', 'Spotify request failed'))
+    return response
+
+def search_spotify_track(query):
+    spotify_response = spotify_page('search', params={'q': query, 'type': 'track', 'limit': 1})
+    items = spotify_response['tracks']['items']
+    return items[0] if items else None
+
+def get_spotify_track(track_id):
+    return spotify_page(f"tracks/{quote(track_id, safe='')}")
+
+# Most IDs Spotify's multi-track endpoint accepts per request
+SPOTIFY_TRACKS_PER_REQUEST = 50
+
+def get_spotify_tracks(track_ids):
+    # Full track objects in the same order, None for unknown IDs
+    tracks = []
+    for start in range(0, len(track_ids), SPOTIFY_TRACKS_PER_REQUEST):
+        chunk = track_ids[start:start + SPOTIFY_TRACKS_PER_REQUEST]
+        tracks.extend(spotify_page('tracks', params={'ids': ','.join(chunk)})['tracks'])
+    return tracks
+
+def get_playlist_track_ids(playlist_id, limit=None):
+    # Only the IDs are requested; local files and podcast episodes are skipped
+    track_ids = []
+    offset = 0
+    while limit is None or len(track_ids) < limit:
+        page = spotify_page(f"playlists/{quote(playlist_id, safe='')}/tracks", params={
+            'limit': 100, 'offset': offset, 'fields': 'items(track(id,type)),next'
+        })
+        track_ids.extend(
+            item['track']['id'] for item in page['items']
+            if item.get('track') and item['track'].get('type') == 'track' and item['track'].get('id')
+        )
+        if not page.get('next'):
+            break
+        offset += 100
+    return track_ids[:limit]
+
+def get_album_track_ids(album_id, limit=None):
+    track_ids = []
+    offset = 0
+    while limit is None or len(track_ids) < limit:
+        page = spotify_page(f"albums/{quote(album_id, safe='')}/tracks", params={'limit': 50, 'offset': offset})
+        track_ids.extend(item['id'] for item in page['items'] if item.get('id'))
+        if not page.get('next'):
+            break
+        offset += 50
+    return track_ids[:limit]
@@ -0,0 +1,213 @@
+import click
+from datetime import datetime
+
+# Commands run in the API app's context; the modules behind them are
+# imported inside each command so `flask --help` stays fast
+
+@click.group('analysis-cache')
+def analysis_cache_cli():
+    """Manage cached /search results."""
+
+@analysis_cache_cli.command('invalidate')
+@click.argument('track_ids', nargs=-1)
+@click.option('--all', 'invalidate_all', is_flag=True, help='Remove every cached result.')
+@click.option('--stale', is_flag=True, help='Remove expired results and results from older model sets.')
+@click.option('--analyzer', 'analyzer_name', help='Only remove results of this analyzer (remote, local or fallback).')
+def invalidate_analysis_cache(track_ids, invalidate_all, stale, analyzer_name):
+    """Remove cached results for the given Spotify track IDs."""
+    from api import get_api_app
+    from analysis import MODEL_SET_VERSION
+    from analyzers import ANALYZER_BACKENDS
+    from models import db, AnalysisResult
+
+    if not (stale or invalidate_all or track_ids):
+        raise click.UsageError('Pass track IDs, --stale or --all')
+    if analyzer_name and analyzer_name not in ANALYZER_BACKENDS:
+        raise click.UsageError(f"analyzer must be one of {', '.join(ANALYZER_BACKENDS)}")
+    with get_api_app().app_context():
+        query = AnalysisResult.query
+        if stale:
+            query = query.filter(
+                (AnalysisResult.expires_at <= datetime.utcnow()) |
+                ~AnalysisResult.model_version.startswith(f"{MODEL_SET_VERSION}-")
+            )
+        elif not invalidate_all:
+            query = query.filter(AnalysisResult.track_id.in_(track_ids))
+        if analyzer_name:
+            # model_version is "<model set>-<analyzer>"
+            query = query.filter(AnalysisResult.model_version.endswith(f"-{analyzer_name}"))
+        removed = query.delete(synchronize_session=False)
+        db.session.commit()
+    print(f"Removed {removed} cached results")
+
+@analysis_cache_cli.command('rebuild')
+@click.argument('track_ids', nargs=-1)
+@click.option('--all', 'rebuild_all', is_flag=True, help='Rebuild every cached result with the analyzer that made it.')
+@click.option('--analyzer', 'analyzer_name', help='remote, local or fallback (default: ANALYZER_BACKEND).')
+def rebuild_analysis_cache(track_ids, rebuild_all, analyzer_name):
+    """Re-run the analysis for the given Spotify track IDs and store it."""
+    from api import get_api_app
+    from analysis import get_analyzer
+    from analyzers import ANALYZER_BACKEND, ANALYZER_BACKENDS
+    from clients import get_spotify_track
+    from models import AnalysisResult
+    from search import LyricsNotFound, analyze_track, store_analysis
+
+    if not (rebuild_all or track_ids):
+        raise click.UsageError('Pass track IDs or --all')
+    if analyzer_name and analyzer_name not in ANALYZER_BACKENDS:
+        raise click.UsageError(f"analyzer must be one of {', '.join(ANALYZER_BACKENDS)}")
+    with get_api_app().app_context():
+        if rebuild_all:
+            # (track ID, analyzer) of every row; model_version ends with the analyzer
+            rows = AnalysisResult.query.with_entities(AnalysisResult.track_id, AnalysisResult.model_version).all()
+            targets = sorted({
+                (track_id, model_version.rsplit('-', 1)[-1]) for track_id, model_version in rows
+                if model_version.rsplit('-', 1)[-1] in ANALYZER_BACKENDS and (not analyzer_name or model_version.endswith(f"-{analyzer_name}"))
+            })
+        else:
+            targets = [(track_id, analyzer_name or ANALYZER_BACKEND) for track_id in track_ids]
+        for track_id, name in targets:
+            try:
+                track = get_spotify_track(track_id)
+                analyzer = get_analyzer(name)
+                response_data = analyze_track(track, analyzer)
+                store_analysis(track_id, response_data, analyzer)
+                status = f"unavailable: {', '.join(response_data['unavailable'])}" if response_data['unavailable'] else 'ok'
+            except LyricsNotFound:
+                status = 'lyrics not found'
+            except Exception as e:
+                status = f"error: {str(e)}"
+            print(f"{track_id} ({name}): {status}")
+
+@click.group('trending')
+def trending_cli():
+    """Maintain the search buckets behind /api/trending."""
+
+@trending_cli.command('compact')
+def compact_trending_buckets():
+    """Roll old hourly buckets into daily ones and drop expired buckets."""
+    from api import get_api_app
+    from models import db, SongSearchBucket
+    from trending import compact_buckets
+
+    with get_api_app().app_context():
+        result = compact_buckets(db.session, SongSearchBucket)
+    print(f"Compacted {result['hourly_compacted']} hourly buckets into {result['daily_written']} daily buckets, "
+          f"deleted {result['expired_deleted']} expired buckets")
+
+@click.group('batch')
+def batch_cli():
+    """Analyze whole playlists and albums."""
+
+@batch_cli.command('analyze')
+@click.argument('track_ids', nargs=-1)
+@click.option('--playlist', help='Spotify playlist ID.')
+@click.option('--album', help='Spotify album ID.')
+@click.option('--job', 'job_id', help='Resume this batch job.')
+@click.option('--analyzer', 'analyzer_name', help='remote, local or fallback (default: ANALYZER_BACKEND).')
+def analyze_batch(track_ids, playlist, album, job_id, analyzer_name):
+    """Analyze a playlist, an album or the given Spotify track IDs."""
+    import json
+    from api import get_api_app
+    from analysis import get_analyzer
+    from analyzers import ANALYZER_BACKEND, ANALYZER_BACKENDS
+    from batch import resolve_source, create_job, iter_batch
+    from models import db, BatchJob
+
+    app = get_api_app()
+    with app.app_context():
+        if job_id:
+            job = db.session.get(BatchJob, job_id)
+            if job is None:
+                raise click.UsageError(f"No batch job {job_id}")
+        else:
+            analyzer_name = analyzer_name or ANALYZER_BACKEND
+            if analyzer_name not in ANALYZER_BACKENDS:
+                raise click.UsageError(f"analyzer must be one of {', '.join(ANALYZER_BACKENDS)}")
+            try:
+                source, ids = resolve_source({'playlist': playlist, 'album': album, 'tracks': list(track_ids)})
+            except ValueError:
+                raise click.UsageError('Pass track IDs, --playlist, --album or --job')
+            job = create_job(source, ids, get_analyzer(analyzer_name))
+
+        for line in iter_batch(app, job, get_analyzer(job.analyzer)):
+            if line['section'] == 'job':
+                print(f"Job {job.id}: {line['data']['total']} tracks, {line['data']['done']} already done")
+            elif line['section'] == 'track':
+                name = f"{line['data']['artist']} - {line['data']['track_name']}" if line['data'] else line['track_id']
+                print(f"{line['position'] + 1:>4} {line['status']:<16} {name}")
+            elif line['section'] == 'aggregate':
+                print(json.dumps(line['data'], indent=2))
+            elif line['section'] == 'done' and not line['data']['complete']:
+                print(f"{line['data']['done']}/{line['data']['total']} done; resume with --job {job.id}")
+
+@click.group('warmup')
+def warmup_cli():
+    """Keep the models and trending songs' analyses warm."""
+
+@warmup_cli.command('run')
+def run_warmup_command():
+    """Ping the Hugging Face models and refresh the trending analyses."""
+    from api import get_api_app
+    from analysis import get_analyzer
+    from analyzers import ANALYZER_BACKEND
+    from warmup import run_warmup
+
+    app = get_api_app()
+    with app.app_context():
+        run_warmup(app, get_analyzer(ANALYZER_BACKEND))
+
+def open_dump(path, mode):
+    # Dumps ending in .gz are gzip-compressed
+    import gzip
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+@click.group('lyrics-store')
+def lyrics_store_cli():
+    """Seed and dump the stored Genius lyrics and annotations."""
+
+@lyrics_store_cli.command('export')
+@click.argument('path')
+def export_lyrics_store(path):
+    """Write every stored entry to PATH as JSON lines (.gz to compress)."""
+    from api import get_api_app
+    from search import lyrics_store
+
+    with get_api_app().app_context(), open_dump(path, 'w') as f:
+        count = lyrics_store.export_entries(f)
+    print(f"Exported {count} entries to {path}")
+
+@lyrics_store_cli.command('import')
+@click.argument('path')
+def import_lyrics_store(path):
+    """Load entries from a JSON lines dump made by export."""
+    from api import get_api_app
+    from search import lyrics_store
+
+    with get_api_app().app_context(), open_dump(path, 'r') as f:
+        imported, skipped = lyrics_store.import_entries(f)
+    print(f"Imported {imported} entries, skipped {skipped}")
+
+@click.group('similarity-index')
+def similarity_index_cli():
+    """Maintain the index behind /api/similar."""
+
+@similarity_index_cli.command('rebuild')
+@click.option('--path', help='Where to save it (default: SIMILARITY_INDEX_PATH, or a file per database).')
+def rebuild_similarity_index(path):
+    """Build the index from every stored analysis and save it."""
+    import time
+    from api import get_api_app, similarity_rows
+    from similarity import SimilarityIndex, database_source, index_path
+
+    app = get_api_app()
+    source = database_source(app.config['SQLALCHEMY_DATABASE_URI'])
+    path = path or index_path(source)
+    started = time.perf_counter()
+    index = SimilarityIndex()
+    index.sync(similarity_rows(app))
+    index.save(path, source)
+    print(f"Indexed {len(index)} songs in {time.perf_counter() - started:.1f}s, saved to {path}")
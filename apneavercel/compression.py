@@ -0,0 +1,89 @@
+import gzip
+import os
+import zlib
+
+import brotli
+
+# Compress API responses for clients that accept br or gzip (set to 0 when a
+# proxy in front already does), and skip bodies too small to gain from it
+RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', '1') == '1'
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+# Fast settings: most of the gain at a fraction of the CPU of the maximum
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/html')
+
+def choose_encoding(accept_encodings):
+    # Brotli when the client takes it, else gzip, else None
+    for encoding in ('br', 'gzip'):
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, GZIP_LEVEL)
+
+def compress_stream(chunks, encoding):
+    # Every chunk is flushed, so each line of a streamed response reaches the
+    # client as soon as it is written
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process, flush, finish = compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            yield process(chunk) + flush()
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def encoded_etag(response, encoding):
+    # A compressed body is a different representation from the identity one,
+    # so a strong ETag gets the encoding appended ("<etag>-br"); a weak one
+    # already allows it
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+
+def compress_response(response, request):
+    if (
+        not RESPONSE_COMPRESSION
+        or response.direct_passthrough
+        or response.status_code < 200 or response.status_code == 204
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+    # Every response that could have been compressed varies by
+    # Accept-Encoding, including the identity ones and 304s
+    response.vary.add('Accept-Encoding')
+    if response.status_code == 304:
+        return response
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_BYTES:
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    if 'ETag' in response.headers:
+        encoded_etag(response, encoding)
+        # The route compared If-None-Match with the identity ETag; a client
+        # holding this encoding's copy gets its 304 here
+        if response.status_code == 200 and request.if_none_match:
+            response.make_conditional(request)
+    return response
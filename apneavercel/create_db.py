@@ -1,11 +1,13 @@
-from app import app, db
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from api import get_api_app
+from models import db
+
 def init_db():
-    with app.app_context():
+    with get_api_app().app_context():
         # Create all tables
         db.create_all()
         print("Database tables created successfully!")
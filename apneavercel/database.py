@@ -0,0 +1,110 @@
+import os
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from sqlalchemy.pool import NullPool, QueuePool
+
+# How the API connects to the database:
+#   pgbouncer   the pooled URL (POSTGRES_URL) with a small client pool; the
+#               pooler keeps the Postgres connections, so a warm function
+#               reuses its connection and a cold one skips the full handshake
+#   serverless  the direct URL with NullPool: a connection per checkout,
+#               nothing left open between invocations
+#   server      the direct URL with a QueuePool sized for a long-running
+#               process, pinged before use and recycled
+#   sqlite      a local SQLite file (the bundled apnea.db by default)
+#   auto        sqlite without a Postgres URL, pgbouncer (or serverless when
+#               there is no pooled URL) on Vercel, server elsewhere
+DB_ENGINE_PROFILE = os.getenv('DB_ENGINE_PROFILE', 'auto')
+DB_ENGINE_PROFILES = ('auto', 'pgbouncer', 'serverless', 'server', 'sqlite')
+
+# Seconds to wait for a new Postgres connection
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '5'))
+
+BUNDLED_SQLITE_URL = 'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'apnea.db')
+
+# Pool settings of the pooled profiles; DB_POOL_SIZE, DB_MAX_OVERFLOW,
+# DB_POOL_RECYCLE and DB_POOL_TIMEOUT override them
+POOL_DEFAULTS = {
+    # A function instance serves one request at a time; the overflow covers
+    # the batch workers
+    'pgbouncer': {'pool_size': 1, 'max_overflow': 4, 'pool_recycle': 300, 'pool_timeout': 10},
+    'server': {'pool_size': 5, 'max_overflow': 10, 'pool_recycle': 1800, 'pool_timeout': 10}
+}
+
+# Lets the server notice a connection a NAT or load balancer dropped while
+# it sat idle in the pool
+POSTGRES_CONNECT_ARGS = {
+    'connect_timeout': DB_CONNECT_TIMEOUT,
+    'keepalives': 1,
+    'keepalives_idle': 30,
+    'keepalives_interval': 10,
+    'keepalives_count': 3,
+    'application_name': 'apnea'
+}
+
+def normalize_url(url):
+    # SQLAlchemy needs postgresql://, and psycopg2 rejects the pgbouncer=true
+    # flag some providers put on their pooled URLs
+    if url.startswith('postgres://'):
+        url = url.replace('postgres://', 'postgresql://', 1)
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key != 'pgbouncer']
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+def auto_profile(direct_url, pooled_url):
+    if not (direct_url or pooled_url) or (direct_url or '').startswith('sqlite'):
+        return 'sqlite'
+    if os.getenv('VERCEL'):
+        return 'pgbouncer' if pooled_url else 'serverless'
+    return 'server'
+
+def pool_options(profile):
+    defaults = POOL_DEFAULTS[profile]
+    return {
+        'poolclass': QueuePool,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', defaults['pool_size'])),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', defaults['max_overflow'])),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', defaults['pool_recycle'])),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', defaults['pool_timeout'])),
+        # Replaces a connection the server closed while idle instead of
+        # failing the request that checks it out
+        'pool_pre_ping': True,
+        # Reuse the most recent connection so the extra ones idle out
+        'pool_use_lifo': True,
+        'connect_args': dict(POSTGRES_CONNECT_ARGS)
+    }
+
+def engine_profile(profile=None):
+    # (profile, database URL, create_engine options) for the profile, or
+    # DB_ENGINE_PROFILE
+    profile = profile or DB_ENGINE_PROFILE
+    if profile not in DB_ENGINE_PROFILES:
+        raise ValueError(f"DB_ENGINE_PROFILE must be one of {', '.join(DB_ENGINE_PROFILES)}")
+    direct_url = os.getenv('POSTGRES_URL_NON_POOLING')
+    pooled_url = os.getenv('POSTGRES_URL')
+    if profile == 'auto':
+        profile = auto_profile(direct_url, pooled_url)
+
+    if profile == 'sqlite':
+        if direct_url and direct_url.startswith('sqlite'):
+            return profile, direct_url, {'connect_args': {'check_same_thread': False}}
+        # Local development without Postgres: use the bundled SQLite file
+        print(f"POSTGRES_URL_NON_POOLING is not set, using {BUNDLED_SQLITE_URL}")
+        return profile, BUNDLED_SQLITE_URL, {'connect_args': {'check_same_thread': False}}
+
+    if profile == 'pgbouncer':
+        if not pooled_url:
+            print("POSTGRES_URL is not set, connecting to POSTGRES_URL_NON_POOLING")
+        return profile, normalize_url(pooled_url or direct_url), pool_options(profile)
+
+    url = normalize_url(direct_url or pooled_url)
+    if profile == 'serverless':
+        return profile, url, {'poolclass': NullPool, 'connect_args': dict(POSTGRES_CONNECT_ARGS)}
+    return profile, url, pool_options(profile)
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'pool': pool.__class__.__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    return stats
@@ -0,0 +1,81 @@
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from metrics import stage
+from upstream_scheduler import call_deadline
+
+# Upper bound on enrichment calls running at once across all requests
+ENRICHMENT_MAX_WORKERS = int(os.getenv('ENRICHMENT_MAX_WORKERS', '8'))
+# Seconds each enrichment call may take before its section is dropped
+ENRICHMENT_CALL_TIMEOUT = float(os.getenv('ENRICHMENT_CALL_TIMEOUT', '20'))
+# Seconds a whole search may take, including the Spotify and Genius lookups
+SEARCH_DEADLINE = float(os.getenv('SEARCH_DEADLINE', '25'))
+
+executor = ThreadPoolExecutor(max_workers=ENRICHMENT_MAX_WORKERS, thread_name_prefix='enrichment')
+
+class SectionUnavailable(Exception):
+    pass
+
+def call_timeout(name, timeouts=None):
+    # Per-section overrides come from the caller or ENRICHMENT_TIMEOUT_<NAME>
+    if timeouts and name in timeouts:
+        return timeouts[name]
+    return float(os.getenv(f'ENRICHMENT_TIMEOUT_{name.upper()}', ENRICHMENT_CALL_TIMEOUT))
+
+def timed_task(name, fn, deadline):
+    def run():
+        # Upstream requests of the task give up at its deadline too
+        call_deadline.set(deadline)
+        with stage(f"enrichment_{name}"):
+            return fn()
+    return run
+
+def iter_enrichments(tasks, deadline=None, timeouts=None):
+    # Run every task on the shared executor and yield (name, result, error)
+    # as each one finishes. Tasks still running when their own timeout or the
+    # overall deadline passes are yielded with an error instead of a result.
+    submitted_at = time.monotonic()
+    if deadline is None:
+        deadline = submitted_at + SEARCH_DEADLINE
+
+    deadlines = {name: min(deadline, submitted_at + call_timeout(name, timeouts)) for name in tasks}
+    # Each task runs in a copy of the caller's context, so its stages are
+    # timed into the caller's request
+    futures = {
+        executor.submit(contextvars.copy_context().run, timed_task(name, fn, deadlines[name])): name
+        for name, fn in tasks.items()
+    }
+    call_deadlines = {future: deadlines[futures[future]] for future in futures}
+    pending = set(futures)
+
+    while pending:
+        now = time.monotonic()
+        expired = {future for future in pending if call_deadlines[future] <= now}
+        for future in expired:
+            # Drops a task still queued; a running one stops at its deadline
+            # through the capped request timeouts
+            future.cancel()
+            yield futures[future], None, 'timed out'
+        pending -= expired
+        if not pending:
+            break
+
+        next_deadline = min(call_deadlines[future] for future in pending)
+        done, pending = wait(pending, timeout=next_deadline - now, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, str(e) or e.__class__.__name__
+
+def run_enrichments(tasks, deadline=None, timeouts=None):
+    # Collect the results of iter_enrichments; failed sections map to None
+    results = {}
+    errors = {}
+    for name, result, error in iter_enrichments(tasks, deadline, timeouts):
+        results[name] = result
+        if error is not None:
+            errors[name] = error
+    return results, errors
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+
+from metrics import count_upstream_call, stage
+from upstream_scheduler import THROTTLE_STATUSES, call_deadline
+
+# Seconds to wait for a TCP/TLS connection to an upstream
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))
+# Retries for connection errors and retryable status codes
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '2'))
+# Base of the exponential backoff between retries, in seconds
+HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', '0.3'))
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+def capped_timeout(timeout, remaining):
+    # A requests timeout (None, seconds or (connect, read)) cut to remaining
+    # seconds
+    if remaining <= 0:
+        raise requests.exceptions.Timeout('call deadline passed')
+    if isinstance(timeout, tuple):
+        return tuple(remaining if part is None else min(part, remaining) for part in timeout)
+    return remaining if timeout is None else min(timeout, remaining)
+
+class DeadlineRetry(Retry):
+    # Retry policy that gives up once the next attempt would start past the
+    # call deadline; urllib3 retries inside one adapter send, where the
+    # capped timeout only covers each attempt
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        deadline = call_deadline.get()
+        if deadline is not None and time.monotonic() + retry.get_backoff_time() >= deadline:
+            reason = error or ResponseError('call deadline passed')
+            raise MaxRetryError(_pool, url, reason) from reason
+        return retry
+
+class UpstreamAdapter(HTTPAdapter):
+    # Times every request of the session as a stage and, with a scheduler,
+    # sends it through an UpstreamScheduler, so third-party clients mounted
+    # on it (lyricsgenius) are timed and scheduled too
+    def __init__(self, stage_name, scheduler=None, **kwargs):
+        self.stage_name = stage_name
+        self.scheduler = scheduler
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        # Inside an enrichment call, the request must not outlive the call
+        if call_deadline.get() is not None:
+            kwargs['timeout'] = capped_timeout(kwargs.get('timeout'), call_deadline.get() - time.monotonic())
+        def send():
+            count_upstream_call()
+            return super(UpstreamAdapter, self).send(request, **kwargs)
+
+        with stage(self.stage_name(request)) as current:
+            if self.scheduler:
+                # Per-path pauses (a loading model) are keyed on the URL path
+                response = self.scheduler.call(send, key=request.path_url.split('?')[0])
+            else:
+                response = send()
+            if response.status_code >= 400:
+                current.outcome = str(response.status_code)
+            return response
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+class UpstreamClient:
+    # A long-lived keep-alive session for one upstream with its own
+    # connection pool, timeouts and retry policy
+    def __init__(self, name, base_url='', pool_size=10, read_timeout=10,
+                 retry_methods=IDEMPOTENT_METHODS, retry_statuses=(429, 500, 502, 503, 504),
+                 headers=None, session=None, scheduler=None, stage_name=None):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (HTTP_CONNECT_TIMEOUT, read_timeout)
+        self.scheduler = scheduler
+        if scheduler:
+            # The scheduler waits out 429/503 hints itself, without holding
+            # a pooled connection while it sleeps
+            retry_statuses = tuple(status for status in retry_statuses if status not in THROTTLE_STATUSES)
+
+        retry = DeadlineRetry(
+            total=HTTP_RETRIES,
+            connect=HTTP_RETRIES,
+            read=HTTP_RETRIES,
+            status=HTTP_RETRIES,
+            backoff_factor=HTTP_BACKOFF,
+            status_forcelist=retry_statuses,
+            allowed_methods=retry_methods,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        # Stage each request is timed under; the client name by default
+        stage_name = stage_name or (lambda request: name)
+        self.adapter = UpstreamAdapter(stage_name, scheduler, pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+
+        # Reuse an existing session (e.g. the one inside a third-party
+        # client) so its requests go through the same tuned pool
+        self.session = session or requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+        with _clients_lock:
+            _clients[name] = self
+
+    def url(self, path):
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, self.url(path), **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def stats(self):
+        # urllib3 counts every request sent and every connection opened per
+        # host pool; the difference is how often a kept-alive socket was reused
+        pools = self.adapter.poolmanager.pools
+        requests_sent = 0
+        connections_opened = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_sent += pool.num_requests
+            connections_opened += pool.num_connections
+        stats = {
+            'requests': requests_sent,
+            'connections_opened': connections_opened,
+            'connections_reused': max(requests_sent - connections_opened, 0),
+            'reuse_ratio': round(1 - connections_opened / requests_sent, 3) if requests_sent else 0
+        }
+        if self.scheduler:
+            stats['scheduler'] = self.scheduler.stats()
+        return stats
+
+def client_stats():
+    with _clients_lock:
+        clients = list(_clients.values())
+    return {client.name: client.stats() for client in clients}
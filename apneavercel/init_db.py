@@ -1,6 +1,11 @@
-from app import app, db
+from dotenv import load_dotenv
 
-with app.app_context():
+load_dotenv()
+
+from api import get_api_app
+from models import db
+
+with get_api_app().app_context():
     # Create all database tables
     db.create_all()
     print("Database tables created successfully!") 
\ No newline at end of file
@@ -0,0 +1,124 @@
+import json
+import threading
+import zlib
+from datetime import datetime
+
+# Lyrics compress 3-4x; rows are written once and read many times
+COMPRESSION_LEVEL = 9
+# Entries merged per commit when importing
+IMPORT_CHUNK_SIZE = 500
+
+def compress_text(text):
+    return zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL)
+
+def decompress_text(blob):
+    return zlib.decompress(blob).decode('utf-8')
+
+class LyricsStore:
+    # Spotify track ID -> Genius song ID, URL, cleaned lyrics and
+    # annotations, kept in the lyrics_entry table
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'saved': 0, 'errors': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _entry(self, row):
+        return {
+            'genius_id': row.genius_id,
+            'genius_url': row.genius_url,
+            'lyrics': decompress_text(row.lyrics),
+            'annotations': json.loads(decompress_text(row.annotations)) if row.annotations is not None else None
+        }
+
+    def get(self, track_id):
+        try:
+            row = self.db.session.get(self.model, track_id)
+        except Exception as db_error:
+            self.db.session.rollback()
+            self._count('errors')
+            print(f"Database error: {str(db_error)}")
+            return None
+        self._count('hits' if row else 'misses')
+        return self._entry(row) if row else None
+
+    def save(self, track_id, genius_id, genius_url, lyrics, annotations=None):
+        # Annotations already stored for the track are kept when none are given
+        try:
+            now = datetime.utcnow()
+            row = self.db.session.get(self.model, track_id)
+            if row is None:
+                row = self.model(track_id=track_id, created_at=now)
+                self.db.session.add(row)
+            row.genius_id = genius_id
+            row.genius_url = genius_url
+            row.lyrics = compress_text(lyrics)
+            if annotations is not None:
+                row.annotations = compress_text(json.dumps(annotations))
+            row.updated_at = now
+            self.db.session.commit()
+            self._count('saved')
+        except Exception as db_error:
+            self.db.session.rollback()
+            self._count('errors')
+            print(f"Database error: {str(db_error)}")
+
+    def save_annotations(self, track_id, annotations):
+        try:
+            row = self.db.session.get(self.model, track_id)
+            if row is None:
+                return
+            row.annotations = compress_text(json.dumps(annotations))
+            row.updated_at = datetime.utcnow()
+            self.db.session.commit()
+        except Exception as db_error:
+            self.db.session.rollback()
+            self._count('errors')
+            print(f"Database error: {str(db_error)}")
+
+    def export_entries(self, f):
+        # One JSON object per line with the lyrics and annotations as plain
+        # text, so a dump can be inspected, edited and imported elsewhere
+        count = 0
+        for row in self.db.session.query(self.model).order_by(self.model.track_id).yield_per(IMPORT_CHUNK_SIZE):
+            f.write(json.dumps(dict(self._entry(row), track_id=row.track_id)) + '\n')
+            count += 1
+        return count
+
+    def import_entries(self, f):
+        # Reads the export format; entries replace stored ones for the same
+        # track. Returns (imported, skipped)
+        imported = skipped = 0
+        now = datetime.utcnow()
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                row = self.model(
+                    track_id=entry['track_id'],
+                    genius_id=int(entry['genius_id']),
+                    genius_url=entry.get('genius_url'),
+                    lyrics=compress_text(entry['lyrics']),
+                    annotations=compress_text(json.dumps(entry['annotations'])) if entry.get('annotations') is not None else None,
+                    created_at=now,
+                    updated_at=now
+                )
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping invalid entry: {str(e)}")
+                skipped += 1
+                continue
+            self.db.session.merge(row)
+            imported += 1
+            if imported % IMPORT_CHUNK_SIZE == 0:
+                self.db.session.commit()
+        self.db.session.commit()
+        return imported, skipped
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
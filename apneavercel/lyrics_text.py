@@ -0,0 +1,124 @@
+import re
+from collections import Counter
+
+# Genius prepends "<n> Contributors ... <title> Lyrics" (and translations)
+CONTRIBUTORS_PATTERN = re.compile(r'\d+ Contributors.*?Lyrics', re.DOTALL)
+LEADING_METADATA_PATTERN = re.compile(r'^.*?\[', re.DOTALL)
+# Section markers on their own line: [Chorus], [Verse 2: Artist]. The
+# multiline form splits whole lyrics into sections in one call
+SECTION_PATTERN = re.compile(r'^\[(.+)\]$')
+SECTION_LINE_PATTERN = re.compile(r'^[ \t]*\[(.+)\][ \t]*$', re.MULTILINE)
+NONBLANK_LINE_PATTERN = re.compile(r'^[ \t]*\S', re.MULTILINE)
+SECTION_NUMBER_PATTERN = re.compile(r'[\s\d]+$')
+# Everything that is neither a word character nor whitespace; removing it
+# keeps contractions as one word ("don't" -> "dont")
+NON_WORD_PATTERN = re.compile(r'[^\w\s]')
+
+# Common English stop words left out of the word frequency
+STOP_WORDS = frozenset({
+    'the', 'be', 'to', 'of', 'and', 'a', 'in', 'that', 'have', 'i', 'it',
+    'for', 'not', 'on', 'with', 'he', 'as', 'you', 'do', 'at', 'this',
+    'but', 'his', 'by', 'from', 'they', 'we', 'say', 'her', 'she', 'or',
+    'an', 'will', 'my', 'one', 'all', 'would', 'there', 'their', 'what',
+    'so', 'up', 'out', 'if', 'about', 'who', 'get', 'which', 'go', 'me',
+    'when', 'make', 'can', 'like', 'time', 'no', 'just', 'him', 'know',
+    'take', 'people', 'into', 'year', 'your', 'good', 'some', 'could',
+    'them', 'see', 'other', 'than', 'then', 'now', 'look', 'only',
+    'come', 'its', 'over', 'think', 'also', 'back', 'after', 'use',
+    'two', 'how', 'our', 'work', 'first', 'well', 'way', 'even',
+    'new', 'want', 'because', 'any', 'these', 'give', 'day',
+    'most', 'us', 'is', 'am', 'are', 'was', 'were', 'been'
+})
+
+TOP_WORDS = 10
+
+def clean_lyrics(lyrics):
+    # Remove the contributors and translations section
+    cleaned_lyrics = CONTRIBUTORS_PATTERN.sub('', lyrics)
+
+    # Remove any remaining metadata at the start
+    cleaned_lyrics = LEADING_METADATA_PATTERN.sub('[', cleaned_lyrics, count=1)
+
+    # If there's no section marker, keep the original lyrics
+    if not cleaned_lyrics.strip():
+        cleaned_lyrics = lyrics
+
+    return cleaned_lyrics.strip()
+
+def tokenize(text):
+    # The one word rule used by the stats, the word frequency and the local
+    # analyzer
+    return NON_WORD_PATTERN.sub('', text.lower()).split()
+
+def section_type(name):
+    # "Verse 2: Artist" -> "Verse"
+    return SECTION_NUMBER_PATTERN.sub('', name.split(':')[0]) or name
+
+def analyze_lyrics(lyrics, top_n=TOP_WORDS, with_lines=False):
+    # Stats, word frequency and sections (and, with with_lines, every line)
+    # of cleaned lyrics. The text is split at section markers once and each
+    # section is lowercased, stripped and tokenized as a whole; markers are
+    # not counted as lyrics. A line-by-line single pass gives the same
+    # result but is slower: the per-line Python work costs more than the
+    # few C-level calls per section. Cleaning is not folded in because
+    # lyrics are cleaned once when stored (search.find_lyrics) and only
+    # analyzed afterwards
+    parts = SECTION_LINE_PATTERN.split(lyrics)
+    all_words = []
+    sections = []
+    lines = [] if with_lines else None
+    line_count = 0
+
+    # parts alternates text and marker names: [before, name, text, name, text, ...]
+    for index in range(0, len(parts), 2):
+        body = parts[index]
+        words_text = NON_WORD_PATTERN.sub('', body.lower())
+        words = words_text.split()
+        all_words.extend(words)
+        body_line_count = len(NONBLANK_LINE_PATTERN.findall(body))
+        line_count += body_line_count
+
+        if index:
+            name = parts[index - 1].strip()
+            sections.append({
+                'name': name,
+                'type': section_type(name),
+                'line_count': body_line_count,
+                'word_count': len(words),
+                'unique_word_count': len(set(words))
+            })
+
+        if with_lines:
+            section = len(sections) - 1 if sections else None
+            # Removing punctuation keeps newlines, so both splits line up
+            for text, line_words in zip(body.split('\n'), words_text.split('\n')):
+                text = text.strip()
+                if text:
+                    lines.append({'text': text, 'section': section, 'word_count': len(line_words.split())})
+
+    # most_common() keeps first-seen order on ties
+    counts = Counter(all_words)
+    word_frequency = []
+    for word, count in counts.most_common():
+        if len(word_frequency) == top_n:
+            break
+        if len(word) > 1 and word not in STOP_WORDS:
+            word_frequency.append((word, count))
+
+    word_count = len(all_words)
+    unique_word_count = len(counts)
+    result = {
+        'stats': {
+            'word_count': word_count,
+            'unique_word_count': unique_word_count,
+            'line_count': line_count,
+            'section_count': len(sections),
+            'vocabulary_density': round(unique_word_count / word_count * 100, 2) if word_count > 0 else 0
+        },
+        'word_frequency': word_frequency,
+        'sections': sections,
+        'section_counts': dict(Counter(section['type'] for section in sections))
+    }
+    if with_lines:
+        result['lines'] = lines
+    return result
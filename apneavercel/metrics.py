@@ -0,0 +1,140 @@
+import contextvars
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)
+
+SERVER_TIMING_NAME_PATTERN = re.compile(r'[^A-Za-z0-9_.-]')
+
+class Histogram:
+    # Prometheus-style cumulative histogram with one series per label set
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series['buckets'][i] += 1
+            series['count'] += 1
+            series['sum'] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: dict(values, buckets=list(values['buckets'])) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            label_text = ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(self.label_names, labels))
+            for bound, count in zip(self.buckets, values['buckets']):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {values["count"]}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {values["sum"]:.6f}')
+            lines.append(f'{self.name}_count{{{label_text}}} {values["count"]}')
+        return '\n'.join(lines)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+stage_seconds = Histogram(
+    'apnea_stage_duration_seconds',
+    'Time spent in each stage of a request (upstream calls, analysis, database).',
+    ('stage', 'outcome')
+)
+request_seconds = Histogram(
+    'apnea_request_duration_seconds',
+    'Time to answer an API request, streamed bodies included.',
+    ('endpoint', 'status')
+)
+
+class RequestTimings:
+    # Stages of the current request, shared with the enrichment threads it
+    # fans out to; becomes the Server-Timing header
+    def __init__(self):
+        self.stages = []
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages.append((name, seconds))
+
+    def server_timing(self):
+        # Repeated stages (e.g. retried calls) are summed, in first-seen order
+        totals = {}
+        with self._lock:
+            for name, seconds in self.stages:
+                totals[name] = totals.get(name, 0) + seconds
+        return ', '.join(
+            f"{SERVER_TIMING_NAME_PATTERN.sub('_', name)};dur={seconds * 1000:.1f}"
+            for name, seconds in totals.items()
+        )
+
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+def start_request_timings():
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.outcome = 'ok'
+
+@contextmanager
+def stage(name):
+    # Times the block into the stage histogram and the current request's
+    # timings. Set .outcome on the yielded stage to label it (default 'ok',
+    # 'error' when the block raises)
+    current = Stage(name)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.outcome = 'error'
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, current.name, current.outcome)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add(current.name, elapsed)
+
+class UpstreamCallCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self):
+        with self._lock:
+            self.count += 1
+
+_upstream_counters = contextvars.ContextVar('upstream_counters', default=())
+
+@contextmanager
+def counting_upstream_calls():
+    # Counts the upstream requests sent inside the block, including from
+    # threads run in a copy of its context (the enrichment calls)
+    counter = UpstreamCallCounter()
+    token = _upstream_counters.set(_upstream_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _upstream_counters.reset(token)
+
+def count_upstream_call():
+    for counter in _upstream_counters.get():
+        counter.add()
+
+def render_metrics():
+    return '\n'.join([stage_seconds.render(), request_seconds.render()]) + '\n'
@@ -1,7 +1,91 @@
-from app import db
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from api import get_api_app
+from models import db
+from datetime import datetime
+from sqlalchemy import inspect, text
+from search_tracking import hour_start
 
 def init_db():
     db.create_all()
 
+def merge_duplicate_songs():
+    # Songs recorded twice by concurrent searches before uq_song_identity
+    # existed: keep the oldest row and fold the others' counts into it
+    duplicates = db.session.execute(text("""
+        SELECT track_name, artist, MIN(id), SUM(search_count), MAX(last_searched)
+        FROM song
+        GROUP BY track_name, artist
+        HAVING COUNT(*) > 1
+    """)).all()
+    for track_name, artist, keep_id, search_count, last_searched in duplicates:
+        db.session.execute(
+            text("UPDATE song SET search_count = :count, last_searched = :last WHERE id = :id"),
+            {'count': search_count, 'last': last_searched, 'id': keep_id}
+        )
+        db.session.execute(
+            text("DELETE FROM song WHERE track_name = :track AND artist = :artist AND id != :id"),
+            {'track': track_name, 'artist': artist, 'id': keep_id}
+        )
+    db.session.commit()
+    print(f"Merged {len(duplicates)} duplicated songs")
+
+def create_song_indexes():
+    # create_all() doesn't add constraints or indexes to an existing table
+    existing = {index['name'] for index in inspect(db.engine).get_indexes('song')}
+    existing |= {constraint['name'] for constraint in inspect(db.engine).get_unique_constraints('song')}
+    if 'uq_song_identity' not in existing:
+        db.session.execute(text("CREATE UNIQUE INDEX uq_song_identity ON song (track_name, artist)"))
+        db.session.commit()
+        print("Created uq_song_identity")
+    if 'ix_song_trending' in existing:
+        # Served the old last_searched/search_count query; trending now reads
+        # song_search_bucket
+        db.session.execute(text("DROP INDEX ix_song_trending"))
+        db.session.commit()
+        print("Dropped ix_song_trending")
+
+def migrate_analysis_result_key():
+    # analysis_result used to be keyed by track_id alone, so results of
+    # different analyzers overwrote each other. The rows are only a cache:
+    # drop the table and let create_all() make it with the composite key
+    from models import AnalysisResult
+    if 'analysis_result' not in inspect(db.engine).get_table_names():
+        return
+    if inspect(db.engine).get_pk_constraint('analysis_result')['constrained_columns'] == ['track_id']:
+        AnalysisResult.__table__.drop(db.engine)
+        AnalysisResult.__table__.create(db.engine)
+        print("Recreated analysis_result keyed by (track_id, model_version)")
+
+def backfill_search_buckets():
+    # Songs recorded before song_search_bucket existed only have a lifetime
+    # count; put it in the hour they were last searched so they keep
+    # showing up in trending until real hourly data replaces them
+    if db.session.execute(text("SELECT 1 FROM song_search_bucket LIMIT 1")).first():
+        return
+    songs = db.session.execute(text(
+        "SELECT id, search_count, last_searched FROM song WHERE last_searched IS NOT NULL"
+    )).all()
+    for song_id, search_count, last_searched in songs:
+        if isinstance(last_searched, str):
+            last_searched = datetime.fromisoformat(last_searched)
+        db.session.execute(
+            text("INSERT INTO song_search_bucket (song_id, bucket_start, bucket_hours, search_count) "
+                 "VALUES (:song_id, :bucket_start, 1, :search_count)"),
+            {'song_id': song_id, 'bucket_start': hour_start(last_searched), 'search_count': search_count or 1}
+        )
+    db.session.commit()
+    print(f"Backfilled search buckets for {len(songs)} songs")
+
+def upgrade():
+    migrate_analysis_result_key()
+    init_db()
+    merge_duplicate_songs()
+    create_song_indexes()
+    backfill_search_buckets()
+
 if __name__ == '__main__':
-    init_db() 
\ No newline at end of file
+    with get_api_app().app_context():
+        upgrade()
@@ -0,0 +1,115 @@
+from flask_sqlalchemy import SQLAlchemy
+import json
+from datetime import datetime
+
+# Bound to the API app by create_api_app()
+db = SQLAlchemy()
+
+# Define models
+class Song(db.Model):
+    __tablename__ = 'song'  # Explicitly set table name
+    id = db.Column(db.Integer, primary_key=True)
+    track_name = db.Column(db.String(200), nullable=False)
+    artist = db.Column(db.String(200), nullable=False)
+    album = db.Column(db.String(200))
+    spotify_url = db.Column(db.String(500))
+    album_art = db.Column(db.String(500))
+    search_count = db.Column(db.Integer, default=1)
+    last_searched = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # One row per song so searches can be counted with an upsert
+        db.UniqueConstraint('track_name', 'artist', name='uq_song_identity'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'track_name': self.track_name,
+            'artist': self.artist,
+            'album': self.album,
+            'spotify_url': self.spotify_url,
+            'album_art': self.album_art,
+            'search_count': self.search_count
+        }
+
+class SongSearchBucket(db.Model):
+    # Searches per song and hour (bucket_hours=1); hours older than
+    # BUCKET_COMPACT_AFTER_DAYS are rolled up into days (bucket_hours=24)
+    __tablename__ = 'song_search_bucket'
+    song_id = db.Column(db.Integer, db.ForeignKey('song.id', ondelete='CASCADE'), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    bucket_hours = db.Column(db.Integer, nullable=False, default=1)
+    search_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Window queries scan a time range and group by song
+        db.Index('ix_song_search_bucket_window', 'bucket_start', 'song_id', 'search_count'),
+    )
+
+class ApiToken(db.Model):
+    __tablename__ = 'api_token'
+    name = db.Column(db.String(50), primary_key=True)
+    access_token = db.Column(db.String(500), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class AnalysisResult(db.Model):
+    # One row per track and model set, so results of different analyzers
+    # for the same track are kept side by side
+    __tablename__ = 'analysis_result'
+    track_id = db.Column(db.String(64), primary_key=True)
+    model_version = db.Column(db.String(64), primary_key=True)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def is_fresh(self, version):
+        return self.model_version == version and self.expires_at > datetime.utcnow()
+
+class BatchJob(db.Model):
+    # A playlist, album or track list analysis that can be resumed: the
+    # track list is fixed when the job is created and results maps each
+    # finished track ID to its status
+    __tablename__ = 'batch_job'
+    id = db.Column(db.String(32), primary_key=True)
+    source = db.Column(db.String(100), nullable=False)
+    analyzer = db.Column(db.String(20), nullable=False)
+    track_ids = db.Column(db.Text, nullable=False)
+    results = db.Column(db.Text, nullable=False, default='{}')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class WarmupRun(db.Model):
+    # One row per /api/cron/warmup run
+    __tablename__ = 'warmup_run'
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    duration_ms = db.Column(db.Integer, nullable=False)
+    songs_checked = db.Column(db.Integer, nullable=False, default=0)
+    songs_refreshed = db.Column(db.Integer, nullable=False, default=0)
+    models = db.Column(db.Text, nullable=False, default='{}')
+    errors = db.Column(db.Text, nullable=False, default='{}')
+
+    def to_dict(self):
+        return {
+            'started_at': self.started_at.isoformat(),
+            'duration_ms': self.duration_ms,
+            'songs_checked': self.songs_checked,
+            'songs_refreshed': self.songs_refreshed,
+            'models': json.loads(self.models),
+            'errors': json.loads(self.errors)
+        }
+
+class LyricsEntry(db.Model):
+    # Genius song matched to a Spotify track, with its cleaned lyrics and
+    # annotations zlib-compressed, so repeat lookups skip Genius
+    __tablename__ = 'lyrics_entry'
+    track_id = db.Column(db.String(64), primary_key=True)
+    genius_id = db.Column(db.Integer, nullable=False, index=True)
+    genius_url = db.Column(db.String(500))
+    lyrics = db.Column(db.LargeBinary, nullable=False)
+    # NULL until the annotations have been fetched once
+    annotations = db.Column(db.LargeBinary)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
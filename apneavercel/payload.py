@@ -0,0 +1,129 @@
+from search import TRACK_FIELDS, LYRICS_FIELDS, ENRICHMENT_SECTIONS, CHUNKED_SECTIONS
+
+RESPONSE_FIELDS = TRACK_FIELDS + LYRICS_FIELDS + ENRICHMENT_SECTIONS + ('section_scores',)
+# Names fields= accepts besides the response keys
+FIELD_GROUPS = {
+    'track': TRACK_FIELDS,
+    'charts': ('word_frequency', 'sentiment', 'emotions', 'topics')
+}
+# Keys of the track and lyrics sections of /search/stream
+SECTION_FIELDS = {'track': TRACK_FIELDS, 'lyrics': LYRICS_FIELDS}
+
+# Compact scores are rounded to this many digits, plenty for a chart
+SCORE_DIGITS = 4
+
+def parse_fields(value):
+    # "track,sentiment" or ["track", "sentiment"] -> set of response keys.
+    # None (all fields) when nothing is asked for; ValueError on unknown names
+    if not value:
+        return None
+    names = value.split(',') if isinstance(value, str) else value
+    fields = set()
+    for name in names:
+        name = name.strip()
+        if name in FIELD_GROUPS:
+            fields.update(FIELD_GROUPS[name])
+        elif name in RESPONSE_FIELDS:
+            fields.add(name)
+        elif name:
+            raise ValueError(f"unknown field {name!r}; fields are {', '.join(tuple(FIELD_GROUPS) + RESPONSE_FIELDS)}")
+    return fields
+
+def compact_scores(section, data):
+    # The Hugging Face shapes ([[{"label", "score"}, ...]] for sentiment and
+    # emotions, {"sequence", "labels", "scores"} for topics) as one label list
+    # and one score list, in label order so the same labels always line up;
+    # section_scores has each entry compacted the same way. Anything else
+    # (an error, the summary) is returned as is
+    try:
+        if section == 'section_scores':
+            return [
+                dict(entry, **{
+                    name: compact_scores(name, entry[name]) for name in CHUNKED_SECTIONS if entry.get(name) is not None
+                })
+                for entry in data
+            ]
+        if section in ('sentiment', 'emotions'):
+            items = data[0] if isinstance(data[0], list) else data
+            pairs = sorted((item['label'], item['score']) for item in items)
+        elif section == 'topics':
+            pairs = sorted(zip(data['labels'], data['scores']))
+        else:
+            return data
+    except (KeyError, TypeError, IndexError):
+        return data
+    return {
+        'labels': [label for label, _ in pairs],
+        'scores': [round(score, SCORE_DIGITS) for _, score in pairs]
+    }
+
+def is_compact(value):
+    return isinstance(value, dict) and 'labels' in value and 'scores' in value
+
+def pack_scores(sections, sent=None):
+    # Turns the compact scores in sections (response keys -> data: a whole
+    # /search result or one /search/stream line) into bare score arrays that
+    # follow one label table per model. Returns the packed sections and the
+    # tables to send with them; on a stream, tables already sent (sent) are
+    # left out unless the labels changed
+    found = {}
+    for section in CHUNKED_SECTIONS:
+        if is_compact(sections.get(section)):
+            found.setdefault(section, set()).update(sections[section]['labels'])
+    for entry in sections.get('section_scores') or []:
+        for section in CHUNKED_SECTIONS:
+            if is_compact(entry.get(section)):
+                found.setdefault(section, set()).update(entry[section]['labels'])
+    sent = sent or {}
+    tables = {
+        section: sent[section] if section in sent and labels <= set(sent[section]) else sorted(labels)
+        for section, labels in found.items()
+    }
+
+    def array(section, scores):
+        by_label = dict(zip(scores['labels'], scores['scores']))
+        return [by_label.get(label) for label in tables[section]]
+
+    packed = dict(sections)
+    for section in CHUNKED_SECTIONS:
+        if is_compact(sections.get(section)):
+            packed[section] = array(section, sections[section])
+    if sections.get('section_scores'):
+        packed['section_scores'] = [
+            dict(entry, **{section: array(section, entry[section]) for section in CHUNKED_SECTIONS if is_compact(entry.get(section))})
+            for entry in sections['section_scores']
+        ]
+    return packed, {section: table for section, table in tables.items() if sent.get(section) != table}
+
+def section_selected(section, fields):
+    if fields is None or section not in SECTION_FIELDS:
+        return fields is None or section in fields
+    return any(field in fields for field in SECTION_FIELDS[section])
+
+def shape_section(section, data, fields=None, compact=False):
+    # One /search/stream section with only the selected fields
+    if section in SECTION_FIELDS:
+        return {field: value for field, value in data.items() if fields is None or field in fields}
+    if compact and data is not None:
+        return compact_scores(section, data)
+    return data
+
+def shape_payload(response_data, fields=None, compact=False):
+    # A whole /search result with only the selected fields; unavailable and
+    # fallback are always kept so clients can tell a left-out section from a
+    # failed or locally answered one
+    if fields is None and not compact:
+        return response_data
+    shaped = {}
+    for field in RESPONSE_FIELDS:
+        if field not in response_data or (fields is not None and field not in fields):
+            continue
+        value = response_data[field]
+        shaped[field] = compact_scores(field, value) if compact and value is not None else value
+    shaped['unavailable'] = response_data.get('unavailable', [])
+    shaped['fallback'] = response_data.get('fallback', [])
+    if not compact:
+        return shaped
+    packed, labels = pack_scores(shaped)
+    packed['labels'] = labels
+    return packed
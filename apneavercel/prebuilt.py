@@ -0,0 +1,69 @@
+import json
+import mimetypes
+import os
+
+from flask import current_app, request, send_file, url_for
+
+# Output of build_static.py: the pages rendered to HTML, the minified and
+# content-hashed CSS and JS under assets/, a .br and .gz copy of each, and
+# manifest.json mapping static/ paths to their hashed URLs
+BUILD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'public')
+MANIFEST_PATH = os.path.join(BUILD_DIR, 'manifest.json')
+
+# Hashed assets never change under the same URL; pages are revalidated so a
+# new deployment's asset URLs are picked up
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+PAGE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'assets': {}, 'pages': {}}
+
+manifest = load_manifest()
+
+def use_prebuilt():
+    # The debug server renders templates and serves static/ as they are, so
+    # edits show up without a rebuild
+    return not current_app.debug
+
+def asset_url(path):
+    # Template global: the hashed URL of a static/ file when it has been
+    # built, its static/ URL otherwise
+    if use_prebuilt() and path in manifest['assets']:
+        return manifest['assets'][path]
+    return url_for('static', filename=path)
+
+def send_prebuilt(relative_path, cache_control):
+    # A file from BUILD_DIR, precompressed when the client accepts it
+    path = os.path.join(BUILD_DIR, relative_path)
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    encoding = None
+    for name, suffix in PRECOMPRESSED:
+        if request.accept_encodings[name] and os.path.exists(path + suffix):
+            encoding, path = name, path + suffix
+            break
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+def prebuilt_page(template):
+    # The page build_static.py rendered from this template, or None
+    filename = manifest['pages'].get(template)
+    if filename is None or not use_prebuilt():
+        return None
+    return send_prebuilt(filename, PAGE_CACHE_CONTROL)
+
+def prebuilt_asset(filename):
+    # None for a file that isn't in the build, so the route can 404
+    relative_path = os.path.join('assets', os.path.basename(filename))
+    if not os.path.exists(os.path.join(BUILD_DIR, relative_path)):
+        return None
+    return send_prebuilt(relative_path, ASSET_CACHE_CONTROL)
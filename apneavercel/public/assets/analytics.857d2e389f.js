@@ -0,0 +1,577 @@
+function showLoading() {
+console.log('Loading started'); // Debugging log
+document.getElementById('loadingOverlay').style.display = 'block';
+document.getElementById('loadingIndicator').style.display = 'block';
+}
+function hideLoading() {
+console.log('Loading ended'); // Debugging log
+document.getElementById('loadingOverlay').style.display = 'none';
+document.getElementById('loadingIndicator').style.display = 'none';
+}
+const SEARCH_FIELDS = 'track,lyrics,word_frequency,sentiment,emotions,topics';
+const RESULT_CACHE_DB = 'apnea-results';
+const RESULT_CACHE_VERSION = 1;
+const RESULT_CACHE_TTL_MS = 24 * 60 * 60 * 1000;
+const RESULT_CACHE_MAX_ENTRIES = 50;
+let resultCacheDb = null;
+function openResultCache() {
+if (!resultCacheDb) {
+resultCacheDb = new Promise(resolve => {
+if (!window.indexedDB) {
+resolve(null);
+return;
+}
+const request = indexedDB.open(RESULT_CACHE_DB, RESULT_CACHE_VERSION);
+request.onupgradeneeded = () => {
+const db = request.result;
+Array.from(db.objectStoreNames).forEach(name => db.deleteObjectStore(name));
+db.createObjectStore('results', { keyPath: 'trackId' }).createIndex('usedAt', 'usedAt');
+db.createObjectStore('queries', { keyPath: 'query' });
+};
+request.onsuccess = () => resolve(request.result);
+request.onerror = () => resolve(null);
+request.onblocked = () => resolve(null);
+});
+}
+return resultCacheDb;
+}
+function idbRequest(request) {
+return new Promise((resolve, reject) => {
+request.onsuccess = () => resolve(request.result);
+request.onerror = () => reject(request.error);
+});
+}
+function queryKey(query) {
+return query.trim().toLowerCase().replace(/\s+/g, ' ');
+}
+function trackIdOf(data) {
+return data.spotify_url ? data.spotify_url.split('/').pop() : null;
+}
+async function getCachedResult(trackId, query) {
+try {
+const db = await openResultCache();
+if (!db) {
+return null;
+}
+const tx = db.transaction(['results', 'queries'], 'readwrite');
+if (!trackId) {
+const alias = await idbRequest(tx.objectStore('queries').get(queryKey(query)));
+trackId = alias && alias.trackId;
+}
+const entry = trackId && await idbRequest(tx.objectStore('results').get(trackId));
+if (!entry) {
+return null;
+}
+const now = Date.now();
+if (now - entry.savedAt > RESULT_CACHE_TTL_MS) {
+tx.objectStore('results').delete(trackId);
+return null;
+}
+entry.usedAt = now;
+tx.objectStore('results').put(entry);
+return entry.data;
+} catch (error) {
+console.error('Result cache:', error);
+return null;
+}
+}
+async function cacheResult(query, data) {
+const trackId = trackIdOf(data);
+if (!trackId) {
+return;
+}
+try {
+const db = await openResultCache();
+if (!db) {
+return;
+}
+const tx = db.transaction(['results', 'queries'], 'readwrite');
+const results = tx.objectStore('results');
+const now = Date.now();
+results.put({ trackId: trackId, data: data, savedAt: now, usedAt: now });
+tx.objectStore('queries').put({ query: queryKey(query), trackId: trackId });
+const count = await idbRequest(results.count());
+let excess = count - RESULT_CACHE_MAX_ENTRIES;
+if (excess > 0) {
+const cursors = results.index('usedAt').openCursor();
+cursors.onsuccess = () => {
+const cursor = cursors.result;
+if (cursor && excess-- > 0) {
+cursor.delete();
+cursor.continue();
+}
+};
+}
+} catch (error) {
+console.error('Result cache:', error);
+}
+}
+async function searchSong() {
+showLoading();
+try {
+const searchInput = document.getElementById('searchInput');
+const query = searchInput.value;
+if (!query.trim()) {
+hideLoading();
+return;
+}
+const trackId = searchInput.dataset.trackId;
+const cached = await getCachedResult(trackId, query);
+if (cached) {
+displayResults(cached);
+return;
+}
+const response = await fetch(`/search/stream?format=compact&fields=${SEARCH_FIELDS}`, {
+method: 'POST',
+headers: {
+'Content-Type': 'application/json',
+},
+body: JSON.stringify(trackId ? { track_id: trackId } : { query: query })
+});
+if (!response.ok) {
+const data = await response.json();
+console.error('Error:', data.error);
+displayError(data.error);
+return;
+}
+const result = {};
+const labels = {};
+let complete = false;
+await readSearchStream(response, line => {
+const chunk = withLabels(line, labels);
+if (chunk.section === 'track' || chunk.section === 'lyrics') {
+Object.assign(result, chunk.data);
+} else if (chunk.section === 'done') {
+complete = !chunk.unavailable.length && !chunk.fallback.length;
+} else if (chunk.section !== 'error') {
+result[chunk.section] = chunk.data;
+}
+handleSearchChunk(chunk);
+});
+if (complete) {
+await cacheResult(query, result);
+}
+} catch (error) {
+console.error('Error:', error);
+displayError('An error occurred while searching for the song');
+} finally {
+hideLoading();
+}
+}
+async function readSearchStream(response, onChunk) {
+const reader = response.body.getReader();
+const decoder = new TextDecoder();
+let buffer = '';
+while (true) {
+const { value, done } = await reader.read();
+if (done) {
+break;
+}
+buffer += decoder.decode(value, { stream: true });
+const lines = buffer.split('\n');
+buffer = lines.pop();
+lines.filter(line => line.trim()).forEach(line => onChunk(JSON.parse(line)));
+}
+if (buffer.trim()) {
+onChunk(JSON.parse(buffer));
+}
+}
+function withLabels(chunk, labels) {
+Object.assign(labels, chunk.labels);
+if (chunk.section in labels && Array.isArray(chunk.data)) {
+return { ...chunk, data: { labels: labels[chunk.section], scores: chunk.data } };
+}
+return chunk;
+}
+function handleSearchChunk(chunk) {
+switch (chunk.section) {
+case 'track':
+hideLoading();
+displaySongHeader(chunk.data);
+displayAnalyticsGrid();
+break;
+case 'lyrics':
+displayLyrics(chunk.data.lyrics);
+createWordCloud(chunk.data.word_frequency);
+markSectionReady('wordCloud');
+break;
+case 'sentiment':
+renderSection('sentimentChart', chunk.data, createSentimentChart);
+break;
+case 'emotions':
+renderSection('emotionsChart', chunk.data, createEmotionsChart);
+break;
+case 'topics':
+renderSection('topicsChart', chunk.data, createTopicsChart);
+break;
+case 'error':
+console.error('Error:', chunk.error);
+displayError(chunk.error);
+break;
+}
+}
+function renderSection(elementId, data, render) {
+if (data) {
+render(data);
+markSectionReady(elementId);
+} else {
+showSectionUnavailable(elementId);
+}
+}
+function markSectionReady(elementId) {
+const element = document.getElementById(elementId);
+const pending = element && element.closest('.analytics-card').querySelector('.section-pending');
+if (pending) {
+pending.remove();
+}
+}
+function displayError(message) {
+const resultsContainer = document.getElementById('results');
+if (!resultsContainer) {
+console.error('Results container not found');
+return;
+}
+resultsContainer.querySelectorAll('canvas').forEach(canvas => {
+Chart.getChart(canvas)?.destroy();
+});
+resultsContainer.style.display = 'block';
+resultsContainer.innerHTML = `
+        <div class="error-message">
+            <p>${message}</p>
+            <p>Please check the browser console for more details.</p>
+        </div>
+    `;
+}
+function displayResults(data) {
+displaySongHeader(data);
+displayAnalyticsGrid();
+displayLyrics(data.lyrics);
+initializeCharts(data);
+}
+function getResultsContainer() {
+const resultsContainer = document.getElementById('results');
+if (!resultsContainer) {
+console.error('Results container not found');
+return null;
+}
+resultsContainer.style.display = 'block';
+const errorMessage = resultsContainer.querySelector('.error-message');
+if (errorMessage) {
+errorMessage.remove();
+}
+return resultsContainer;
+}
+function displaySongHeader(data) {
+const resultsContainer = getResultsContainer();
+if (!resultsContainer) {
+return;
+}
+let songHeader = resultsContainer.querySelector('.song-header');
+if (!songHeader) {
+songHeader = document.createElement('div');
+songHeader.className = 'song-header';
+songHeader.innerHTML = `
+            <div class="album-art">
+                <img id="albumArt" alt="Album Art">
+            </div>
+            <div class="song-info">
+                <h2 id="trackName"></h2>
+                <p id="artistName"></p>
+                <p id="albumName"></p>
+                <a id="spotifyLink" target="_blank" class="spotify-button">
+                    <i class="fab fa-spotify"></i> Listen on Spotify
+                </a>
+            </div>
+        `;
+resultsContainer.appendChild(songHeader);
+}
+songHeader.querySelector('#albumArt').src = data.album_art || '';
+songHeader.querySelector('#trackName').textContent = data.track_name || '';
+songHeader.querySelector('#artistName').textContent = data.artist || '';
+songHeader.querySelector('#albumName').textContent = data.album || '';
+songHeader.querySelector('#spotifyLink').href = data.spotify_url || '#';
+}
+function displayAnalyticsGrid() {
+const resultsContainer = getResultsContainer();
+if (!resultsContainer) {
+return;
+}
+let analyticsGrid = resultsContainer.querySelector('.analytics-grid');
+if (analyticsGrid) {
+analyticsGrid.querySelectorAll('.analytics-card').forEach(resetAnalyticsCard);
+} else {
+analyticsGrid = document.createElement('div');
+analyticsGrid.className = 'analytics-grid';
+resultsContainer.appendChild(analyticsGrid);
+analyticsGrid.innerHTML = `
+            <div class="analytics-card">
+                <h3>Sentiment Analysis</h3>
+                <p class="section-pending">Analyzing...</p>
+                <canvas id="sentimentChart"></canvas>
+            </div>
+            <div class="analytics-card">
+                <h3>Emotional Analysis</h3>
+                <p class="section-pending">Analyzing...</p>
+                <canvas id="emotionsChart"></canvas>
+            </div>
+            <div class="analytics-card">
+                <h3>Topic Analysis</h3>
+                <p class="section-pending">Analyzing...</p>
+                <canvas id="topicsChart"></canvas>
+            </div>
+            <div class="analytics-card">
+                <h3>Word Frequency</h3>
+                <p class="section-pending">Analyzing...</p>
+                <div id="wordCloud"></div>
+            </div>
+        `;
+}
+const lyricsSection = resultsContainer.querySelector('.lyrics-section');
+if (lyricsSection) {
+lyricsSection.remove();
+}
+}
+function displayLyrics(lyrics) {
+const resultsContainer = getResultsContainer();
+if (!resultsContainer) {
+return;
+}
+let lyricsSection = resultsContainer.querySelector('.lyrics-section');
+if (!lyricsSection) {
+lyricsSection = document.createElement('div');
+lyricsSection.className = 'lyrics-section';
+resultsContainer.appendChild(lyricsSection);
+}
+lyricsSection.innerHTML = `
+        <h3>Lyrics</h3>
+        <div id="lyrics" class="lyrics-content">${lyrics.replace(/\n/g, '<br>')}</div>
+    `;
+}
+function initializeCharts(data) {
+renderSection('sentimentChart', data.sentiment, createSentimentChart);
+renderSection('emotionsChart', data.emotions, createEmotionsChart);
+renderSection('topicsChart', data.topics, createTopicsChart);
+createWordCloud(data.word_frequency);
+markSectionReady('wordCloud');
+}
+function resetAnalyticsCard(card) {
+const unavailable = card.querySelector('.section-unavailable');
+if (unavailable) {
+unavailable.remove();
+}
+card.querySelector('canvas, #wordCloud').style.display = '';
+if (!card.querySelector('.section-pending')) {
+const pending = document.createElement('p');
+pending.className = 'section-pending';
+pending.textContent = 'Analyzing...';
+card.querySelector('h3').after(pending);
+}
+}
+function showSectionUnavailable(elementId) {
+const element = document.getElementById(elementId);
+if (!element) {
+return;
+}
+markSectionReady(elementId);
+const message = document.createElement('p');
+message.className = 'section-unavailable';
+message.textContent = 'This analysis is currently unavailable. Please try again later.';
+element.style.display = 'none';
+element.before(message);
+}
+function drawChart(elementId, labels, values, config) {
+const canvas = document.getElementById(elementId);
+const chart = Chart.getChart(canvas);
+if (chart) {
+chart.data.labels = labels;
+chart.data.datasets[0].data = values;
+chart.update();
+return;
+}
+new Chart(canvas, config(labels, values));
+}
+function createSentimentChart(sentimentData) {
+const scores = sentimentData.scores;
+const labels = sentimentData.labels.map(label => {
+switch(label) {
+case '1 star': return 'Very Negative';
+case '2 stars': return 'Negative';
+case '3 stars': return 'Neutral';
+case '4 stars': return 'Positive';
+case '5 stars': return 'Very Positive';
+default: return label;
+}
+});
+drawChart('sentimentChart', labels, scores, (labels, scores) => ({
+type: 'doughnut',
+data: {
+labels: labels,
+datasets: [{
+data: scores,
+backgroundColor: [
+'#ff6b6b',  // Very Negative
+'#ff9f89',  // Negative
+'#ffe66d',  // Neutral
+'#4ecdc4',  // Positive
+'#2ecc71'   // Very Positive
+]
+}]
+},
+options: {
+responsive: true,
+plugins: {
+legend: {
+position: 'bottom'
+},
+tooltip: {
+callbacks: {
+label: function(context) {
+const value = context.raw;
+return `${context.label}: ${(value * 100).toFixed(1)}%`;
+}
+}
+}
+}
+}
+}));
+}
+function createEmotionsChart(emotionsData) {
+const labels = emotionsData.labels.map(label => label.charAt(0).toUpperCase() + label.slice(1));
+const values = emotionsData.scores;
+drawChart('emotionsChart', labels, values, (labels, values) => ({
+type: 'radar',
+data: {
+labels: labels,
+datasets: [{
+label: 'Emotion Intensity',
+data: values,
+backgroundColor: 'rgba(29, 185, 84, 0.2)',
+borderColor: 'rgba(29, 185, 84, 1)',
+pointBackgroundColor: 'rgba(29, 185, 84, 1)',
+pointHoverBackgroundColor: '#fff',
+pointHoverBorderColor: 'rgba(29, 185, 84, 1)'
+}]
+},
+options: {
+responsive: true,
+scales: {
+r: {
+beginAtZero: true,
+max: 1,
+ticks: {
+stepSize: 0.2
+}
+}
+},
+plugins: {
+legend: {
+display: false
+},
+tooltip: {
+callbacks: {
+label: function(context) {
+return `${(context.raw * 100).toFixed(1)}%`;
+}
+}
+}
+}
+}
+}));
+}
+function createTopicsChart(topicsData) {
+const combined = topicsData.labels.map((label, i) => ({
+label: label.replace(/_/g, ' '),
+score: topicsData.scores[i]
+}));
+combined.sort((a, b) => b.score - a.score);
+const topTopics = combined.slice(0, 5);
+const labels = topTopics.map(item => item.label.charAt(0).toUpperCase() + item.label.slice(1));
+const values = topTopics.map(item => item.score);
+drawChart('topicsChart', labels, values, (labels, values) => ({
+type: 'bar',
+data: {
+labels: labels,
+datasets: [{
+label: 'Topic Relevance',
+data: values,
+backgroundColor: 'rgba(29, 185, 84, 0.7)',
+borderColor: 'rgba(29, 185, 84, 1)',
+borderWidth: 1
+}]
+},
+options: {
+indexAxis: 'y',
+responsive: true,
+plugins: {
+legend: {
+display: false
+},
+tooltip: {
+callbacks: {
+label: function(context) {
+return `${(context.raw * 100).toFixed(1)}% relevance`;
+}
+}
+}
+},
+scales: {
+x: {
+beginAtZero: true,
+max: 1,
+ticks: {
+callback: function(value) {
+return (value * 100) + '%';
+}
+}
+},
+y: {
+ticks: {
+callback: function(value) {
+const label = this.getLabelForValue(value);
+return label.length > 20 ? label.substr(0, 17) + '...' : label;
+}
+}
+}
+}
+}
+}));
+}
+function createWordCloud(wordFrequency) {
+const wordCloud = document.getElementById('wordCloud');
+const width = wordCloud.offsetWidth;
+const height = 300;
+const words = JSON.stringify(wordFrequency);
+if (wordCloud.dataset.words === words && wordCloud.querySelector('svg')) {
+return;
+}
+wordCloud.dataset.words = words;
+d3.select("#wordCloud").html("");
+const svg = d3.select("#wordCloud")
+.append("svg")
+.attr("width", width)
+.attr("height", height);
+const layout = d3.layout.cloud()
+.size([width, height])
+.words(wordFrequency.map(d => ({
+text: d[0],
+size: 10 + d[1] * 5
+})))
+.padding(5)
+.rotate(() => ~~(Math.random() * 2) * 90)
+.fontSize(d => d.size)
+.on("end", draw);
+layout.start();
+function draw(words) {
+svg.append("g")
+.attr("transform", `translate(${width/2},${height/2})`)
+.selectAll("text")
+.data(words)
+.enter().append("text")
+.style("font-size", d => `${d.size}px`)
+.style("font-family", "Montserrat")
+.style("fill", () => d3.schemeCategory10[~~(Math.random() * 10)])
+.attr("text-anchor", "middle")
+.attr("transform", d => `translate(${d.x},${d.y})rotate(${d.rotate})`)
+.text(d => d.text);
+}
+}
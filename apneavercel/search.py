@@ -0,0 +1,197 @@
+import json
+from datetime import datetime, timedelta
+
+from analysis import ANALYSIS_CACHE_TTL, ANALYSIS_FALLBACK_TTL, analysis_version, summarize_song
+from analyzers import fallback_sections
+from chunking import combine_windows, lyric_windows
+from clients import get_genius
+from enrichment import iter_enrichments
+from lyrics_store import LyricsStore
+from lyrics_text import analyze_lyrics, clean_lyrics
+from metrics import stage
+from models import db, AnalysisResult, LyricsEntry
+from singleflight import SingleFlight
+
+class LyricsNotFound(Exception):
+    pass
+
+# Identical searches running at the same time share one pipeline run: first
+# per normalized query (the Spotify search), then per track (Genius lookup,
+# annotations and the four model calls)
+search_flight = SingleFlight()
+analysis_flight = SingleFlight()
+
+# Lyrics and annotations already scraped from Genius, by Spotify track ID
+lyrics_store = LyricsStore(db, LyricsEntry)
+
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+# Sections of a /search result in the order the streaming endpoint sends them
+TRACK_FIELDS = ('track_name', 'artist', 'album', 'spotify_url', 'album_art')
+LYRICS_FIELDS = ('genius_url', 'lyrics', 'stats', 'word_frequency', 'sections')
+ENRICHMENT_SECTIONS = ('sentiment', 'emotions', 'topics', 'summary')
+# Scored over windows of the whole lyrics, also per lyrics section; sent last
+# as section_scores, one entry per item of 'sections'
+CHUNKED_SECTIONS = ('sentiment', 'emotions', 'topics')
+
+def iter_track_analysis(track, analyzer, deadline=None):
+    # Yields (section, data) pairs as each part of the analysis is ready
+    yield 'track', {
+        'track_name': track['name'],
+        'artist': track['artists'][0]['name'],
+        'album': track['album']['name'],
+        'spotify_url': track['external_urls']['spotify'],
+        'album_art': track['album']['images'][0]['url'] if track['album']['images'] else None
+    }
+
+    entry = find_lyrics(track)
+    lyrics = entry['lyrics']
+    with stage('lyrics_text'):
+        text = analyze_lyrics(lyrics)
+
+    yield 'lyrics', {
+        'genius_url': entry['genius_url'],
+        'lyrics': lyrics,
+        'stats': text['stats'],
+        'word_frequency': text['word_frequency'],
+        'sections': text['sections']
+    }
+
+    fetched = {}
+    windows, spans = lyric_windows(lyrics)
+    section_results = {}
+    # A call that missed the deadline may still finish later; its
+    # per-section results are left out like the song-level one
+    failed = set()
+
+    def chunked(section, analyze, zero_shot=False):
+        # One batched request with every window, combined into the song-level
+        # result; the per-section results are kept for section_scores
+        def run():
+            song, by_section = combine_windows(analyze(windows), spans, len(text['sections']), zero_shot)
+            section_results[section] = by_section
+            return song
+        return run
+
+    def summary():
+        annotations = entry['annotations']
+        if annotations is None:
+            annotations = fetched['annotations'] = get_genius().song_annotations(entry['genius_id'])
+        return summarize_song(lyrics, annotations, analyzer)
+
+    # Sections the fallback analyzer answered locally; each task runs in its
+    # own context, so every one of them is pointed at this set
+    fell_back = set()
+
+    def recording_fallbacks(fn):
+        def run():
+            fallback_sections.set(fell_back)
+            return fn()
+        return run
+
+    # Run the annotation lookup and the model calls concurrently; any
+    # section that fails or misses its deadline is reported as unavailable
+    for section, result, error in iter_enrichments({
+        'summary': recording_fallbacks(summary),
+        'sentiment': recording_fallbacks(chunked('sentiment', analyzer.sentiment)),
+        'emotions': recording_fallbacks(chunked('emotions', analyzer.emotions)),
+        'topics': recording_fallbacks(chunked('topics', analyzer.topics, zero_shot=True))
+    }, deadline=deadline):
+        if error is not None:
+            print(f"Enrichment '{section}' unavailable: {error}")
+            failed.add(section)
+        yield section, result
+
+    yield 'section_scores', [
+        dict({'name': item['name']}, **{
+            section: section_results[section][index] if section in section_results and section not in failed else None
+            for section in CHUNKED_SECTIONS
+        })
+        for index, item in enumerate(text['sections'])
+    ]
+    yield 'fallback', sorted(fell_back - failed)
+
+    # Stored from here: the enrichment threads have no app context
+    if 'annotations' in fetched:
+        lyrics_store.save_annotations(track['id'], fetched['annotations'])
+
+def find_lyrics(track):
+    # Stored lyrics skip the Genius search and page scrape entirely
+    with stage('lyrics_store') as current:
+        entry = lyrics_store.get(track['id'])
+        current.outcome = 'hit' if entry is not None else 'miss'
+    if entry is not None:
+        return entry
+
+    song = get_genius().search_song(track['name'], track['artists'][0]['name'])
+    if not song:
+        raise LyricsNotFound()
+
+    entry = {'genius_id': song.id, 'genius_url': song.url, 'lyrics': clean_lyrics(song.lyrics), 'annotations': None}
+    lyrics_store.save(track['id'], entry['genius_id'], entry['genius_url'], entry['lyrics'])
+    return entry
+
+def iter_payload_sections(response_data):
+    # Splits a complete /search result back into streamable sections
+    yield 'track', {field: response_data.get(field) for field in TRACK_FIELDS}
+    yield 'lyrics', {field: response_data.get(field) for field in LYRICS_FIELDS}
+    for section in ENRICHMENT_SECTIONS:
+        yield section, response_data.get(section)
+    yield 'section_scores', response_data.get('section_scores', [])
+    yield 'fallback', response_data.get('fallback', [])
+
+def collect_section(response_data, section, data):
+    if section in ENRICHMENT_SECTIONS:
+        response_data[section] = data
+        if data is None:
+            response_data['unavailable'] = sorted(response_data.get('unavailable', []) + [section])
+    elif section in ('section_scores', 'fallback'):
+        response_data[section] = data
+    else:
+        response_data.update(data)
+
+def analyze_track(track, analyzer, deadline=None):
+    response_data = {'unavailable': []}
+    for section, data in iter_track_analysis(track, analyzer, deadline=deadline):
+        collect_section(response_data, section, data)
+    return response_data
+
+def get_cached_analysis(track_id, analyzer):
+    try:
+        with stage('cache_lookup') as current:
+            cached = db.session.get(AnalysisResult, (track_id, analysis_version(analyzer)))
+            current.outcome = 'miss'
+            if cached and cached.is_fresh(analysis_version(analyzer)):
+                current.outcome = 'hit'
+                return json.loads(cached.payload)
+    except Exception as db_error:
+        db.session.rollback()
+        print(f"Database error: {str(db_error)}")
+    return None
+
+def store_analysis(track_id, response_data, analyzer):
+    # Partial results are not cached so the missing sections get another try,
+    # and ones with locally answered sections only for ANALYSIS_FALLBACK_TTL
+    if response_data['unavailable']:
+        return
+    ttl = ANALYSIS_FALLBACK_TTL if response_data.get('fallback') else ANALYSIS_CACHE_TTL
+    try:
+        with stage('db_store_analysis'):
+            now = datetime.utcnow()
+            db.session.merge(AnalysisResult(
+                track_id=track_id,
+                payload=json.dumps(response_data),
+                model_version=analysis_version(analyzer),
+                created_at=now,
+                expires_at=now + timedelta(seconds=ttl)
+            ))
+            db.session.commit()
+    except Exception as db_error:
+        db.session.rollback()
+        print(f"Database error: {str(db_error)}")
+
+def analyze_and_store(track, analyzer, deadline=None):
+    response_data = analyze_track(track, analyzer, deadline=deadline)
+    store_analysis(track['id'], response_data, analyzer)
+    return response_data
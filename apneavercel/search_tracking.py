@@ -0,0 +1,150 @@
+import atexit
+import re
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE support
+UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+SPOTIFY_TRACK_URL_PATTERN = re.compile(r'open\.spotify\.com/track/([A-Za-z0-9]+)')
+
+def track_id_from_url(spotify_url):
+    # Songs are stored without their Spotify ID; it is the end of their URL
+    match = SPOTIFY_TRACK_URL_PATTERN.search(spotify_url or '')
+    return match.group(1) if match else None
+
+def hour_start(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def song_row(track, searched_at=None):
+    searched_at = searched_at or datetime.utcnow()
+    return {
+        'track_name': track['name'],
+        'artist': track['artists'][0]['name'],
+        'album': track['album']['name'],
+        'spotify_url': track['external_urls']['spotify'],
+        'album_art': track['album']['images'][0]['url'] if track['album']['images'] else None,
+        'search_count': 1,
+        'last_searched': searched_at,
+        # Searches per hour, written to the song_search_bucket rollup
+        'hourly': {hour_start(searched_at): 1}
+    }
+
+def upsert_songs(session, song_model, rows, bucket_model=None):
+    # One statement for any number of songs: new songs are inserted and
+    # existing ones have their count incremented in the database, so
+    # concurrent searches never overwrite each other's increments
+    if not rows:
+        return
+    insert = UPSERT_INSERTS[session.get_bind().dialect.name]
+    now = datetime.utcnow()
+    song_values = [
+        dict({k: v for k, v in row.items() if k != 'hourly'}, created_at=now)
+        for row in rows
+    ]
+    stmt = insert(song_model).values(song_values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['track_name', 'artist'],
+        set_={
+            'search_count': song_model.search_count + stmt.excluded.search_count,
+            'last_searched': stmt.excluded.last_searched,
+            'album': stmt.excluded.album,
+            'spotify_url': stmt.excluded.spotify_url,
+            'album_art': stmt.excluded.album_art
+        }
+    ).returning(song_model.id, song_model.track_name, song_model.artist)
+    song_ids = {(track_name, artist): song_id for song_id, track_name, artist in session.execute(stmt)}
+
+    # ...and a second statement adds every song's hourly counts to its buckets
+    if bucket_model is not None:
+        bucket_values = [
+            {'song_id': song_ids[(row['track_name'], row['artist'])], 'bucket_start': start, 'bucket_hours': 1, 'search_count': count}
+            for row in rows
+            for start, count in row['hourly'].items()
+        ]
+        bucket_stmt = insert(bucket_model).values(bucket_values)
+        bucket_stmt = bucket_stmt.on_conflict_do_update(
+            index_elements=['song_id', 'bucket_start'],
+            set_={'search_count': bucket_model.search_count + bucket_stmt.excluded.search_count}
+        )
+        session.execute(bucket_stmt)
+    session.commit()
+
+class SearchCountBuffer:
+    # Write-behind buffer: searches are counted in memory and written with a
+    # single upsert per flush instead of one transaction per request
+    def __init__(self, flush_rows, interval=None):
+        self.flush_rows = flush_rows
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stats = {'searches': 0, 'flushes': 0, 'rows_written': 0, 'errors': 0}
+
+    def add(self, row):
+        key = (row['track_name'], row['artist'])
+        with self._lock:
+            self._stats['searches'] += 1
+            self._merge(key, row)
+        if self.interval and self._thread is None:
+            self._start()
+
+    def _merge(self, key, row):
+        pending = self._pending.get(key)
+        if pending is None:
+            self._pending[key] = dict(row, hourly=dict(row['hourly']))
+        else:
+            pending.update({k: v for k, v in row.items() if k not in ('search_count', 'last_searched', 'hourly')})
+            pending['search_count'] += row['search_count']
+            pending['last_searched'] = max(pending['last_searched'], row['last_searched'])
+            for start, count in row['hourly'].items():
+                pending['hourly'][start] = pending['hourly'].get(start, 0) + count
+
+    def flush(self):
+        # Only one flush writes at a time; rows added meanwhile wait for the next
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._pending.values())
+                self._pending = {}
+            if not rows:
+                return 0
+            try:
+                self.flush_rows(rows)
+            except Exception as db_error:
+                # Put the counts back so they are retried on the next flush
+                with self._lock:
+                    for row in rows:
+                        self._merge((row['track_name'], row['artist']), row)
+                    self._stats['errors'] += 1
+                print(f"Database error: {str(db_error)}")
+                return 0
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats['rows_written'] += len(rows)
+            return len(rows)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        return stats
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='search-count-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
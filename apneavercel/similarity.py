@@ -0,0 +1,263 @@
+import hashlib
+import math
+import os
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from payload import compact_scores
+
+# Songs returned by /api/similar
+SIMILAR_LIMIT = 10
+# Where the index is saved after it changes and loaded from on start, so a
+# new instance only reads the analyses stored since; one file per database
+# in the temp directory by default
+SIMILARITY_INDEX_PATH = os.getenv('SIMILARITY_INDEX_PATH')
+# Seconds before the index picks up analyses other instances stored
+SIMILARITY_SYNC_INTERVAL = float(os.getenv('SIMILARITY_SYNC_INTERVAL', '300'))
+# A sync re-reads analyses stored this long before the last one it saw; a
+# buffered search count can write the song row after its analysis
+SIMILARITY_SYNC_LOOKBACK = timedelta(hours=1)
+
+# Feature layout: each block is hashed into a fixed number of columns, so
+# new words and labels never change the matrix width. Bump FEATURE_VERSION
+# when the layout or weights change; a saved index of another version is
+# rebuilt
+FEATURE_VERSION = 1
+FEATURE_BLOCKS = (
+    # (block, columns, share of the cosine similarity)
+    ('words', 128, 0.5),
+    ('emotions', 32, 0.25),
+    ('topics', 32, 0.25)
+)
+FEATURE_DIMS = sum(columns for _, columns, _ in FEATURE_BLOCKS)
+
+def database_source(database_url):
+    # Names the database an index was built from, without its credentials
+    return hashlib.sha1(database_url.encode('utf-8')).hexdigest()[:16]
+
+def index_path(source):
+    return SIMILARITY_INDEX_PATH or os.path.join(tempfile.gettempdir(), f"apnea-similarity-{source}.npz")
+
+def hashed_block(items, columns):
+    # [(term, weight)] -> L2-normalized vector of the given width. The sign
+    # comes from the hash too, so colliding terms tend to cancel out
+    block = np.zeros(columns, dtype=np.float32)
+    for term, weight in items:
+        code = zlib.crc32(term.encode('utf-8'))
+        block[code % columns] += weight if code & 0x80000000 else -weight
+    norm = np.linalg.norm(block)
+    return block / norm if norm else block
+
+def block_items(payload, block):
+    if block == 'words':
+        # Dampened counts, so a word repeated in every chorus doesn't drown
+        # the rest of the vocabulary
+        return [(word, 1 + math.log(count)) for word, count in payload.get('word_frequency') or [] if count > 0]
+    scores = compact_scores(block, payload.get(block))
+    if not isinstance(scores, dict) or 'labels' not in scores:
+        return []
+    return list(zip(scores['labels'], scores['scores']))
+
+def song_features(payload):
+    # Unit feature vector of an analysis payload (the /search response);
+    # None when it has nothing to compare. The dot product of two vectors is
+    # the weighted mean of the blocks' cosine similarities
+    blocks = [
+        hashed_block(block_items(payload, block), columns) * np.float32(math.sqrt(share))
+        for block, columns, share in FEATURE_BLOCKS
+    ]
+    vector = np.concatenate(blocks)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+class SimilarityIndex:
+    # Song ID -> feature vector, kept as rows of one float32 matrix. Rows are
+    # appended in place into spare capacity; a query is one matrix-vector
+    # product and a partial sort. The Spotify track ID of each song is kept
+    # to check the rows against the database
+    def __init__(self):
+        self._loading = threading.Lock()
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._ids = np.zeros(0, dtype=np.int64)
+            self._matrix = np.zeros((0, FEATURE_DIMS), dtype=np.float32)
+            self._count = 0
+            self._rows = {}  # song ID -> row
+            self._tracks = {}  # song ID -> Spotify track ID
+        self.synced_at = None  # newest analysis created_at seen
+        self.loaded_at = None
+
+    def add(self, song_id, vector, track_id=None):
+        with self._lock:
+            row = self._rows.get(song_id)
+            if row is None:
+                if self._count == len(self._ids):
+                    capacity = max(1024, 2 * len(self._ids))
+                    ids = np.zeros(capacity, dtype=np.int64)
+                    matrix = np.zeros((capacity, FEATURE_DIMS), dtype=np.float32)
+                    ids[:self._count] = self._ids[:self._count]
+                    matrix[:self._count] = self._matrix[:self._count]
+                    self._ids, self._matrix = ids, matrix
+                row = self._count
+                self._rows[song_id] = row
+                self._ids[row] = song_id
+                self._count += 1
+            self._matrix[row] = vector
+            self._tracks[song_id] = track_id
+
+    def remove(self, song_id):
+        # The last row is moved into the freed one
+        with self._lock:
+            row = self._rows.pop(song_id, None)
+            if row is None:
+                return
+            self._tracks.pop(song_id, None)
+            last = self._count - 1
+            if row != last:
+                moved = int(self._ids[last])
+                self._ids[row] = moved
+                self._matrix[row] = self._matrix[last]
+                self._rows[moved] = row
+            self._count = last
+
+    def mismatched(self, live):
+        # Songs whose ID now belongs to another track in live (song ID ->
+        # track ID): the index was built from another or a recreated database
+        with self._lock:
+            return [song_id for song_id, track_id in self._tracks.items() if song_id in live and live[song_id] != track_id]
+
+    def retain(self, live):
+        # Drops the songs that are gone from live or now another track;
+        # returns how many
+        with self._lock:
+            gone = [song_id for song_id, track_id in self._tracks.items() if live.get(song_id) != track_id]
+        for song_id in gone:
+            self.remove(song_id)
+        return len(gone)
+
+    def __contains__(self, song_id):
+        return song_id in self._rows
+
+    def __len__(self):
+        return self._count
+
+    def similar(self, song_id, limit=SIMILAR_LIMIT):
+        # [(song ID, cosine similarity)], most similar first; None for a song
+        # that isn't in the index
+        with self._lock:
+            row = self._rows.get(song_id)
+            if row is None:
+                return None
+            count = self._count
+            # Copied, since remove() moves rows in place
+            ids = self._ids[:count].copy()
+            scores = self._matrix[:count] @ self._matrix[row]
+        scores[row] = -np.inf
+        limit = min(limit, count - 1)
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def sync(self, rows):
+        # Adds (song ID, track ID, payload JSON dict, created_at) rows;
+        # returns how many had features
+        added = 0
+        for song_id, track_id, payload, created_at in rows:
+            vector = song_features(payload)
+            if vector is not None:
+                self.add(song_id, vector, track_id)
+                added += 1
+            if self.synced_at is None or created_at > self.synced_at:
+                self.synced_at = created_at
+        self.loaded_at = time.monotonic()
+        return added
+
+    def sync_from(self, load_rows, load_live, path=None, source=None, wait=True):
+        # load_rows(since) returns the rows of analyses stored after since
+        # (None: all of them), load_live() the song ID -> track ID of every
+        # song with an unexpired analysis. The first sync starts from the
+        # index saved at path by the same source database when there is one
+        # and it agrees with the database; every sync drops deleted songs
+        # and expired analyses. The index is saved again when it changed.
+        # One sync at a time; callers that don't wait skip it when one is
+        # running
+        if not self._loading.acquire(blocking=wait):
+            return
+        try:
+            if wait and self.loaded_at is not None:
+                return
+            if self.loaded_at is None and path and self.load(path, source):
+                conflicts = self.mismatched(load_live())
+                if conflicts:
+                    print(f"Similarity index {path} disagrees with the database on {len(conflicts)} songs, rebuilding")
+                    self.clear()
+            since = self.synced_at - SIMILARITY_SYNC_LOOKBACK if self.synced_at else None
+            added = self.sync(load_rows(since))
+            removed = self.retain(load_live())
+            if (added or removed) and path:
+                self.save(path, source)
+        finally:
+            self._loading.release()
+
+    def is_stale(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > SIMILARITY_SYNC_INTERVAL
+
+    def save(self, path, source=None):
+        with self._lock:
+            count = self._count
+            ids, matrix = self._ids[:count].copy(), self._matrix[:count].copy()
+            tracks = np.array([self._tracks.get(int(song_id)) or '' for song_id in ids], dtype=str)
+        # Written next to the target and renamed, so a reader never sees a
+        # partial file
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            np.savez(
+                f, ids=ids, matrix=matrix, tracks=tracks, version=np.array(FEATURE_VERSION),
+                source=np.array(source or ''),
+                synced_at=np.array(self.synced_at.isoformat() if self.synced_at else '')
+            )
+        os.replace(temporary, path)
+
+    def load(self, path, source=None):
+        # Replaces the index with the one saved at path; False when there is
+        # none, it was saved with another feature layout, or from another
+        # source database than the one given
+        try:
+            with np.load(path) as saved:
+                if int(saved['version']) != FEATURE_VERSION or saved['matrix'].shape[1:] != (FEATURE_DIMS,):
+                    return False
+                if 'tracks' not in saved.files or (source and str(saved['source']) != source):
+                    return False
+                ids, matrix, tracks, synced_at = saved['ids'], saved['matrix'], saved['tracks'], str(saved['synced_at'])
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Similarity index {path} unreadable: {str(e)}")
+            return False
+        with self._lock:
+            self._ids, self._matrix = ids, matrix
+            self._count = len(ids)
+            self._rows = {int(song_id): row for row, song_id in enumerate(ids)}
+            self._tracks = {int(song_id): str(track_id) or None for song_id, track_id in zip(ids, tracks)}
+        self.synced_at = datetime.fromisoformat(synced_at) if synced_at else None
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'songs': self._count,
+                'capacity': len(self._ids),
+                'megabytes': round(self._matrix.nbytes / 1e6, 2),
+                'synced_at': self.synced_at.isoformat() if self.synced_at else None,
+                'age_s': round(time.monotonic() - self.loaded_at, 1) if self.loaded_at is not None else None
+            }
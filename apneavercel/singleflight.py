@@ -0,0 +1,61 @@
+import threading
+
+from metrics import counting_upstream_calls
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.upstream_calls = 0
+
+class SingleFlight:
+    # Coalesces concurrent calls that share a key: the first caller runs the
+    # function and everyone arriving while it runs waits for and shares its
+    # result (or exception)
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'executions': 0, 'coalesced': 0, 'upstream_calls_saved': 0}
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._stats['executions'] += 1
+                is_leader = True
+            else:
+                self._stats['coalesced'] += 1
+                is_leader = False
+
+        if not is_leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError('Timed out waiting for an identical request')
+            # The upstream requests the leader actually sent (fewer on a
+            # stored lyrics hit, more on retries) were not sent again
+            with self._lock:
+                self._stats['upstream_calls_saved'] += call.upstream_calls
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        with counting_upstream_calls() as counter:
+            try:
+                call.result = fn()
+                return call.result
+            except Exception as e:
+                call.error = e
+                raise
+            finally:
+                call.upstream_calls = counter.count
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
@@ -0,0 +1,163 @@
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+SPOTIFY_TOKEN_URL = os.getenv('SPOTIFY_ACCOUNTS_URL', 'https://accounts.spotify.com/api').rstrip('/') + '/token'
+
+class FileTokenStore:
+    # Keeps the token in a local JSON file so warm instances on the same
+    # machine (or /tmp on Vercel) can reuse it
+    def __init__(self, path=None):
+        self.path = path or os.path.join(tempfile.gettempdir(), 'apnea_spotify_token.json')
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, token):
+        # Write to a temp file first so readers never see a partial token.
+        # The token is a bearer credential in a directory other local users
+        # can list, so mkstemp creates the file owner-only (0600) under a
+        # name nobody can set up beforehand, and the replace keeps that mode
+        directory, name = os.path.split(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{name}.", suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(token, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+class DatabaseTokenStore:
+    # Keeps the token in a row of the api_token table so every instance
+    # connected to the same database shares it
+    def __init__(self, db, model, name='spotify'):
+        self.db = db
+        self.model = model
+        self.name = name
+
+    def load(self):
+        row = self.db.session.get(self.model, self.name)
+        if not row:
+            return None
+        return {
+            'access_token': row.access_token,
+            'expires_at': row.expires_at.timestamp()
+        }
+
+    def save(self, token):
+        try:
+            self.db.session.merge(self.model(
+                name=self.name,
+                access_token=token['access_token'],
+                expires_at=datetime.fromtimestamp(token['expires_at'])
+            ))
+            self.db.session.commit()
+        except Exception:
+            self.db.session.rollback()
+            raise
+
+class SpotifyTokenManager:
+    def __init__(self, client_id, client_secret, store=None, session=None, refresh_margin=30):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.store = store
+        # Anything with a requests-style post(); defaults to plain requests
+        self.session = session or requests
+        # Seconds before expires_in at which a token is treated as expired
+        self.refresh_margin = refresh_margin
+
+        self._token = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'store_hits': 0, 'refreshes': 0, 'errors': 0}
+
+    def _is_fresh(self, token):
+        return bool(token) and token['expires_at'] - self.refresh_margin > time.time()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def get_token(self):
+        token = self._token
+        if self._is_fresh(token):
+            self._count('hits')
+            return token['access_token']
+
+        # Only one thread refreshes; the others wait here and pick up its token
+        with self._lock:
+            token = self._token
+            if self._is_fresh(token):
+                self._count('hits')
+                return token['access_token']
+
+            token = self._load_from_store()
+            if self._is_fresh(token):
+                self._token = token
+                self._count('store_hits')
+                return token['access_token']
+
+            token = self._fetch_token()
+            self._token = token
+            self._count('refreshes')
+            self._save_to_store(token)
+            return token['access_token']
+
+    def invalidate(self):
+        with self._lock:
+            self._token = None
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _fetch_token(self):
+        auth_string = f"{self.client_id}:{self.client_secret}"
+        auth_base64 = base64.b64encode(auth_string.encode("utf-8")).decode("utf-8")
+
+        headers = {
+            "Authorization": f"Basic {auth_base64}",
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
+        data = {"grant_type": "client_credentials"}
+
+        try:
+            response = self.session.post(SPOTIFY_TOKEN_URL, headers=headers, data=data)
+            response.raise_for_status()
+            payload = response.json()
+        except Exception:
+            self._count('errors')
+            raise
+
+        return {
+            'access_token': payload['access_token'],
+            'expires_at': time.time() + payload.get('expires_in', 3600)
+        }
+
+    def _load_from_store(self):
+        if not self.store:
+            return None
+        try:
+            return self.store.load()
+        except Exception as store_error:
+            print(f"Token store error: {str(store_error)}")
+            return None
+
+    def _save_to_store(self, token):
+        if not self.store:
+            return
+        try:
+            self.store.save(token)
+        except Exception as store_error:
+            print(f"Token store error: {str(store_error)}")
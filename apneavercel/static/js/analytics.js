@@ -11,29 +11,181 @@ function hideLoading() {
 }
 
 
+// Response fields the results page uses
+const SEARCH_FIELDS = 'track,lyrics,word_frequency,sentiment,emotions,topics';
+
+// Finished results are kept in IndexedDB, keyed by Spotify track id, so
+// searching a song again draws it without a request. Entries expire after
+// RESULT_CACHE_TTL_MS; past RESULT_CACHE_MAX_ENTRIES the least recently
+// shown ones are dropped. Bump RESULT_CACHE_VERSION when the cached shape
+// changes
+const RESULT_CACHE_DB = 'apnea-results';
+const RESULT_CACHE_VERSION = 1;
+const RESULT_CACHE_TTL_MS = 24 * 60 * 60 * 1000;
+const RESULT_CACHE_MAX_ENTRIES = 50;
+
+let resultCacheDb = null;
+
+function openResultCache() {
+    // Resolves to null where IndexedDB is unavailable (some private modes);
+    // searches then always go to the server
+    if (!resultCacheDb) {
+        resultCacheDb = new Promise(resolve => {
+            if (!window.indexedDB) {
+                resolve(null);
+                return;
+            }
+            const request = indexedDB.open(RESULT_CACHE_DB, RESULT_CACHE_VERSION);
+            request.onupgradeneeded = () => {
+                const db = request.result;
+                Array.from(db.objectStoreNames).forEach(name => db.deleteObjectStore(name));
+                // results: {trackId, data, savedAt, usedAt}; queries: {query, trackId}
+                db.createObjectStore('results', { keyPath: 'trackId' }).createIndex('usedAt', 'usedAt');
+                db.createObjectStore('queries', { keyPath: 'query' });
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => resolve(null);
+            request.onblocked = () => resolve(null);
+        });
+    }
+    return resultCacheDb;
+}
+
+function idbRequest(request) {
+    return new Promise((resolve, reject) => {
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function queryKey(query) {
+    return query.trim().toLowerCase().replace(/\s+/g, ' ');
+}
+
+function trackIdOf(data) {
+    // The payload has no track id field; it is the last part of the Spotify URL
+    return data.spotify_url ? data.spotify_url.split('/').pop() : null;
+}
+
+async function getCachedResult(trackId, query) {
+    try {
+        const db = await openResultCache();
+        if (!db) {
+            return null;
+        }
+        const tx = db.transaction(['results', 'queries'], 'readwrite');
+        if (!trackId) {
+            const alias = await idbRequest(tx.objectStore('queries').get(queryKey(query)));
+            trackId = alias && alias.trackId;
+        }
+        const entry = trackId && await idbRequest(tx.objectStore('results').get(trackId));
+        if (!entry) {
+            return null;
+        }
+        const now = Date.now();
+        if (now - entry.savedAt > RESULT_CACHE_TTL_MS) {
+            tx.objectStore('results').delete(trackId);
+            return null;
+        }
+        entry.usedAt = now;
+        tx.objectStore('results').put(entry);
+        return entry.data;
+    } catch (error) {
+        console.error('Result cache:', error);
+        return null;
+    }
+}
+
+async function cacheResult(query, data) {
+    const trackId = trackIdOf(data);
+    if (!trackId) {
+        return;
+    }
+    try {
+        const db = await openResultCache();
+        if (!db) {
+            return;
+        }
+        const tx = db.transaction(['results', 'queries'], 'readwrite');
+        const results = tx.objectStore('results');
+        const now = Date.now();
+        results.put({ trackId: trackId, data: data, savedAt: now, usedAt: now });
+        tx.objectStore('queries').put({ query: queryKey(query), trackId: trackId });
+
+        // Evict the least recently shown results past the limit. Query
+        // aliases are tiny and left behind; a lookup through one to an
+        // evicted result is a miss
+        const count = await idbRequest(results.count());
+        let excess = count - RESULT_CACHE_MAX_ENTRIES;
+        if (excess > 0) {
+            const cursors = results.index('usedAt').openCursor();
+            cursors.onsuccess = () => {
+                const cursor = cursors.result;
+                if (cursor && excess-- > 0) {
+                    cursor.delete();
+                    cursor.continue();
+                }
+            };
+        }
+    } catch (error) {
+        console.error('Result cache:', error);
+    }
+}
+
 async function searchSong() {
     showLoading();
     try {
-        const query = document.getElementById('searchInput').value;
+        const searchInput = document.getElementById('searchInput');
+        const query = searchInput.value;
         if (!query.trim()) {
             hideLoading();
             return;
         }
+        // A picked suggestion carries its Spotify track id
+        const trackId = searchInput.dataset.trackId;
 
-        const response = await fetch('/search', {
+        const cached = await getCachedResult(trackId, query);
+        if (cached) {
+            displayResults(cached);
+            return;
+        }
+
+        // Sections arrive one JSON line at a time as the server finishes them,
+        // with only what the page draws and the scores in compact form
+        const response = await fetch(`/search/stream?format=compact&fields=${SEARCH_FIELDS}`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ query: query })
+            body: JSON.stringify(trackId ? { track_id: trackId } : { query: query })
         });
 
-        const data = await response.json();
-        if (response.ok) {
-            displayResults(data);
-        } else {
+        if (!response.ok) {
+            const data = await response.json();
             console.error('Error:', data.error);
             displayError(data.error);
+            return;
+        }
+
+        // The sections are also collected into one result, cached only when
+        // every section came back
+        const result = {};
+        const labels = {};
+        let complete = false;
+        await readSearchStream(response, line => {
+            const chunk = withLabels(line, labels);
+            if (chunk.section === 'track' || chunk.section === 'lyrics') {
+                Object.assign(result, chunk.data);
+            } else if (chunk.section === 'done') {
+                // Sections answered by the local fallback are retried too
+                complete = !chunk.unavailable.length && !chunk.fallback.length;
+            } else if (chunk.section !== 'error') {
+                result[chunk.section] = chunk.data;
+            }
+            handleSearchChunk(chunk);
+        });
+        if (complete) {
+            await cacheResult(query, result);
         }
     } catch (error) {
         console.error('Error:', error);
@@ -43,6 +195,86 @@ async function searchSong() {
     }
 }
 
+async function readSearchStream(response, onChunk) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+
+        // Keep the trailing partial line until the rest of it arrives
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => onChunk(JSON.parse(line)));
+    }
+
+    if (buffer.trim()) {
+        onChunk(JSON.parse(buffer));
+    }
+}
+
+function withLabels(chunk, labels) {
+    // Compact scores come as bare arrays in the order of their model's label
+    // table, which is sent once, on the first line that needs it
+    Object.assign(labels, chunk.labels);
+    if (chunk.section in labels && Array.isArray(chunk.data)) {
+        return { ...chunk, data: { labels: labels[chunk.section], scores: chunk.data } };
+    }
+    return chunk;
+}
+
+function handleSearchChunk(chunk) {
+    switch (chunk.section) {
+        case 'track':
+            // First content is here; swap the spinner for the result layout
+            hideLoading();
+            displaySongHeader(chunk.data);
+            displayAnalyticsGrid();
+            break;
+        case 'lyrics':
+            displayLyrics(chunk.data.lyrics);
+            createWordCloud(chunk.data.word_frequency);
+            markSectionReady('wordCloud');
+            break;
+        case 'sentiment':
+            renderSection('sentimentChart', chunk.data, createSentimentChart);
+            break;
+        case 'emotions':
+            renderSection('emotionsChart', chunk.data, createEmotionsChart);
+            break;
+        case 'topics':
+            renderSection('topicsChart', chunk.data, createTopicsChart);
+            break;
+        case 'error':
+            console.error('Error:', chunk.error);
+            displayError(chunk.error);
+            break;
+    }
+}
+
+function renderSection(elementId, data, render) {
+    // Sections the server couldn't compute in time come back as null
+    if (data) {
+        render(data);
+        markSectionReady(elementId);
+    } else {
+        showSectionUnavailable(elementId);
+    }
+}
+
+function markSectionReady(elementId) {
+    const element = document.getElementById(elementId);
+    const pending = element && element.closest('.analytics-card').querySelector('.section-pending');
+    if (pending) {
+        pending.remove();
+    }
+}
+
 function displayError(message) {
     const resultsContainer = document.getElementById('results');
     if (!resultsContainer) {
@@ -50,6 +282,12 @@ function displayError(message) {
         return;
     }
 
+    // The charts are dropped along with their canvases; Chart.js would
+    // otherwise keep them (and their resize listeners) registered
+    resultsContainer.querySelectorAll('canvas').forEach(canvas => {
+        Chart.getChart(canvas)?.destroy();
+    });
+
     resultsContainer.style.display = 'block';
     resultsContainer.innerHTML = `
         <div class="error-message">
@@ -60,64 +298,117 @@ function displayError(message) {
 }
 
 function displayResults(data) {
-    // Clear previous results
+    displaySongHeader(data);
+    displayAnalyticsGrid();
+    displayLyrics(data.lyrics);
+
+    // Initialize charts after DOM elements are created
+    initializeCharts(data);
+}
+
+function getResultsContainer() {
     const resultsContainer = document.getElementById('results');
     if (!resultsContainer) {
         console.error('Results container not found');
-        return;
+        return null;
     }
 
     // Show results container
     resultsContainer.style.display = 'block';
 
-    // Create or update song info section
+    // Drop a previous error message before drawing new results
+    const errorMessage = resultsContainer.querySelector('.error-message');
+    if (errorMessage) {
+        errorMessage.remove();
+    }
+    return resultsContainer;
+}
+
+function displaySongHeader(data) {
+    const resultsContainer = getResultsContainer();
+    if (!resultsContainer) {
+        return;
+    }
+
+    // Built once; later songs only update its fields
     let songHeader = resultsContainer.querySelector('.song-header');
     if (!songHeader) {
         songHeader = document.createElement('div');
         songHeader.className = 'song-header';
+        songHeader.innerHTML = `
+            <div class="album-art">
+                <img id="albumArt" alt="Album Art">
+            </div>
+            <div class="song-info">
+                <h2 id="trackName"></h2>
+                <p id="artistName"></p>
+                <p id="albumName"></p>
+                <a id="spotifyLink" target="_blank" class="spotify-button">
+                    <i class="fab fa-spotify"></i> Listen on Spotify
+                </a>
+            </div>
+        `;
         resultsContainer.appendChild(songHeader);
     }
 
-    songHeader.innerHTML = `
-        <div class="album-art">
-            <img id="albumArt" src="${data.album_art || ''}" alt="Album Art">
-        </div>
-        <div class="song-info">
-            <h2 id="trackName">${data.track_name || ''}</h2>
-            <p id="artistName">${data.artist || ''}</p>
-            <p id="albumName">${data.album || ''}</p>
-            <a id="spotifyLink" href="${data.spotify_url || '#'}" target="_blank" class="spotify-button">
-                <i class="fab fa-spotify"></i> Listen on Spotify
-            </a>
-        </div>
-    `;
+    songHeader.querySelector('#albumArt').src = data.album_art || '';
+    songHeader.querySelector('#trackName').textContent = data.track_name || '';
+    songHeader.querySelector('#artistName').textContent = data.artist || '';
+    songHeader.querySelector('#albumName').textContent = data.album || '';
+    songHeader.querySelector('#spotifyLink').href = data.spotify_url || '#';
+}
+
+function displayAnalyticsGrid() {
+    const resultsContainer = getResultsContainer();
+    if (!resultsContainer) {
+        return;
+    }
 
-    // Create or update analytics section
+    // Built once and kept, so the charts on its canvases can be updated in
+    // place for the next song; only the cards' status messages are reset
     let analyticsGrid = resultsContainer.querySelector('.analytics-grid');
-    if (!analyticsGrid) {
+    if (analyticsGrid) {
+        analyticsGrid.querySelectorAll('.analytics-card').forEach(resetAnalyticsCard);
+    } else {
         analyticsGrid = document.createElement('div');
         analyticsGrid.className = 'analytics-grid';
         resultsContainer.appendChild(analyticsGrid);
+        analyticsGrid.innerHTML = `
+            <div class="analytics-card">
+                <h3>Sentiment Analysis</h3>
+                <p class="section-pending">Analyzing...</p>
+                <canvas id="sentimentChart"></canvas>
+            </div>
+            <div class="analytics-card">
+                <h3>Emotional Analysis</h3>
+                <p class="section-pending">Analyzing...</p>
+                <canvas id="emotionsChart"></canvas>
+            </div>
+            <div class="analytics-card">
+                <h3>Topic Analysis</h3>
+                <p class="section-pending">Analyzing...</p>
+                <canvas id="topicsChart"></canvas>
+            </div>
+            <div class="analytics-card">
+                <h3>Word Frequency</h3>
+                <p class="section-pending">Analyzing...</p>
+                <div id="wordCloud"></div>
+            </div>
+        `;
     }
 
-    analyticsGrid.innerHTML = `
-        <div class="analytics-card">
-            <h3>Sentiment Analysis</h3>
-            <canvas id="sentimentChart"></canvas>
-        </div>
-        <div class="analytics-card">
-            <h3>Emotional Analysis</h3>
-            <canvas id="emotionsChart"></canvas>
-        </div>
-        <div class="analytics-card">
-            <h3>Topic Analysis</h3>
-            <canvas id="topicsChart"></canvas>
-        </div>
-        <div class="analytics-card">
-            <h3>Word Frequency</h3>
-            <div id="wordCloud"></div>
-        </div>
-    `;
+    // Lyrics follow the charts; clear the previous song's until they arrive
+    const lyricsSection = resultsContainer.querySelector('.lyrics-section');
+    if (lyricsSection) {
+        lyricsSection.remove();
+    }
+}
+
+function displayLyrics(lyrics) {
+    const resultsContainer = getResultsContainer();
+    if (!resultsContainer) {
+        return;
+    }
 
     // Create or update lyrics section
     let lyricsSection = resultsContainer.querySelector('.lyrics-section');
@@ -129,53 +420,79 @@ function displayResults(data) {
 
     lyricsSection.innerHTML = `
         <h3>Lyrics</h3>
-        <div id="lyrics" class="lyrics-content">${data.lyrics.replace(/\n/g, '<br>')}</div>
+        <div id="lyrics" class="lyrics-content">${lyrics.replace(/\n/g, '<br>')}</div>
     `;
-
-    // Initialize charts after DOM elements are created
-    initializeCharts(data);
 }
 
 function initializeCharts(data) {
-    // Clear previous charts
-    const chartIds = ['sentimentChart', 'emotionsChart', 'topicsChart'];
-    chartIds.forEach(id => {
-        const canvas = document.getElementById(id);
-        if (canvas) {
-            canvas.getContext('2d').clearRect(0, 0, canvas.width, canvas.height);
-        }
-    });
-
-    createSentimentChart(data.sentiment);
-    createEmotionsChart(data.emotions);
-    createTopicsChart(data.topics);
+    renderSection('sentimentChart', data.sentiment, createSentimentChart);
+    renderSection('emotionsChart', data.emotions, createEmotionsChart);
+    renderSection('topicsChart', data.topics, createTopicsChart);
     createWordCloud(data.word_frequency);
+    markSectionReady('wordCloud');
 }
 
-function createSentimentChart(sentimentData) {
-    const ctx = document.getElementById('sentimentChart').getContext('2d');
-    
-    // Clear existing chart if it exists
-    if (window.sentimentChart instanceof Chart) {
-        window.sentimentChart.destroy();
+function resetAnalyticsCard(card) {
+    // Back to "Analyzing..." with the chart hidden behind it unchanged until
+    // the next song's data replaces it
+    const unavailable = card.querySelector('.section-unavailable');
+    if (unavailable) {
+        unavailable.remove();
     }
-    
-    // Extract scores and labels from the sentiment data
-    const data = sentimentData[0];  // Get first array element
-    const scores = data.map(item => item.score);
-    const labels = data.map(item => {
+    card.querySelector('canvas, #wordCloud').style.display = '';
+    if (!card.querySelector('.section-pending')) {
+        const pending = document.createElement('p');
+        pending.className = 'section-pending';
+        pending.textContent = 'Analyzing...';
+        card.querySelector('h3').after(pending);
+    }
+}
+
+function showSectionUnavailable(elementId) {
+    const element = document.getElementById(elementId);
+    if (!element) {
+        return;
+    }
+    markSectionReady(elementId);
+
+    // Hidden rather than removed, so its chart can be reused for the next song
+    const message = document.createElement('p');
+    message.className = 'section-unavailable';
+    message.textContent = 'This analysis is currently unavailable. Please try again later.';
+    element.style.display = 'none';
+    element.before(message);
+}
+
+function drawChart(elementId, labels, values, config) {
+    // The chart on this canvas gets the new labels and values and animates
+    // to them; it is only built (from config()) the first time
+    const canvas = document.getElementById(elementId);
+    const chart = Chart.getChart(canvas);
+    if (chart) {
+        chart.data.labels = labels;
+        chart.data.datasets[0].data = values;
+        chart.update();
+        return;
+    }
+    new Chart(canvas, config(labels, values));
+}
+
+function createSentimentChart(sentimentData) {
+    // Compact scores come in label order, 1 star to 5 stars
+    const scores = sentimentData.scores;
+    const labels = sentimentData.labels.map(label => {
         // Convert "X stars" to sentiment labels
-        switch(item.label) {
+        switch(label) {
             case '1 star': return 'Very Negative';
             case '2 stars': return 'Negative';
             case '3 stars': return 'Neutral';
             case '4 stars': return 'Positive';
             case '5 stars': return 'Very Positive';
-            default: return item.label;
+            default: return label;
         }
     });
     
-    window.sentimentChart = new Chart(ctx, {
+    drawChart('sentimentChart', labels, scores, (labels, scores) => ({
         type: 'doughnut',
         data: {
             labels: labels,
@@ -206,23 +523,15 @@ function createSentimentChart(sentimentData) {
                 }
             }
         }
-    });
+    }));
 }
 
 function createEmotionsChart(emotionsData) {
-    const ctx = document.getElementById('emotionsChart').getContext('2d');
-    
-    // Clear existing chart if it exists
-    if (window.emotionsChart instanceof Chart) {
-        window.emotionsChart.destroy();
-    }
-
-    // Extract data from the emotions array
-    const data = emotionsData[0];  // Get first array element
-    const labels = data.map(item => item.label.charAt(0).toUpperCase() + item.label.slice(1));
-    const values = data.map(item => item.score);
+    // Compact scores keep the emotions in the same order for every song
+    const labels = emotionsData.labels.map(label => label.charAt(0).toUpperCase() + label.slice(1));
+    const values = emotionsData.scores;
 
-    window.emotionsChart = new Chart(ctx, {
+    drawChart('emotionsChart', labels, values, (labels, values) => ({
         type: 'radar',
         data: {
             labels: labels,
@@ -260,25 +569,15 @@ function createEmotionsChart(emotionsData) {
                 }
             }
         }
-    });
+    }));
 }
 
 function createTopicsChart(topicsData) {
-    const ctx = document.getElementById('topicsChart').getContext('2d');
-    
-    // Clear existing chart if it exists
-    if (window.topicsChart instanceof Chart) {
-        window.topicsChart.destroy();
-    }
-
     // Sort topics by score in descending order
-    const scores = topicsData.scores;
-    const labels = topicsData.labels;
-    
     // Create array of objects for sorting
-    const combined = labels.map((label, i) => ({
+    const combined = topicsData.labels.map((label, i) => ({
         label: label.replace(/_/g, ' '),
-        score: scores[i]
+        score: topicsData.scores[i]
     }));
     
     // Sort by score
@@ -287,13 +586,16 @@ function createTopicsChart(topicsData) {
     // Take top 5 topics
     const topTopics = combined.slice(0, 5);
 
-    window.topicsChart = new Chart(ctx, {
+    const labels = topTopics.map(item => item.label.charAt(0).toUpperCase() + item.label.slice(1));
+    const values = topTopics.map(item => item.score);
+
+    drawChart('topicsChart', labels, values, (labels, values) => ({
         type: 'bar',
         data: {
-            labels: topTopics.map(item => item.label.charAt(0).toUpperCase() + item.label.slice(1)),
+            labels: labels,
             datasets: [{
                 label: 'Topic Relevance',
-                data: topTopics.map(item => item.score),
+                data: values,
                 backgroundColor: 'rgba(29, 185, 84, 0.7)',
                 borderColor: 'rgba(29, 185, 84, 1)',
                 borderWidth: 1
@@ -335,13 +637,22 @@ function createTopicsChart(topicsData) {
                 }
             }
         }
-    });
+    }));
 }
 
 function createWordCloud(wordFrequency) {
-    const width = document.getElementById('wordCloud').offsetWidth;
+    const wordCloud = document.getElementById('wordCloud');
+    const width = wordCloud.offsetWidth;
     const height = 300;
 
+    // The layout is the slow part on a phone; a song shown again (e.g. from
+    // the result cache) keeps the cloud already drawn for it
+    const words = JSON.stringify(wordFrequency);
+    if (wordCloud.dataset.words === words && wordCloud.querySelector('svg')) {
+        return;
+    }
+    wordCloud.dataset.words = words;
+
     // Clear previous word cloud
     d3.select("#wordCloud").html("");
 
@@ -9,13 +9,129 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
-    // Add search on enter key
-    document.getElementById('searchInput').addEventListener('keypress', function(e) {
-        if (e.key === 'Enter') {
-            searchSong();
+    // Search suggestions: asked for once typing pauses, answered from the
+    // server's in-memory index, and kept per query so backspacing is instant
+    const searchInput = document.getElementById('searchInput');
+    const suggestionList = document.getElementById('suggestions');
+    const suggestionCache = new Map();
+    let suggestions = [];
+    let activeSuggestion = -1;
+    let suggestTimer = null;
+    let suggestController = null;
+
+    function renderSuggestions(items) {
+        suggestions = items;
+        activeSuggestion = -1;
+        suggestionList.innerHTML = '';
+        items.forEach((item, i) => {
+            const li = document.createElement('li');
+            li.setAttribute('role', 'option');
+            if (item.album_art) {
+                const img = document.createElement('img');
+                img.src = item.album_art;
+                img.alt = '';
+                img.loading = 'lazy';
+                li.appendChild(img);
+            }
+            const text = document.createElement('div');
+            const name = document.createElement('div');
+            name.textContent = item.track_name;
+            const artist = document.createElement('div');
+            artist.className = 'suggestion-artist';
+            artist.textContent = item.artist;
+            text.append(name, artist);
+            li.appendChild(text);
+            // mousedown fires before the input's blur hides the list
+            li.addEventListener('mousedown', e => {
+                e.preventDefault();
+                pickSuggestion(i);
+            });
+            suggestionList.appendChild(li);
+        });
+    }
+
+    function highlightSuggestion(i) {
+        const items = suggestionList.children;
+        if (activeSuggestion >= 0 && items[activeSuggestion]) {
+            items[activeSuggestion].classList.remove('active');
+        }
+        activeSuggestion = i;
+        if (i >= 0 && items[i]) {
+            items[i].classList.add('active');
+        }
+    }
+
+    function pickSuggestion(i) {
+        const item = suggestions[i];
+        searchInput.value = `${item.track_name} ${item.artist}`;
+        // searchSong() sends the track id, skipping the Spotify search
+        searchInput.dataset.trackId = item.track_id;
+        renderSuggestions([]);
+        searchSong();
+    }
+
+    async function fetchSuggestions(query) {
+        const key = query.trim().toLowerCase();
+        if (suggestionCache.has(key)) {
+            renderSuggestions(suggestionCache.get(key));
+            return;
+        }
+        if (suggestController) {
+            suggestController.abort();
         }
+        suggestController = new AbortController();
+        try {
+            const response = await fetch(`/api/suggest?q=${encodeURIComponent(query)}`, {
+                signal: suggestController.signal
+            });
+            if (!response.ok) {
+                return;
+            }
+            const items = await response.json();
+            suggestionCache.set(key, items);
+            if (searchInput.value.trim().toLowerCase() === key) {
+                renderSuggestions(items);
+            }
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                console.error('Error:', error);
+            }
+        }
+    }
+
+    searchInput.addEventListener('input', function() {
+        delete searchInput.dataset.trackId;
+        clearTimeout(suggestTimer);
+        const query = searchInput.value;
+        if (!query.trim()) {
+            renderSuggestions([]);
+            return;
+        }
+        suggestTimer = setTimeout(() => fetchSuggestions(query), 150);
     });
 
+    searchInput.addEventListener('keydown', function(e) {
+        if (e.key === 'ArrowDown' && suggestions.length) {
+            e.preventDefault();
+            highlightSuggestion((activeSuggestion + 1) % suggestions.length);
+        } else if (e.key === 'ArrowUp' && suggestions.length) {
+            e.preventDefault();
+            highlightSuggestion(activeSuggestion <= 0 ? suggestions.length - 1 : activeSuggestion - 1);
+        } else if (e.key === 'Escape') {
+            renderSuggestions([]);
+        } else if (e.key === 'Enter') {
+            clearTimeout(suggestTimer);
+            if (activeSuggestion >= 0) {
+                pickSuggestion(activeSuggestion);
+            } else {
+                renderSuggestions([]);
+                searchSong();
+            }
+        }
+    });
+
+    searchInput.addEventListener('blur', () => renderSuggestions([]));
+
     function showLoading() {
         console.log('Loading started'); // Debugging log
         document.getElementById('loadingOverlay').style.display = 'block';
@@ -0,0 +1,171 @@
+import heapq
+import os
+import re
+import threading
+import time
+
+from search_tracking import track_id_from_url
+
+# Suggestions returned per query
+SUGGEST_LIMIT = 8
+# Seconds before the index is reloaded from the song table in the background,
+# picking up songs other instances recorded
+SUGGEST_RELOAD_INTERVAL = float(os.getenv('SUGGEST_RELOAD_INTERVAL', '600'))
+# Candidate sets up to this size are checked and ranked directly; larger ones
+# (short or common words) are matched by walking the songs most searched first
+SUGGEST_SCAN_THRESHOLD = 512
+
+NON_WORD_PATTERN = re.compile(r'[^\w]+')
+
+def normalize(text):
+    return NON_WORD_PATTERN.sub(' ', text.lower()).strip()
+
+def trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+class SuggestIndex:
+    # In-memory index over track_name and artist of every known song. Query
+    # words of 3+ characters are looked up by trigram, shorter ones by word
+    # prefix; the candidates are then checked so every query word starts a
+    # word of the song, and ranked by search_count
+    def __init__(self):
+        self._songs = {}       # (track_name, artist) -> song dict
+        self._words = {}       # (track_name, artist) -> words of name and artist
+        self._by_trigram = {}  # trigram -> identities
+        self._by_prefix = {}   # first 1-2 characters of a word -> identities
+        self._by_track_id = {}
+        self._ranked = []      # identities, most searched first as of the last load
+        self._lock = threading.Lock()
+        self._loading = threading.Lock()
+        self.loaded_at = None
+
+    def _add(self, identity, song):
+        self._songs[identity] = song
+        words = normalize(f"{song['track_name']} {song['artist']}").split()
+        self._words[identity] = words
+        for word in words:
+            for gram in trigrams(word):
+                self._by_trigram.setdefault(gram, set()).add(identity)
+            for length in (1, 2):
+                self._by_prefix.setdefault(word[:length], set()).add(identity)
+        if song['track_id']:
+            self._by_track_id[song['track_id']] = identity
+
+    def load(self, rows):
+        # Rebuilds the index from (track_name, artist, album, spotify_url,
+        # album_art, search_count) rows and swaps it in
+        fresh = SuggestIndex()
+        for track_name, artist, album, spotify_url, album_art, search_count in rows:
+            fresh._add((track_name, artist), {
+                'track_name': track_name, 'artist': artist, 'album': album,
+                'spotify_url': spotify_url, 'album_art': album_art,
+                'track_id': track_id_from_url(spotify_url), 'search_count': search_count or 0
+            })
+        fresh._ranked = sorted(fresh._songs, key=lambda identity: fresh._songs[identity]['search_count'], reverse=True)
+        with self._lock:
+            self._songs, self._words = fresh._songs, fresh._words
+            self._by_trigram, self._by_prefix, self._by_track_id = fresh._by_trigram, fresh._by_prefix, fresh._by_track_id
+            self._ranked = fresh._ranked
+            self.loaded_at = time.monotonic()
+
+    def load_from(self, load_rows, wait=True):
+        # One load at a time; callers that don't wait skip it when one is running
+        if not self._loading.acquire(blocking=wait):
+            return
+        try:
+            if wait and self.loaded_at is not None:
+                return
+            self.load(load_rows())
+        finally:
+            self._loading.release()
+
+    def is_stale(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > SUGGEST_RELOAD_INTERVAL
+
+    def record(self, row):
+        # A search recorded through search_tracking.song_row()
+        identity = (row['track_name'], row['artist'])
+        with self._lock:
+            song = self._songs.get(identity)
+            if song is not None:
+                song['search_count'] += row['search_count']
+                return
+            self._add(identity, {
+                'track_name': row['track_name'], 'artist': row['artist'], 'album': row['album'],
+                'spotify_url': row['spotify_url'], 'album_art': row['album_art'],
+                'track_id': track_id_from_url(row['spotify_url']), 'search_count': row['search_count']
+            })
+            self._ranked.append(identity)
+
+    def suggest(self, query, limit=SUGGEST_LIMIT):
+        tokens = normalize(query).split()
+        if not tokens:
+            return []
+        with self._lock:
+            keys = []
+            for token in tokens:
+                if len(token) >= 3:
+                    keys.extend(self._by_trigram.get(gram, frozenset()) for gram in trigrams(token))
+                else:
+                    keys.append(self._by_prefix.get(token, frozenset()))
+            keys.sort(key=len)
+            if not keys[0]:
+                return []
+
+            def matches(identity):
+                words = self._words[identity]
+                return all(any(word.startswith(token) for word in words) for token in tokens)
+
+            def scan(identities, candidates=None):
+                top = []
+                for identity in identities:
+                    if (candidates is None or identity in candidates) and matches(identity):
+                        top.append(identity)
+                        if len(top) == limit:
+                            break
+                return top
+
+            top = None
+            if len(keys[0]) > SUGGEST_SCAN_THRESHOLD:
+                # Only short or common words: the most searched songs usually
+                # match, so try them before intersecting large sets
+                top = scan(self._ranked[:SUGGEST_SCAN_THRESHOLD])
+            if top is None or len(top) < limit:
+                # Smallest sets first; once the candidates are few the word
+                # check is cheaper than intersecting the rest
+                candidates = keys[0]
+                for key in keys[1:]:
+                    if len(candidates) <= SUGGEST_SCAN_THRESHOLD:
+                        break
+                    candidates = candidates & key
+                if len(candidates) > SUGGEST_SCAN_THRESHOLD:
+                    top = scan(self._ranked, candidates)
+                else:
+                    top = heapq.nlargest(limit, filter(matches, candidates), key=lambda identity: self._songs[identity]['search_count'])
+            # Counts recorded since the last load can reorder the top songs
+            top.sort(key=lambda identity: self._songs[identity]['search_count'], reverse=True)
+            return [dict(self._songs[identity]) for identity in top]
+
+    def track(self, track_id):
+        # A Spotify-shaped track object for a known song, so a picked
+        # suggestion is analyzed without any Spotify request
+        with self._lock:
+            identity = self._by_track_id.get(track_id)
+            song = dict(self._songs[identity]) if identity else None
+        if song is None:
+            return None
+        return {
+            'id': track_id,
+            'name': song['track_name'],
+            'artists': [{'name': song['artist']}],
+            'album': {'name': song['album'], 'images': [{'url': song['album_art']}] if song['album_art'] else []},
+            'external_urls': {'spotify': song['spotify_url']}
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'songs': len(self._songs),
+                'trigrams': len(self._by_trigram),
+                'age_s': round(time.monotonic() - self.loaded_at, 1) if self.loaded_at is not None else None
+            }
@@ -0,0 +1,110 @@
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, desc, func
+
+from search_tracking import UPSERT_INSERTS, hour_start
+
+# Exact windows over the hourly buckets, plus an exponentially decayed score
+WINDOWS = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30)
+}
+DECAYED_WINDOW = 'decayed'
+TRENDING_WINDOWS = tuple(WINDOWS) + (DECAYED_WINDOW,)
+
+# Hours after which a search counts half as much in the decayed score, and
+# how far back the decayed score looks
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', '24'))
+TRENDING_DECAY_HORIZON_HOURS = int(os.getenv('TRENDING_DECAY_HORIZON_HOURS', '168'))
+
+# Hourly buckets older than this are rolled up into daily ones; keep it past
+# the longest window so every window stays exact to the hour
+BUCKET_COMPACT_AFTER_DAYS = int(os.getenv('BUCKET_COMPACT_AFTER_DAYS', '35'))
+# Daily buckets older than this are deleted
+BUCKET_RETENTION_DAYS = int(os.getenv('BUCKET_RETENTION_DAYS', '365'))
+
+def decay_weight(bucket_start, now):
+    # Weight of a bucket by the age of its midpoint
+    age_hours = (now - bucket_start).total_seconds() / 3600 - 0.5
+    return 0.5 ** (max(age_hours, 0) / TRENDING_HALF_LIFE_HOURS)
+
+def trending_scores(session, bucket_model, window, limit, now=None):
+    # Top (song_id, score) pairs computed inside the database, so only
+    # `limit` aggregate rows come back
+    now = now or datetime.utcnow()
+    current_hour = hour_start(now)
+
+    if window == DECAYED_WINDOW:
+        since = current_hour - timedelta(hours=TRENDING_DECAY_HORIZON_HOURS - 1)
+        # One CASE branch per hour of the horizon keeps the decay exact at
+        # bucket resolution without needing exp()/pow() in SQL
+        weight = case(
+            *[
+                (bucket_model.bucket_start >= current_hour - timedelta(hours=hours),
+                 decay_weight(current_hour - timedelta(hours=hours), now))
+                for hours in range(TRENDING_DECAY_HORIZON_HOURS)
+            ],
+            else_=0.0
+        )
+        score = func.sum(bucket_model.search_count * weight)
+    else:
+        since = current_hour - WINDOWS[window] + timedelta(hours=1)
+        score = func.sum(bucket_model.search_count)
+
+    return session.query(bucket_model.song_id, score.label('score'))\
+        .filter(bucket_model.bucket_start >= since)\
+        .group_by(bucket_model.song_id)\
+        .order_by(desc('score'))\
+        .limit(limit)\
+        .all()
+
+def compute_trending(session, song_model, bucket_model, window, limit, now=None):
+    scores = trending_scores(session, bucket_model, window, limit, now)
+    songs = {song.id: song for song in session.query(song_model).filter(song_model.id.in_([s for s, _ in scores]))}
+    trending = []
+    for song_id, score in scores:
+        if song_id not in songs:
+            continue
+        song = songs[song_id].to_dict()
+        song['window'] = window
+        song['score'] = round(float(score), 3) if window == DECAYED_WINDOW else int(score)
+        trending.append(song)
+    return trending
+
+def compact_buckets(session, bucket_model, now=None):
+    # Roll hourly buckets older than BUCKET_COMPACT_AFTER_DAYS into one
+    # bucket per song and day, and drop buckets past the retention period
+    now = now or datetime.utcnow()
+    compact_before = (now - timedelta(days=BUCKET_COMPACT_AFTER_DAYS)).replace(hour=0, minute=0, second=0, microsecond=0)
+    retain_after = now - timedelta(days=BUCKET_RETENTION_DAYS)
+
+    hourly = session.query(bucket_model.song_id, bucket_model.bucket_start, bucket_model.search_count)\
+        .filter(bucket_model.bucket_hours == 1, bucket_model.bucket_start < compact_before)\
+        .all()
+    daily = defaultdict(int)
+    for song_id, bucket_start, search_count in hourly:
+        daily[(song_id, bucket_start.replace(hour=0))] += search_count
+
+    session.query(bucket_model)\
+        .filter(bucket_model.bucket_hours == 1, bucket_model.bucket_start < compact_before)\
+        .delete(synchronize_session=False)
+    if daily:
+        insert = UPSERT_INSERTS[session.get_bind().dialect.name]
+        stmt = insert(bucket_model).values([
+            {'song_id': song_id, 'bucket_start': day, 'bucket_hours': 24, 'search_count': count}
+            for (song_id, day), count in daily.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['song_id', 'bucket_start'],
+            set_={'search_count': bucket_model.search_count + stmt.excluded.search_count, 'bucket_hours': 24}
+        )
+        session.execute(stmt)
+
+    expired = session.query(bucket_model)\
+        .filter(bucket_model.bucket_start < retain_after)\
+        .delete(synchronize_session=False)
+    session.commit()
+    return {'hourly_compacted': len(hourly), 'daily_written': len(daily), 'expired_deleted': expired}
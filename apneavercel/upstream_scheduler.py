@@ -0,0 +1,244 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# Statuses that carry a "come back later" hint instead of an error
+THROTTLE_STATUSES = (429, 503)
+# Seconds to back off after a 429 without a Retry-After header
+DEFAULT_RETRY_AFTER = 1.0
+
+# time.monotonic() by which the enrichment call making a request gives up
+# on it (set by enrichment.iter_enrichments). Waits and HTTP timeouts are
+# cut to it, so an abandoned call frees its worker thread
+call_deadline = contextvars.ContextVar('call_deadline', default=None)
+
+class UpstreamUnavailable(requests.exceptions.RequestException):
+    # The upstream's circuit is open or a request couldn't be scheduled
+    # within its max wait; retry_after is a hint in seconds
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    # `rate` requests per second with bursts of up to `burst`. Tokens go
+    # negative as callers reserve future slots, which queues them in order
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, now):
+        # Monotonic time at which the reserved token is available
+        with self._lock:
+            if now > self.updated:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+            self.tokens -= 1
+            return now if self.tokens >= 0 else self.updated - self.tokens / self.rate
+
+    def refund(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+class CircuitBreaker:
+    # Opens after `failures` consecutive failures; after `reset_timeout`
+    # seconds one trial request is let through (half open) and its outcome
+    # closes or re-opens the circuit
+    def __init__(self, failures=5, reset_timeout=30):
+        self.failure_threshold = failures
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == 'closed':
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == 'open' and remaining > 0:
+                raise UpstreamUnavailable('circuit open', retry_after=remaining)
+            if self._trial_running:
+                raise UpstreamUnavailable('circuit half open, trial request running', retry_after=1)
+            self.state = 'half_open'
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+def retry_after_seconds(response):
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+def loading_seconds(response):
+    # Hugging Face answers 503 {"error": "...loading", "estimated_time": 20.0}
+    # while a model is being loaded
+    if response.status_code != 503:
+        return None
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    if isinstance(body, dict) and 'estimated_time' in body:
+        return float(body['estimated_time'])
+    return None
+
+class UpstreamScheduler:
+    # Admission control for one upstream: a token bucket sized to its quota,
+    # pauses from Retry-After / estimated_time hints, and a circuit breaker.
+    # Callers wait in line instead of failing, for up to max_wait seconds
+    def __init__(self, name, rate=0, burst=1, max_wait=10, max_retries=2,
+                 breaker_failures=5, breaker_reset=30):
+        self.name = name
+        self.bucket = TokenBucket(rate, max(burst, 1)) if rate > 0 else None
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        # '' pauses the whole upstream (Retry-After); other keys pause one
+        # path, e.g. a Hugging Face model that is loading
+        self._paused_until = {}
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=1000)
+        self._stats = {
+            'requests': 0, 'queued': 0, 'queue_depth': 0, 'max_queue_depth': 0,
+            'wait_ms_total': 0.0, 'wait_ms_max': 0.0, 'throttled': 0, 'retries': 0, 'rejected': 0
+        }
+
+    @classmethod
+    def from_env(cls, prefix, rate, burst, max_wait, breaker_failures=5, breaker_reset=30):
+        # <PREFIX>_RATE_PER_SEC, _BURST, _MAX_WAIT, _BREAKER_FAILURES, _BREAKER_RESET
+        return cls(
+            prefix.lower(),
+            rate=float(os.getenv(f'{prefix}_RATE_PER_SEC', str(rate))),
+            burst=int(os.getenv(f'{prefix}_BURST', str(burst))),
+            max_wait=float(os.getenv(f'{prefix}_MAX_WAIT', str(max_wait))),
+            breaker_failures=int(os.getenv(f'{prefix}_BREAKER_FAILURES', str(breaker_failures))),
+            breaker_reset=float(os.getenv(f'{prefix}_BREAKER_RESET', str(breaker_reset)))
+        )
+
+    def pause(self, seconds, key=''):
+        until = time.monotonic() + seconds
+        with self._lock:
+            self._paused_until[key] = max(self._paused_until.get(key, 0), until)
+
+    def _acquire(self, key, deadline):
+        # Waits for any pause on the upstream or key, then for a token
+        start = time.monotonic()
+        with self._lock:
+            paused_until = max(self._paused_until.get('', 0), self._paused_until.get(key, 0))
+        ready_at = max(paused_until, start)
+        if self.bucket:
+            ready_at = self.bucket.reserve(ready_at)
+        if ready_at > deadline:
+            if self.bucket:
+                self.bucket.refund()
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise UpstreamUnavailable(f'{self.name} is rate limited', retry_after=ready_at - start)
+
+        wait = ready_at - start
+        if wait > 0:
+            with self._lock:
+                self._stats['queued'] += 1
+                self._stats['queue_depth'] += 1
+                self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._stats['queue_depth'])
+            try:
+                time.sleep(wait)
+            finally:
+                with self._lock:
+                    self._stats['queue_depth'] -= 1
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['wait_ms_total'] += wait * 1000
+            self._stats['wait_ms_max'] = max(self._stats['wait_ms_max'], wait * 1000)
+            self._waits.append(wait * 1000)
+
+    def call(self, send, key=''):
+        deadline = time.monotonic() + self.max_wait
+        if call_deadline.get() is not None:
+            deadline = min(deadline, call_deadline.get())
+        attempt = 0
+        while True:
+            self._acquire(key, deadline)
+            try:
+                self.breaker.before_call()
+            except UpstreamUnavailable:
+                if self.bucket:
+                    self.bucket.refund()
+                raise
+            try:
+                response = send()
+            except requests.exceptions.RequestException:
+                self.breaker.record_failure()
+                raise
+
+            if response.status_code in THROTTLE_STATUSES:
+                loading = loading_seconds(response)
+                delay = loading if loading is not None else retry_after_seconds(response)
+                if delay is None and response.status_code == 429:
+                    delay = DEFAULT_RETRY_AFTER
+                if delay is not None:
+                    # Not a failure: the upstream told us when to come back
+                    self.breaker.record_success()
+                    with self._lock:
+                        self._stats['throttled'] += 1
+                    self.pause(delay, key if loading is not None else '')
+                    if attempt < self.max_retries and time.monotonic() + delay <= deadline:
+                        attempt += 1
+                        with self._lock:
+                            self._stats['retries'] += 1
+                        response.close()
+                        continue
+                    return response
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return response
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            waits = sorted(self._waits)
+            paused_for = max(self._paused_until.values(), default=0) - time.monotonic()
+        stats['wait_ms_total'] = round(stats['wait_ms_total'], 1)
+        stats['wait_ms_max'] = round(stats['wait_ms_max'], 1)
+        stats['wait_ms_mean'] = round(stats['wait_ms_total'] / stats['requests'], 1) if stats['requests'] else 0
+        stats['wait_ms_p95'] = round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1) if waits else 0
+        stats['paused_for_s'] = round(max(paused_for, 0), 1)
+        stats['circuit'] = self.breaker.state
+        stats['circuit_opened'] = self.breaker.times_opened
+        return stats
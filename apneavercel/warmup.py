@@ -0,0 +1,122 @@
+import json
+import os
+import time
+from concurrent.futures import as_completed, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+
+from analysis import (
+    SENTIMENT_MODEL, EMOTIONS_MODEL, SUMMARY_MODEL, TOPICS_MODEL,
+    analyze_sentiment, analyze_emotions, analyze_topics, get_combined_summary,
+    analysis_version
+)
+from analyzers import ANALYZER_BACKEND
+from batch import executor
+from clients import get_spotify_tracks
+from enrichment import iter_enrichments
+from models import db, Song, SongSearchBucket, AnalysisResult, WarmupRun
+from search import LyricsNotFound, analysis_flight, analyze_and_store
+from search_tracking import track_id_from_url
+from trending import compute_trending
+
+# Trending songs whose analysis is kept warm, and the window they come from
+WARMUP_TOP_N = int(os.getenv('WARMUP_TOP_N', '10'))
+WARMUP_WINDOW = os.getenv('WARMUP_WINDOW', '7d')
+# Cached analyses expiring within this many seconds are refreshed
+WARMUP_REFRESH_BEFORE = int(os.getenv('WARMUP_REFRESH_BEFORE', str(24 * 3600)))
+# Seconds one warm-up run may take (keep it under the function's max duration)
+WARMUP_DEADLINE = float(os.getenv('WARMUP_DEADLINE', '50'))
+
+# A short input per model: enough to load it without spending quota
+WARMUP_TEXT = "Warming up the model."
+
+def ping_models(deadline):
+    # One tiny inference per Hugging Face model so a loading model starts now
+    # instead of on the next search; the scheduler waits out estimated_time
+    status = {}
+    for model, result, error in iter_enrichments({
+        SENTIMENT_MODEL: lambda: analyze_sentiment(WARMUP_TEXT),
+        EMOTIONS_MODEL: lambda: analyze_emotions(WARMUP_TEXT),
+        TOPICS_MODEL: lambda: analyze_topics(WARMUP_TEXT),
+        SUMMARY_MODEL: lambda: get_combined_summary(WARMUP_TEXT, None)
+    }, deadline=deadline):
+        if error is None and isinstance(result, dict) and 'error' in result:
+            error = result['error']
+        status[model] = 'ok' if error is None else error
+    return status
+
+def needs_refresh(track_id, analyzer, now):
+    cached = db.session.get(AnalysisResult, (track_id, analysis_version(analyzer)))
+    return (
+        cached is None
+        or cached.expires_at <= now + timedelta(seconds=WARMUP_REFRESH_BEFORE)
+    )
+
+def refresh_in_context(app, track, analyzer):
+    # Runs on a batch worker; shares the run with a /search for the same track
+    with app.app_context():
+        return analysis_flight.do(
+            (track['id'], analyzer.name),
+            lambda: analyze_and_store(track, analyzer)
+        )
+
+def refresh_trending(app, analyzer, deadline):
+    # Re-analyzes the top trending songs whose cached result is missing,
+    # outdated or about to expire. Returns (checked, refreshed, errors)
+    now = datetime.utcnow()
+    trending = compute_trending(db.session, Song, SongSearchBucket, WARMUP_WINDOW, WARMUP_TOP_N)
+    track_ids = [track_id_from_url(song['spotify_url']) for song in trending]
+    stale = [track_id for track_id in track_ids if track_id and needs_refresh(track_id, analyzer, now)]
+
+    errors = {}
+    refreshed = 0
+    if stale:
+        futures = {
+            executor.submit(refresh_in_context, app, track, analyzer): track['id']
+            for track in get_spotify_tracks(stale) if track
+        }
+        try:
+            for future in as_completed(futures, timeout=max(deadline - time.monotonic(), 0)):
+                try:
+                    data = future.result()
+                    if data['unavailable']:
+                        errors[futures[future]] = f"unavailable: {', '.join(data['unavailable'])}"
+                    else:
+                        refreshed += 1
+                except LyricsNotFound:
+                    errors[futures[future]] = 'lyrics not found'
+                except Exception as e:
+                    errors[futures[future]] = str(e)
+        except FutureTimeoutError:
+            for future, track_id in futures.items():
+                if not future.done():
+                    future.cancel()
+                    errors.setdefault(track_id, 'timed out')
+    return len(track_ids), refreshed, errors
+
+def run_warmup(app, analyzer, deadline=None):
+    # Pings the models, refreshes the trending analyses and records the run
+    started = time.monotonic()
+    started_at = datetime.utcnow()
+    deadline = deadline or started + WARMUP_DEADLINE
+
+    # The local analyzer doesn't use the hosted models
+    models = ping_models(deadline) if ANALYZER_BACKEND != 'local' else {}
+    checked, refreshed, errors = refresh_trending(app, analyzer, deadline)
+
+    run = WarmupRun(
+        started_at=started_at,
+        duration_ms=int((time.monotonic() - started) * 1000),
+        songs_checked=checked,
+        songs_refreshed=refreshed,
+        models=json.dumps(models),
+        errors=json.dumps(errors)
+    )
+    try:
+        db.session.add(run)
+        db.session.commit()
+    except Exception as db_error:
+        db.session.rollback()
+        print(f"Database error: {str(db_error)}")
+    print(f"Warm-up took {run.duration_ms} ms: refreshed {refreshed} of {checked} trending songs, "
+          f"{len(errors)} errors, models {models}")
+    return run.to_dict()